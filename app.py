@@ -1,98 +1,33 @@
 import os
 import uuid
-import json
 import logging
 from logging.handlers import RotatingFileHandler
 from datetime import datetime
-from flask import Flask, Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, abort, Response, jsonify
+from flask import Flask, Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, abort, Response, jsonify, stream_with_context
 from werkzeug.utils import secure_filename
 from config import Config
-from models import db, Document, Paragraph, document_paragraph, DocumentSimilarity, Tag
-from utils.pdf_extractor import extract_text_from_pdf, create_pdf_preview_info, generate_page_preview
-from utils.docx_extractor import extract_text_from_docx, create_docx_preview_info, generate_section_preview
-from utils.excel_exporter import generate_excel_report
-from utils.paragraph_processor import download_spacy_resources, process_paragraphs
-from utils.similarity_analyzer import calculate_document_similarities, get_similarity_network_data
+from models import db, configure_sqlite, Document, Paragraph, DocumentSimilarity, Tag, BackgroundJob
+from utils.preview_cache import get_document_preview, get_preview_etag
+from utils.http_cache import conditional_json, not_modified, set_cache_headers
+from utils.exports import request_report
+from utils.dumps import DUMP_FORMATS, parse_since, next_since, stream_dump
+from utils.log_reader import read_tail, get_log_entries
+from utils.log_stream import get_log_follower, stream_log_events
+from utils.paragraph_processor import download_spacy_resources
+from utils.job_queue import enqueue_job
+from utils.file_utils import save_file_with_hash
+from utils.ingestion import find_duplicate_document, copy_document_analysis
+from utils.similarity_analyzer import calculate_document_similarities, get_similarity_network_data, explain_similarity
+from utils.search_index import search
+from utils.migrations import check_schema
+from utils.deletion import (delete_documents, delete_documents_in_batches, purge_all_documents, remove_document_files,
+                            remove_deleted_vectors)
+from utils.query_helpers import (get_paragraph_page, get_paragraph_documents, get_paragraph_stats, get_shared_paragraph_page,
+                                 get_paragraph_tags, get_document_tags, get_document_paragraphs)
 
 # Create a blueprint for documents-related routes
 documents_bp = Blueprint('documents', __name__, url_prefix='/documents')
 
-def fix_database_schema(app):
-    """Ensure the database schema is updated properly."""
-    with app.app_context():
-        # First, check if the column exists
-        try:
-            db.session.execute(db.text("SELECT preview_data FROM document LIMIT 1"))
-            app.logger.info("preview_data column already exists")
-            db.session.commit()
-            return True
-        except Exception:
-            # Column doesn't exist, let's create it
-            app.logger.info("preview_data column doesn't exist, attempting to add it")
-            db.session.rollback()
-            
-            try:
-                # Different approach for SQLite
-                db.session.execute(db.text("ALTER TABLE document ADD COLUMN preview_data TEXT"))
-                db.session.commit()
-                app.logger.info("Added preview_data column successfully")
-                return True
-            except Exception as e:
-                db.session.rollback()
-                app.logger.error(f"Error adding preview_data column: {str(e)}")
-                
-                # If direct ALTER TABLE fails, try the more complex approach
-                try:
-                    # This is a more involved way to add a column in SQLite
-                    # 1. Rename the existing table
-                    db.session.execute(db.text("ALTER TABLE document RENAME TO document_old"))
-                    
-                    # 2. Create a new table with the desired schema
-                    db.session.execute(db.text("""
-                        CREATE TABLE document (
-                            id INTEGER NOT NULL, 
-                            filename VARCHAR(255) NOT NULL, 
-                            original_filename VARCHAR(255) NOT NULL, 
-                            file_type VARCHAR(10) NOT NULL, 
-                            file_size INTEGER NOT NULL, 
-                            upload_date DATETIME, 
-                            extracted_text TEXT, 
-                            status VARCHAR(20), 
-                            error_message TEXT, 
-                            page_count INTEGER, 
-                            paragraph_count INTEGER,
-                            preview_image_path VARCHAR(255),
-                            preview_data TEXT,
-                            PRIMARY KEY (id)
-                        )
-                    """))
-                    
-                    # 3. Copy data from old table to new table
-                    db.session.execute(db.text("""
-                        INSERT INTO document 
-                        (id, filename, original_filename, file_type, file_size, 
-                         upload_date, extracted_text, status, error_message, 
-                         page_count, paragraph_count, preview_image_path)
-                        SELECT 
-                        id, filename, original_filename, file_type, file_size, 
-                        upload_date, extracted_text, status, error_message, 
-                        page_count, paragraph_count, preview_image_path
-                        FROM document_old
-                    """))
-                    
-                    # 4. Drop the old table
-                    db.session.execute(db.text("DROP TABLE document_old"))
-                    
-                    # 5. Commit changes
-                    db.session.commit()
-                    app.logger.info("Successfully rebuilt document table with preview_data column")
-                    return True
-                except Exception as rebuild_error:
-                    db.session.rollback()
-                    app.logger.error(f"Failed to rebuild table: {str(rebuild_error)}")
-                    return False
-
-
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
@@ -104,6 +39,9 @@ def create_app(config_class=Config):
     
     # Initialize database
     db.init_app(app)
+    with app.app_context():
+        # WAL, busy timeout and cache settings on every new connection
+        configure_sqlite(db.engine, app.config)
     
     # Setup logging
     if not app.debug:
@@ -117,27 +55,10 @@ def create_app(config_class=Config):
         app.logger.setLevel(logging.INFO)
         app.logger.info('Document Analyzer starting up')
     
-    # Fix database schema before continuing
-    fix_database_schema(app)
-    
     with app.app_context():
-        # Add new columns to the existing database table if they don't exist
-        try:
-            db.session.execute(db.text("ALTER TABLE document ADD COLUMN page_count INTEGER DEFAULT 0"))
-            app.logger.info("Added new column: page_count")
-        except Exception as e:
-            db.session.rollback()
-            app.logger.info(f"Column page_count not added: {str(e)}")
-            
-        try:
-            db.session.execute(db.text("ALTER TABLE document ADD COLUMN paragraph_count INTEGER DEFAULT 0"))
-            app.logger.info("Added new column: paragraph_count")
-        except Exception as e:
-            db.session.rollback()
-            app.logger.info(f"Column paragraph_count not added: {str(e)}")
-        
-        # Create any missing tables
-        db.create_all()
+        # A new database is created in its final shape; an existing one must have been
+        # brought up to date by migrate.py, or the app refuses to start
+        check_schema(db)
         
         # Download spaCy resources
         try:
@@ -157,27 +78,34 @@ def create_app(config_class=Config):
     
     # Generate preview routes
     @app.route('/generate-preview/<int:document_id>/<int:page_number>')
-    def generate_preview(document_id, page_number):
-        """Generate a preview image for a specific document page in memory."""
+    @app.route('/generate-thumbnail/<int:document_id>/<int:page_number>', endpoint='generate_thumbnail', defaults={'thumbnail': True})
+    def generate_preview(document_id, page_number, thumbnail=False):
+        """Generate a preview image (or low-resolution thumbnail) for a specific document page in memory."""
         document = Document.query.get_or_404(document_id)
         
-        # Get the file type from preview info
-        file_type = document.get_file_type_from_preview_info()
+        # Content-addressed URLs (?v=<hash prefix>) can be cached for good; plain
+        # ones are revalidated, since the preview settings in the ETag can change and a
+        # deleted document must stop being served
+        immutable = bool(document.content_hash) and request.args.get('v') == document.content_hash[:16]
+        max_age = app.config['HTTP_IMMUTABLE_MAX_AGE'] if immutable else 0
         
-        # Get the full path to the document file
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], document.filename)
+        # A browser revalidating its copy gets a 304 without the file being opened
+        etag = get_preview_etag(document, page_number, app.config, thumbnail)
+        if etag:
+            cached = not_modified(etag, max_age=max_age, immutable=immutable)
+            if cached is not None:
+                return cached
         
-        # Generate the appropriate preview in memory
-        if file_type == 'pdf':
-            img_data, mimetype = generate_page_preview(document, page_number, file_path)
-        else:  # Default to docx
-            img_data, mimetype = generate_section_preview(document, page_number, file_path)
+        # Served from the preview cache when this page was rendered before
+        img_data, mimetype = get_document_preview(document, page_number, app.config['UPLOAD_FOLDER'], app.config, thumbnail)
         
         if not img_data:
             return abort(404)
             
         # Return the image data directly
-        return Response(img_data, mimetype=mimetype)
+        response = Response(img_data, mimetype=mimetype)
+        return set_cache_headers(response, get_preview_etag(document, page_number, app.config, thumbnail),
+                                 max_age=max_age, immutable=immutable)
     
     # Add a route to handle direct preview requests (legacy compatibility)
     @app.route('/preview/<path:filename>')
@@ -217,53 +145,172 @@ def create_app(config_class=Config):
     # Paragraphs route
     @app.route('/paragraphs')
     def view_paragraphs():
-        paragraphs = Paragraph.query.all()
-        # Get paragraphs that appear in multiple documents
-        shared_paragraphs = [p for p in paragraphs if len(p.documents) > 1]
-        # Sort by number of documents (most shared first)
-        shared_paragraphs.sort(key=lambda p: len(p.documents), reverse=True)
+        # Only the first page is rendered; the table loads more through /api/search
+        paragraphs, next_cursor = get_paragraph_page(app.config['SEARCH_PAGE_SIZE'])
+        # First page of the paragraphs that appear in multiple documents, most shared
+        # first; the rest come from /api/shared-paragraphs
+        shared_paragraphs, shared_cursor = get_shared_paragraph_page(app.config['SEARCH_PAGE_SIZE'])
+        # Documents and tags for every row on the page, in a fixed number of queries
+        paragraph_ids = [p.id for p in paragraphs] + [p.id for p in shared_paragraphs]
         return render_template('paragraphs.html', 
                               paragraphs=paragraphs, 
-                              shared_paragraphs=shared_paragraphs)
+                              next_cursor=next_cursor,
+                              paragraph_stats=get_paragraph_stats(),
+                              shared_paragraphs=shared_paragraphs,
+                              shared_cursor=shared_cursor,
+                              paragraph_documents=get_paragraph_documents(paragraph_ids),
+                              paragraph_tags=get_paragraph_tags(paragraph_ids))
     
-    # Export routes
-    @app.route('/export')
-    def export():
-        documents = Document.query.filter_by(status='processed').all()
+    @app.route('/api/shared-paragraphs')
+    @conditional_json()
+    def api_shared_paragraphs():
+        """Shared paragraphs, most shared first, with keyset pagination."""
+        limit = max(1, min(request.args.get('limit', app.config['SEARCH_PAGE_SIZE'], type=int), 200))
+        try:
+            paragraphs, next_cursor = get_shared_paragraph_page(limit, request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
         
-        if not documents:
-            flash('No processed documents to export', 'error')
-            return redirect(url_for('documents.list_documents'))
+        paragraph_ids = [p.id for p in paragraphs]
+        documents = get_paragraph_documents(paragraph_ids)
+        tags = get_paragraph_tags(paragraph_ids)
+        return jsonify({
+            'success': True,
+            'results': [{
+                'id': p.id,
+                'content': p.content[:500] + ('...' if len(p.content) > 500 else ''),
+                'document_count': len(documents.get(p.id, [])),
+                'documents': documents.get(p.id, []),
+                'tags': [{'id': t.id, 'name': t.name, 'color': t.color} for t in tags.get(p.id, [])]
+            } for p in paragraphs],
+            'next_cursor': next_cursor
+        })
+    
+    @app.route('/api/search')
+    @conditional_json()
+    def api_search():
+        """Full-text search over paragraphs or documents with keyset pagination."""
+        query_text = request.args.get('q', '')
+        scope = request.args.get('scope', 'paragraphs')
+        limit = max(1, min(request.args.get('limit', app.config['SEARCH_PAGE_SIZE'], type=int), 200))
         
         try:
-            report_filename = generate_excel_report(documents, app.config['UPLOAD_FOLDER'])
-            flash('Excel report generated successfully', 'success')
-            return redirect(url_for('download_report', filename=report_filename))
+            page = search(db.session, query_text, scope=scope, limit=limit, cursor=request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
         except Exception as e:
-            app.logger.error(f"Error generating Excel report: {str(e)}")
-            flash(f'Error generating Excel report: {str(e)}', 'error')
-            return redirect(url_for('documents.list_documents'))
-    
-    @app.route('/export_paragraphs')
-    def export_paragraphs():
-        documents = Document.query.filter_by(status='processed').all()
+            app.logger.error(f"Search failed for {query_text!r}: {str(e)}")
+            return jsonify({'success': False, 'message': 'Search is not available'}), 500
+        
+        results = page['results']
+        if scope == 'paragraphs':
+            # One query for the documents of the whole page
+            documents = get_paragraph_documents([r['id'] for r in results])
+            for result in results:
+                result['documents'] = documents.get(result['id'], [])
+                result['document_count'] = len(result['documents'])
+        else:
+            names = dict(db.session.query(Document.id, Document.original_filename)
+                         .filter(Document.id.in_([r['id'] for r in results])))
+            for result in results:
+                result['filename'] = names.get(result['id'])
         
-        if not documents:
+        return jsonify({
+            'success': True,
+            'query': query_text,
+            'scope': scope,
+            'results': results,
+            'next_cursor': page['next_cursor']
+        })
+    
+    # Export routes: reports are built by background 'export' jobs and reused
+    # until the corpus changes
+    def queue_excel_export(back_endpoint):
+        """Redirect to the cached report, or to the progress of the job building it."""
+        if Document.query.filter_by(status='processed').first() is None:
             flash('No processed documents to export', 'error')
-            return redirect(url_for('view_paragraphs'))
+            return redirect(url_for(back_endpoint))
         
         try:
-            report_filename = generate_excel_report(documents, app.config['UPLOAD_FOLDER'])
-            flash('Excel report with paragraphs generated successfully', 'success')
-            return redirect(url_for('download_report', filename=report_filename))
+            report_filename, job = request_report(db.session, app.config['UPLOAD_FOLDER'], 'excel', {'status': 'processed'})
         except Exception as e:
-            app.logger.error(f"Error generating Excel report: {str(e)}")
+            app.logger.error(f"Error queueing Excel report: {str(e)}")
             flash(f'Error generating Excel report: {str(e)}', 'error')
-            return redirect(url_for('view_paragraphs'))
+            return redirect(url_for(back_endpoint))
+        
+        if report_filename:
+            flash('Excel report is up to date', 'success')
+            return redirect(url_for('download_report', filename=report_filename))
+        return redirect(url_for('export_status', job_id=job.id))
+    
+    @app.route('/export')
+    def export():
+        return queue_excel_export('documents.list_documents')
+    
+    @app.route('/export_paragraphs')
+    def export_paragraphs():
+        return queue_excel_export('view_paragraphs')
+    
+    @app.route('/export/status/<int:job_id>')
+    def export_status(job_id):
+        """Progress page of an export job; downloads the report when it is ready."""
+        job = BackgroundJob.query.filter_by(id=job_id, job_type='export').first_or_404()
+        return render_template('export_status.html', job=job)
+    
+    @app.route('/api/export/<int:job_id>')
+    def api_export_status(job_id):
+        """API endpoint polled by the export progress page."""
+        job = BackgroundJob.query.filter_by(id=job_id, job_type='export').first_or_404()
+        filename = job.get_payload().get('filename')
+        ready = job.status == 'done' and os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status': job.status,
+            'progress': 100 if ready else (job.progress or 0),
+            'error': job.error_message if job.status == 'failed' else None,
+            'download_url': url_for('download_report', filename=filename) if ready else None
+        })
     
     @app.route('/download/<filename>')
     def download_report(filename):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=True)
+        # Reports and stored uploads get a new name whenever their content changes;
+        # send_from_directory answers conditional requests from the file's ETag
+        response = send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=True,
+                                       max_age=app.config['HTTP_IMMUTABLE_MAX_AGE'])
+        return set_cache_headers(response, max_age=app.config['HTTP_IMMUTABLE_MAX_AGE'], immutable=True)
+    
+    @app.route('/api/dump/<dataset>.<fmt>')
+    def api_dump(dataset, fmt):
+        """
+        Stream a dataset as CSV or JSON Lines for downstream pipelines.
+    
+        ?since=<ISO timestamp> limits the dump to rows changed since then. The
+        X-Dump-Timestamp header is the since= to pass on the next pull: the
+        time the dump started, less DUMP_SINCE_OVERLAP_SECONDS so rows that
+        commit late aren't missed (rows may repeat; upsert them by ID). The
+        body is gzip-encoded for clients that accept it.
+        """
+        try:
+            since = parse_since(request.args.get('since'))
+            started = datetime.utcnow()
+            gzip_level = app.config['DUMP_GZIP_LEVEL'] if 'gzip' in request.accept_encodings else None
+            chunks = stream_dump(db.session, dataset, fmt, since=since,
+                                 fetch_size=app.config['DUMP_FETCH_SIZE'], gzip_level=gzip_level)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+    
+        mimetype, extension = DUMP_FORMATS[fmt]
+        response = Response(stream_with_context(chunks), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename={dataset}.{extension}'
+        response.headers['X-Dump-Timestamp'] = next_since(
+            started, app.config['DUMP_SINCE_OVERLAP_SECONDS']).isoformat()
+        response.headers['Cache-Control'] = 'no-store'
+        response.vary.add('Accept-Encoding')
+        if gzip_level is not None:
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
     
     # Logs routes
     @app.route('/logs')
@@ -271,14 +318,17 @@ def create_app(config_class=Config):
         log_dir = app.config['LOG_FOLDER']
         log_files = [f for f in os.listdir(log_dir) if os.path.isfile(os.path.join(log_dir, f))]
         
-        # Read current log file
+        # Read the last page of the current log file; ?before= pages back through older lines
+        before = request.args.get('before', type=int)
         try:
-            with open(app.config['LOG_FILE'], 'r') as f:
-                log_contents = f.readlines()
+            page = read_tail(app.config['LOG_FILE'], app.config['LOG_VIEW_LINES'], before=before,
+                             max_scan_bytes=app.config['LOG_SCAN_MAX_BYTES'])
+            log_contents = [f"{line}\n" for _, _, line in page['lines']]
+            before, after = page['before'], page['after']
         except FileNotFoundError:
-            log_contents = ["No log file found."]
+            log_contents, before, after = ["No log file found."], None, 0
         
-        return render_template('logs.html', log_files=log_files, log_contents=log_contents)
+        return render_template('logs.html', log_files=log_files, log_contents=log_contents, before=before, after=after)
     
     @app.route('/logs/<filename>')
     def view_log(filename):
@@ -289,13 +339,54 @@ def create_app(config_class=Config):
             flash('Log file not found', 'error')
             return redirect(url_for('logs'))
         
+        before = request.args.get('before', type=int)
         try:
-            with open(log_path, 'r') as f:
-                log_contents = f.readlines()
+            page = read_tail(log_path, app.config['LOG_VIEW_LINES'], before=before,
+                             max_scan_bytes=app.config['LOG_SCAN_MAX_BYTES'])
+            log_contents = [f"{line}\n" for _, _, line in page['lines']]
+            before = page['before']
         except Exception as e:
-            log_contents = [f"Error reading log file: {str(e)}"]
+            log_contents, before = [f"Error reading log file: {str(e)}"], None
         
-        return render_template('view_log.html', filename=filename, log_contents=log_contents)
+        return render_template('view_log.html', filename=filename, log_contents=log_contents, before=before)
+    
+    @app.route('/logs/api/latest')
+    def latest_logs():
+        """API endpoint to get the latest log entries, paged with before/after cursors."""
+        limit = max(1, min(request.args.get('limit', default=100, type=int), 5000))
+        try:
+            page = get_log_entries(app.config['LOG_FILE'], limit, level=request.args.get('level'),
+                                   before=request.args.get('before', type=int),
+                                   after=request.args.get('after', type=int),
+                                   max_scan_bytes=app.config['LOG_SCAN_MAX_BYTES'])
+        except Exception as e:
+            app.logger.error(f"Error fetching log entries: {str(e)}")
+            return jsonify({'success': False, 'error': str(e), 'entries': []})
+        page['success'] = True
+        return jsonify(page)
+    
+    @app.route('/logs/api/stream')
+    def stream_logs():
+        """
+        Server-Sent Events of new entries in the current log file.
+        
+        ?level= filters entries on the server; ?after=<cursor> (or the
+        Last-Event-ID of a reconnecting browser) first sends the entries
+        written since that cursor. Each open stream holds a server thread.
+        """
+        after = request.headers.get('Last-Event-ID', type=int)
+        if after is None:
+            after = request.args.get('after', type=int)
+        follower = get_log_follower(app.config['LOG_FILE'], app.config['LOG_STREAM_POLL_INTERVAL'])
+        events = stream_log_events(follower, level=request.args.get('level'), after=after,
+                                   catch_up_lines=app.config['LOG_VIEW_LINES'],
+                                   catch_up_bytes=app.config['LOG_SCAN_MAX_BYTES'],
+                                   heartbeat=app.config['LOG_STREAM_HEARTBEAT'],
+                                   queue_size=app.config['LOG_STREAM_QUEUE_SIZE'])
+        response = Response(events, mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-store'
+        response.headers['X-Accel-Buffering'] = 'no'  # Stop reverse proxies from buffering the stream
+        return response
     
     # Content Similarity Map and Document Comparison Routes
     @app.route('/similarity-map')
@@ -327,7 +418,15 @@ def create_app(config_class=Config):
             min_similarity = float(request.form.get('min_similarity', 0.3))
             min_similarity = max(0.1, min(0.9, min_similarity))  # Constrain to reasonable range
             
-            pairs_added = calculate_document_similarities(db, Document, DocumentSimilarity, min_similarity)
+            # Optionally keep only each document's strongest relationships
+            top_k = request.form.get('top_k', type=int)
+            top_k = top_k if top_k and top_k > 0 else None
+            
+            pairs_added = calculate_document_similarities(
+                db, Document, DocumentSimilarity, min_similarity, top_k=top_k,
+                store_path=app.config['DOCUMENT_VECTORS_PATH'],
+                block_nonzeros=app.config['SIMILARITY_BLOCK_NONZEROS']
+            )
             
             if pairs_added is False:
                 flash('Not enough documents to calculate similarities (need at least 2)', 'warning')
@@ -354,23 +453,29 @@ def create_app(config_class=Config):
         
         similarity_score = similarity.similarity_score if similarity else 0
         
-        # Find shared paragraphs
-        shared_paragraphs = []
-        doc1_paragraphs = set(document1.paragraphs)
-        doc2_paragraphs = set(document2.paragraphs)
-        shared_paragraphs = list(doc1_paragraphs.intersection(doc2_paragraphs))
+        # Terms that explain the score, from the stored document vectors
+        shared_terms = explain_similarity(app.config['DOCUMENT_VECTORS_PATH'], doc1, doc2)
+        
+        # Find shared paragraphs, keeping each document's reading order
+        doc1_paragraphs = get_document_paragraphs(document1.id)
+        doc2_paragraphs = get_document_paragraphs(document2.id)
+        doc1_ids = {p.id for p in doc1_paragraphs}
+        doc2_ids = {p.id for p in doc2_paragraphs}
+        shared_paragraphs = [p for p in doc1_paragraphs if p.id in doc2_ids]
         
         # Find unique paragraphs
-        unique_to_doc1 = list(doc1_paragraphs - doc2_paragraphs)
-        unique_to_doc2 = list(doc2_paragraphs - doc1_paragraphs)
+        unique_to_doc1 = [p for p in doc1_paragraphs if p.id not in doc2_ids]
+        unique_to_doc2 = [p for p in doc2_paragraphs if p.id not in doc1_ids]
         
         return render_template('compare_documents.html',
                               doc1=document1,
                               doc2=document2,
                               similarity_score=similarity_score,
+                              shared_terms=shared_terms,
                               shared_paragraphs=shared_paragraphs,
                               unique_to_doc1=unique_to_doc1,
-                              unique_to_doc2=unique_to_doc2)
+                              unique_to_doc2=unique_to_doc2,
+                              paragraph_tags=get_paragraph_tags(doc1_ids | doc2_ids))
 
     # Tag Management Routes
     @app.route('/tags')
@@ -470,6 +575,7 @@ def create_app(config_class=Config):
             return redirect(url_for('view_paragraphs'))
 
     @app.route('/api/paragraph/<int:id>/tags')
+    @conditional_json()
     def api_paragraph_tags(id):
         """API endpoint to get tags for a paragraph."""
         paragraph = Paragraph.query.get_or_404(id)
@@ -509,61 +615,44 @@ def create_app(config_class=Config):
                     unique_filename = f"{str(uuid.uuid4())}_{original_filename}"
                     file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
                     
-                    # Save the file
-                    file.save(file_path)
+                    # Save the file, hashing it while it streams to disk
+                    content_hash = save_file_with_hash(file, file_path)
                     app.logger.info(f"File saved: {file_path}")
                     
-                    # Create a new document record
+                    # Check for an identical document uploaded earlier
+                    duplicate = find_duplicate_document(content_hash, processed_only=False)
+                    if duplicate and app.config['DUPLICATE_UPLOAD_POLICY'] == 'reject':
+                        os.remove(file_path)
+                        flash(f'{file.filename} is identical to "{duplicate.original_filename}" and was not uploaded', 'error')
+                        continue
+                    
+                    # Create a pending document record; a background worker does the extraction
                     document = Document(
                         filename=unique_filename,
                         original_filename=original_filename,
                         file_type=file_type,
-                        file_size=os.path.getsize(file_path)
+                        file_size=os.path.getsize(file_path),
+                        content_hash=content_hash,
+                        status='pending'
                     )
+                    db.session.add(document)
+                    db.session.flush()  # Ensure document has an ID for the job
+                    
+                    if duplicate and duplicate.status == 'processed':
+                        # Identical content already analyzed: reuse it instead of queueing extraction
+                        copy_document_analysis(duplicate, document, db.session)
+                        enqueue_job(db.session, 'similarity', unique=True)
+                    else:
+                        enqueue_job(db.session, 'ingest', document_id=document.id)
+                    db.session.commit()
+                    app.logger.info(f"Stored document {document.id} ({original_filename}) with status {document.status}")
                     
-                    # Extract text based on file type
-                    try:
-                        if file_type == 'pdf':
-                            text, page_count = extract_text_from_pdf(file_path)
-                            # Just create preview info without generating images
-                            preview_info = create_pdf_preview_info(file_path)
-                        elif file_type == 'docx':
-                            text, page_count = extract_text_from_docx(file_path)
-                            # Just create preview info without generating images
-                            preview_info = create_docx_preview_info(file_path, page_count)
-                        else:
-                            raise ValueError(f"Unsupported file type: {file_type}")
-                        
-                        document.extracted_text = text
-                        document.page_count = page_count
-                        document.status = 'processed'
-                        
-                        # Save preview information as JSON (without generating any images)
-                        if preview_info:
-                            document.preview_data = json.dumps(preview_info)
-                        
-                        # Save the document to get an ID before processing paragraphs
-                        db.session.add(document)
-                        db.session.commit()
-                        
-                        # Process paragraphs
-                        paragraph_count = process_paragraphs(text, document, db.session)
-                        document.paragraph_count = paragraph_count
-                        app.logger.info(f"Found {paragraph_count} paragraphs in {page_count} pages for document {document.original_filename}")
-                        db.session.commit()
-                        
-                        successful_uploads += 1
-                    except Exception as e:
-                        app.logger.error(f"Error processing file {original_filename}: {str(e)}")
-                        document.status = 'error'
-                        document.error_message = str(e)
-                        db.session.add(document)
-                        db.session.commit()
+                    successful_uploads += 1
                 else:
                     flash(f'Invalid file type for {file.filename}. Only PDF and DOCX files are allowed.', 'error')
             
             if successful_uploads > 0:
-                flash(f'{successful_uploads} file(s) uploaded and processed successfully', 'success')
+                flash(f'{successful_uploads} file(s) uploaded and queued for processing', 'success')
             
             return redirect(url_for('documents.list_documents'))
         
@@ -573,7 +662,8 @@ def create_app(config_class=Config):
     def list_documents():
         """List all documents in the system."""
         documents = Document.query.order_by(Document.upload_date.desc()).all()
-        return render_template('documents.html', documents=documents)
+        return render_template('documents.html', documents=documents,
+                               document_tags=get_document_tags([d.id for d in documents]))
     
     @documents_bp.route('/delete/<int:id>', methods=['POST'])
     def delete_document(id):
@@ -583,36 +673,17 @@ def create_app(config_class=Config):
         # Store original filename for flash message
         original_filename = document.original_filename
         
-        # Get the stored filename to delete the physical file later
-        filename = document.filename
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        # First, record all paragraphs associated with this document before deletion
-        paragraphs_to_check = list(document.paragraphs)
-        
-        # Remove the document from the database (will remove associations in junction table)
-        db.session.delete(document)
-        db.session.commit()
-        
-        # Now check if any of those paragraphs need to be deleted
-        paragraphs_deleted = 0
-        for paragraph in paragraphs_to_check:
-            # Reload the paragraph to get its current associations
-            paragraph = Paragraph.query.get(paragraph.id)
-            if paragraph and not paragraph.documents:
-                # If paragraph has no document associations, delete it
-                db.session.delete(paragraph)
-                paragraphs_deleted += 1
-        
+        # Similarity edges, tag and paragraph links, the document and its orphaned
+        # paragraphs go in a fixed number of set-based statements
+        paragraph_ids = []
+        filenames, paragraphs_deleted = delete_documents([document.id], db.session, paragraph_ids)
+        enqueue_job(db.session, 'similarity', unique=True)
         db.session.commit()
+        remove_deleted_vectors([document.id], paragraph_ids,
+                               app.config['DOCUMENT_VECTORS_PATH'], app.config['PARAGRAPH_VECTORS_PATH'])
         
         # Delete the physical file if it exists
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                app.logger.info(f"Deleted file: {file_path}")
-            except Exception as e:
-                app.logger.error(f"Error deleting file {file_path}: {str(e)}")
+        remove_document_files(app.config['UPLOAD_FOLDER'], filenames)
         
         flash(f'Document "{original_filename}" deleted successfully. {paragraphs_deleted} unique paragraphs were also removed.', 'success')
         return redirect(url_for('documents.list_documents'))
@@ -621,38 +692,13 @@ def create_app(config_class=Config):
     def delete_all_documents():
         """Delete all documents and paragraphs from the database and file system."""
         try:
-            # Get all documents for file deletion
-            documents = Document.query.all()
-            
-            # Count documents for flash message
-            document_count = len(documents)
-            
-            # Delete all physical files only (no previews to delete)
-            deleted_files = 0
-            for document in documents:
-                # Delete document file
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], document.filename)
-                if os.path.exists(file_path):
-                    try:
-                        os.remove(file_path)
-                        deleted_files += 1
-                        app.logger.info(f"Deleted file: {file_path}")
-                    except Exception as e:
-                        app.logger.error(f"Error deleting file {file_path}: {str(e)}")
-            
-            # Get paragraph count for flash message
-            paragraph_count = Paragraph.query.count()
-            
-            # Delete all document-paragraph associations, documents, and paragraphs
-            # Note: Using raw SQL for efficiency with large datasets
-            db.session.execute(document_paragraph.delete())
-            db.session.execute(db.delete(Document))
-            db.session.execute(db.delete(Paragraph))
-            
+            # Files are removed by a background worker once the rows are gone
+            document_count, paragraph_count = purge_all_documents(db.session, app.config['DELETE_BATCH_SIZE'])
             db.session.commit()
             
-            app.logger.info(f"Deleted all {document_count} documents, {deleted_files} files, and {paragraph_count} paragraphs")
-            flash(f'Successfully deleted all {document_count} documents, {deleted_files} files, and {paragraph_count} paragraphs.', 'success')
+            app.logger.info(f"Deleted all {document_count} documents and {paragraph_count} paragraphs")
+            flash(f'Successfully deleted all {document_count} documents and {paragraph_count} paragraphs. '
+                  f'Their files are being removed in the background.', 'success')
         except Exception as e:
             db.session.rollback()
             app.logger.error(f"Error deleting all documents: {str(e)}")
@@ -660,6 +706,42 @@ def create_app(config_class=Config):
         
         return redirect(url_for('documents.list_documents'))
     
+    @documents_bp.route('/delete-selected', methods=['POST'])
+    def delete_selected_documents():
+        """Delete a list of documents in batched transactions; files are removed in the background."""
+        if request.is_json:
+            try:
+                document_ids = [int(i) for i in (request.get_json(silent=True) or {}).get('document_ids', [])]
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'message': 'Document IDs must be integers'}), 400
+        else:
+            document_ids = request.form.getlist('document_ids', type=int)
+        
+        if not document_ids:
+            if request.is_json:
+                return jsonify({'success': False, 'message': 'No documents selected'}), 400
+            flash('No documents selected', 'error')
+            return redirect(url_for('documents.list_documents'))
+        
+        try:
+            totals = delete_documents_in_batches(document_ids, db.session, app.config['DELETE_BATCH_SIZE'],
+                                                 document_store_path=app.config['DOCUMENT_VECTORS_PATH'],
+                                                 paragraph_store_path=app.config['PARAGRAPH_VECTORS_PATH'])
+        except Exception as e:
+            # Batches committed before the failure stay deleted
+            db.session.rollback()
+            app.logger.error(f"Error deleting documents: {str(e)}")
+            if request.is_json:
+                return jsonify({'success': False, 'message': str(e)}), 500
+            flash(f'Error deleting documents: {str(e)}', 'error')
+            return redirect(url_for('documents.list_documents'))
+        
+        message = f"Deleted {totals['documents']} documents and {totals['paragraphs']} unique paragraphs."
+        if request.is_json:
+            return jsonify({'success': True, 'message': message, **totals})
+        flash(message, 'success')
+        return redirect(url_for('documents.list_documents'))
+    
     @documents_bp.route('/view/<int:id>')
     def view_document(id):
         document = Document.query.get_or_404(id)
@@ -680,12 +762,19 @@ def create_app(config_class=Config):
         # Get all tags for the tag management modal
         all_tags = Tag.query.order_by(Tag.name).all()
         
+        # Paragraphs with their documents and tags, in a fixed number of queries
+        paragraphs = get_document_paragraphs(document.id)
+        paragraph_ids = [p.id for p in paragraphs]
+        
         return render_template('view.html', 
                             document=document, 
                             current_page=current_page,
                             total_pages=total_pages,
                             similar_documents=similar_documents,
-                            all_tags=all_tags)
+                            all_tags=all_tags,
+                            paragraphs=paragraphs,
+                            paragraph_documents=get_paragraph_documents(paragraph_ids),
+                            paragraph_tags=get_paragraph_tags(paragraph_ids))
                             
     @documents_bp.route('/tag/<int:id>', methods=['POST'])
     def tag_document(id):
@@ -0,0 +1,105 @@
+"""
+Benchmark container-paragraph detection.
+
+Compares the original pairwise SequenceMatcher check against the shingle
+index in utils.paragraph_processor.find_container_paragraphs on a synthetic
+document, and reports the timings and whether both found the same containers.
+
+    python benchmark_containment.py --paragraphs 400 --repeat 3
+"""
+import time
+import random
+import argparse
+from difflib import SequenceMatcher
+
+WORDS = (
+    "agreement party parties shall term notice payment services provider client "
+    "confidential information obligations liability damages law court clause "
+    "period written consent termination breach invoice delivery schedule fees "
+    "rights warranty indemnify insurance property license data protection the "
+    "of and to in for with by any all such this that under upon within"
+).split()
+
+def legacy_is_container(paragraph, other_paragraphs):
+    """The pairwise implementation that find_container_paragraphs replaced."""
+    if len(paragraph) < 100:
+        return False
+
+    norm_para = ' '.join(paragraph.lower().split())
+
+    contained = 0
+    for other in other_paragraphs:
+        if other == paragraph or len(other) >= len(paragraph):
+            continue
+
+        norm_other = ' '.join(other.lower().split())
+
+        if norm_other in norm_para:
+            contained += 1
+        else:
+            matcher = SequenceMatcher(None, norm_para, norm_other)
+            match = matcher.find_longest_match(0, len(norm_para), 0, len(norm_other))
+            if match.size >= len(norm_other) * 0.9:
+                contained += 1
+
+    return contained >= 2
+
+def make_document(paragraph_count, seed=42):
+    """Build a synthetic contract-like document with some container paragraphs."""
+    rng = random.Random(seed)
+    paragraphs = []
+    for _ in range(paragraph_count):
+        length = rng.randint(15, 80)
+        sentence = ' '.join(rng.choice(WORDS) for _ in range(length))
+        paragraphs.append(sentence.capitalize() + '.')
+
+    # Roughly 5% containers: concatenations of two or three earlier paragraphs,
+    # some of them with the contained text slightly edited
+    for _ in range(max(1, paragraph_count // 20)):
+        parts = rng.sample(paragraphs[:paragraph_count], rng.randint(2, 3))
+        if rng.random() < 0.5:
+            parts[0] = parts[0][:-3] + 'xyz'
+        paragraphs.insert(rng.randrange(len(paragraphs)), '\n\n'.join(parts))
+
+    return paragraphs
+
+def main():
+    from utils.paragraph_processor import find_container_paragraphs
+
+    parser = argparse.ArgumentParser(description='Benchmark container paragraph detection')
+    parser.add_argument('--paragraphs', type=int, default=400, help='Number of base paragraphs')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions (best is reported)')
+    parser.add_argument('--skip-legacy', action='store_true', help='Only time the indexed implementation')
+    args = parser.parse_args()
+
+    paragraphs = make_document(args.paragraphs)
+    total_chars = sum(len(p) for p in paragraphs)
+    print(f"Document: {len(paragraphs)} paragraphs, {total_chars} characters")
+
+    def best_of(func):
+        timings = []
+        result = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - start)
+        return min(timings), result
+
+    indexed_time, indexed = best_of(lambda: find_container_paragraphs(paragraphs))
+    print(f"Shingle index:           {indexed_time * 1000:10.1f} ms, {len(indexed)} containers")
+
+    if not args.skip_legacy:
+        legacy_time, legacy = best_of(
+            lambda: {idx for idx, p in enumerate(paragraphs) if legacy_is_container(p, paragraphs)}
+        )
+        print(f"Pairwise SequenceMatcher: {legacy_time * 1000:9.1f} ms, {len(legacy)} containers")
+        print(f"Speedup: {legacy_time / indexed_time:.1f}x")
+        if legacy != indexed:
+            # The legacy matcher uses difflib's autojunk heuristic, which can miss
+            # long matches made of frequent characters; report any disagreement
+            print(f"Differences: only legacy {sorted(legacy - indexed)}, only indexed {sorted(indexed - legacy)}")
+        else:
+            print("Both implementations found the same containers")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark the find-similar paragraph index.
+
+Builds a paragraph index over synthetic paragraphs in a temporary folder,
+then times search_paragraph_index queries (edited copies of indexed
+paragraphs) and checks how often the original paragraph is the top result.
+With --verify, the recall of the brute-force top 10 is reported as well.
+
+    python benchmark_paragraph_search.py --paragraphs 1000000 --queries 50
+"""
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+def make_vocabulary(rng, size=20000):
+    """Pseudo-words with Zipf-like frequencies, roughly like contract text."""
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = [''.join(rng.choice(letters) for _ in range(rng.randint(2, 10))) for _ in range(size)]
+    weights = [1.0 / (rank + 1) for rank in range(size)]
+    return words, weights
+
+def make_paragraph(rng, vocabulary):
+    words = rng.choices(vocabulary[0], weights=vocabulary[1], k=rng.randint(20, 80))
+    return ' '.join(words).capitalize() + '.'
+
+def edit_paragraph(paragraph, rng, vocabulary, edits=3):
+    """Replace a few words, like a lightly revised clause."""
+    words = paragraph.split()
+    for _ in range(edits):
+        words[rng.randrange(len(words))] = rng.choices(vocabulary[0], weights=vocabulary[1])[0]
+    return ' '.join(words)
+
+def main():
+    from utils.vector_store import open_vector_store
+    from utils.similarity_analyzer import build_paragraph_vectors, search_paragraph_index, PARAGRAPH_CHUNK_SIZE
+
+    parser = argparse.ArgumentParser(description='Benchmark the paragraph similarity index')
+    parser.add_argument('--paragraphs', type=int, default=100000, help='Number of indexed paragraphs')
+    parser.add_argument('--queries', type=int, default=50, help='Number of queries to time')
+    parser.add_argument('--verify', action='store_true', help='Compare results with a brute-force scan')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    folder = tempfile.mkdtemp(prefix='paragraph_index_')
+    try:
+        vocabulary = make_vocabulary(rng)
+        paragraphs = [make_paragraph(rng, vocabulary) for _ in range(args.paragraphs)]
+
+        def iter_chunks():
+            for i in range(0, len(paragraphs), PARAGRAPH_CHUNK_SIZE):
+                chunk = paragraphs[i:i + PARAGRAPH_CHUNK_SIZE]
+                yield list(range(i + 1, i + 1 + len(chunk))), chunk
+
+        start = time.perf_counter()
+        build_paragraph_vectors(folder, iter_chunks)
+        store = open_vector_store(folder)
+        print(f"Indexed {len(paragraphs)} paragraphs in {len(store.segments)} segments "
+              f"in {time.perf_counter() - start:.1f} s")
+
+        targets = [rng.randrange(len(paragraphs)) for _ in range(args.queries)]
+        queries = [edit_paragraph(paragraphs[idx], rng, vocabulary) for idx in targets]
+
+        search_paragraph_index(store, queries[0], 0.5)  # warm up the memory maps
+        timings = []
+        hits = 0
+        recall = []
+        for idx, query in zip(targets, queries):
+            start = time.perf_counter()
+            results = search_paragraph_index(store, query, min_similarity=0.5, limit=10)
+            timings.append(time.perf_counter() - start)
+            if results and results[0][0] == idx + 1:
+                hits += 1
+
+            if args.verify:
+                vector = store.vectorizer.transform([query]).T
+                scores = np.concatenate([(matrix @ vector).toarray().ravel() for matrix, _, _ in store.segments])
+                expected = {int(store.ids[i]) for i in np.argsort(-scores)[:10] if scores[i] >= 0.5}
+                if expected:
+                    recall.append(len(expected & {pid for pid, _ in results}) / len(expected))
+
+        timings = np.array(timings) * 1000
+        print(f"Query time: median {np.median(timings):.1f} ms, p95 {np.percentile(timings, 95):.1f} ms")
+        print(f"Original paragraph ranked first for {hits} of {len(queries)} queries")
+        if args.verify:
+            print(f"Recall of the brute-force top 10: {np.mean(recall) * 100:.1f}%")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
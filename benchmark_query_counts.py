@@ -0,0 +1,136 @@
+"""
+Check that the paragraph, document and export views run a fixed number of
+SQL queries however many rows they show.
+
+Seeds two throwaway databases of different sizes, renders every page (and
+the Excel report) against each, counts the statements sent to SQLite and
+fails if any count grows with the data.
+
+    python benchmark_query_counts.py --documents 20 --scale 5
+"""
+import os
+import sys
+import random
+import shutil
+import argparse
+import tempfile
+from contextlib import contextmanager
+from sqlalchemy import event
+
+@contextmanager
+def count_queries(engine):
+    """Count the statements executed on an engine inside the block."""
+    counter = {'queries': 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter['queries'] += 1
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+def seed(db, documents, paragraphs_per_document, rng):
+    """Documents sharing paragraphs from a common pool, with tags on both."""
+    from models import Document, Paragraph, Tag, document_paragraph
+
+    tags = [Tag(name=f'tag-{i}', color='#6c757d') for i in range(5)]
+    db.session.add_all(tags)
+
+    pool = [Paragraph(content=f'Shared clause {i} of the standard terms.', hash=f'shared-{i}')
+            for i in range(paragraphs_per_document)]
+    db.session.add_all(pool)
+
+    docs = []
+    for d in range(documents):
+        doc = Document(filename=f'doc{d}.pdf', original_filename=f'doc{d}.pdf', file_type='pdf',
+                       file_size=1024, status='processed', extracted_text=f'Document {d}',
+                       page_count=1, paragraph_count=paragraphs_per_document)
+        doc.tags = rng.sample(tags, 2)
+        docs.append(doc)
+    db.session.add_all(docs)
+    db.session.flush()
+
+    rows = []
+    for doc in docs:
+        own = [Paragraph(content=f'Clause only in document {doc.id}, number {i}.', hash=f'{doc.id}-{i}')
+               for i in range(paragraphs_per_document // 2)]
+        db.session.add_all(own)
+        db.session.flush()
+        members = own + rng.sample(pool, paragraphs_per_document - len(own))
+        for position, para in enumerate(members):
+            rows.append({'document_id': doc.id, 'paragraph_id': para.id, 'position': position})
+            if rng.random() < 0.3:
+                para.tags = [rng.choice(tags)]
+    db.session.execute(document_paragraph.insert(), rows)
+    db.session.commit()
+
+def measure(documents, paragraphs_per_document, folder):
+    """Query counts per page for one database size."""
+    from config import Config
+    from app import create_app
+    from models import db, Document
+    from utils.excel_exporter import generate_excel_report
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(folder, 'benchmark.db')
+        UPLOAD_FOLDER = os.path.join(folder, 'uploads')
+        LOG_FOLDER = os.path.join(folder, 'logs')
+        LOG_FILE = os.path.join(folder, 'logs', 'benchmark.log')
+        WTF_CSRF_ENABLED = False
+        TESTING = True
+
+    app = create_app(BenchmarkConfig)
+    counts = {}
+    with app.app_context():
+        seed(db, documents, paragraphs_per_document, random.Random(documents))
+        first, second = [d.id for d in Document.query.order_by(Document.id).limit(2)]
+        pages = {
+            'paragraphs': '/paragraphs',
+            'documents': '/documents/',
+            'view': f'/documents/view/{first}',
+            'compare': f'/compare-documents/{first}/{second}',
+            'search': '/api/search?q=clause',
+        }
+        client = app.test_client()
+        for name, url in pages.items():
+            with count_queries(db.engine) as counter:
+                response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+            counts[name] = counter['queries']
+
+        exported = Document.query.filter_by(status='processed').all()
+        with count_queries(db.engine) as counter:
+            generate_excel_report(exported, app.config['UPLOAD_FOLDER'])
+        counts['export'] = counter['queries']
+        db.session.remove()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that page query counts do not grow with the data')
+    parser.add_argument('--documents', type=int, default=20, help='Documents in the small database')
+    parser.add_argument('--paragraphs', type=int, default=20, help='Paragraphs per document')
+    parser.add_argument('--scale', type=int, default=5, help='Size of the large database relative to the small one')
+    args = parser.parse_args()
+
+    results = []
+    for documents in (args.documents, args.documents * args.scale):
+        folder = tempfile.mkdtemp(prefix='query_counts_')
+        try:
+            results.append(measure(documents, args.paragraphs, folder))
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    small, large = results
+    failed = False
+    for name in small:
+        status = 'ok' if large[name] == small[name] else 'GROWS'
+        failed = failed or status != 'ok'
+        print(f'{name:12s} {small[name]:4d} queries at {args.documents} documents, '
+              f'{large[name]:4d} at {args.documents * args.scale}  {status}')
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
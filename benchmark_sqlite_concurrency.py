@@ -0,0 +1,125 @@
+"""
+Benchmark SQLite read/write concurrency with and without the connection profile.
+
+Runs reader processes (a documents-list style query) next to writer processes
+(small ingestion-like transactions) against a temporary database, first with
+SQLite's defaults (rollback journal) and then with the pragmas from
+models.sqlite_pragmas(Config). Reports throughput, reader latency and how
+many operations failed with "database is locked".
+
+    python benchmark_sqlite_concurrency.py --readers 4 --writers 2 --seconds 10
+"""
+import os
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+
+def connect(path, pragmas):
+    # timeout=0 leaves lock waiting entirely to the profile's busy_timeout
+    conn = sqlite3.connect(path, timeout=0 if pragmas else 5.0, isolation_level=None)
+    for name, value in pragmas:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+def setup(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE document (
+        id INTEGER PRIMARY KEY, original_filename TEXT, status TEXT,
+        upload_date REAL, extracted_text TEXT)""")
+    conn.execute("CREATE INDEX ix_document_upload_date ON document (upload_date)")
+    conn.executemany(
+        "INSERT INTO document (original_filename, status, upload_date, extracted_text) VALUES (?, 'processed', ?, ?)",
+        [(f'doc{i}.pdf', float(i), 'text ' * 200) for i in range(rows)]
+    )
+    conn.commit()
+    conn.close()
+
+def reader(path, pragmas, seconds, queue):
+    conn = connect(path, pragmas)
+    latencies, errors = [], 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.execute("SELECT id, original_filename, status FROM document "
+                         "ORDER BY upload_date DESC LIMIT 200").fetchall()
+            latencies.append(time.perf_counter() - start)
+        except sqlite3.OperationalError:
+            errors += 1
+    queue.put(('read', latencies, errors))
+
+def writer(path, pragmas, seconds, queue):
+    conn = connect(path, pragmas)
+    latencies, errors = [], 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO document (original_filename, status, upload_date, extracted_text) "
+                "VALUES ('new.pdf', 'processed', ?, ?)",
+                [(time.time(), 'text ' * 200) for _ in range(50)]
+            )
+            conn.execute("COMMIT")
+            latencies.append(time.perf_counter() - start)
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    queue.put(('write', latencies, errors))
+
+def run_profile(name, pragmas, args):
+    folder = tempfile.mkdtemp(prefix='sqlite_concurrency_')
+    try:
+        path = os.path.join(folder, 'benchmark.db')
+        setup(path, args.rows)
+        connect(path, pragmas).close()  # journal_mode=WAL persists in the file
+
+        queue = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=reader, args=(path, pragmas, args.seconds, queue))
+                     for _ in range(args.readers)]
+        processes += [multiprocessing.Process(target=writer, args=(path, pragmas, args.seconds, queue))
+                      for _ in range(args.writers)]
+        for process in processes:
+            process.start()
+        results = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        print(f"{name}:")
+        for kind in ('read', 'write'):
+            latencies = [t * 1000 for r in results if r[0] == kind for t in r[1]]
+            errors = sum(r[2] for r in results if r[0] == kind)
+            if len(latencies) > 1:
+                p95 = statistics.quantiles(latencies, n=20)[-1]
+                print(f"  {kind:5s} {len(latencies) / args.seconds:8.1f} ops/s, "
+                      f"median {statistics.median(latencies):.2f} ms, p95 {p95:.2f} ms, "
+                      f"{errors} locked errors")
+            else:
+                print(f"  {kind:5s} no successful operations, {errors} locked errors")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def main():
+    from config import Config
+    from models import sqlite_pragmas
+
+    parser = argparse.ArgumentParser(description='Benchmark SQLite concurrency with the connection profile')
+    parser.add_argument('--readers', type=int, default=4, help='Reader processes')
+    parser.add_argument('--writers', type=int, default=2, help='Writer processes')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration of each run')
+    parser.add_argument('--rows', type=int, default=20000, help='Rows in the document table')
+    args = parser.parse_args()
+
+    config = {key: getattr(Config, key) for key in dir(Config) if key.startswith('SQLITE_')}
+    run_profile('SQLite defaults (rollback journal)', [], args)
+    run_profile('Configured profile (' + ', '.join(f'{n}={v}' for n, v in sqlite_pragmas(config)) + ')',
+                sqlite_pragmas(config), args)
+
+if __name__ == '__main__':
+    main()
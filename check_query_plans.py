@@ -0,0 +1,119 @@
+"""
+Check that the hot lookup paths are served by indexes.
+
+Builds a small migrated database in a temporary folder, runs the real query
+helpers while recording the SQL they send, and runs EXPLAIN QUERY PLAN on
+each statement. Exits non-zero if any of them scans document,
+document_paragraph or document_similarity (or a whole index of one) instead
+of searching an index.
+
+    python check_query_plans.py
+"""
+import os
+import sys
+import shutil
+import logging
+import tempfile
+from sqlalchemy import event
+
+# Tables that must never be read with a full scan on these paths
+WATCHED_TABLES = ('document', 'document_paragraph', 'document_similarity')
+
+def hot_paths(db):
+    """(name, callable) pairs exercising each indexed lookup."""
+    from models import Document, Paragraph
+    from utils.query_helpers import (get_similar_documents, get_paragraph_documents,
+                                     get_document_paragraphs, get_shared_paragraphs)
+    from utils.paragraph_counts import reconcile_paragraph_counts
+
+    return [
+        ('similar documents (query helper)', lambda: get_similar_documents(1)),
+        ('similar documents (model)', lambda: Document.query.get(1).get_similar_documents()),
+        ('documents of paragraphs', lambda: get_paragraph_documents([1, 2])),
+        ('paragraphs of a document', lambda: get_document_paragraphs(1)),
+        ('shared paragraphs', lambda: get_shared_paragraphs()),
+        ('processed documents by upload date', lambda: Document.query.filter_by(status='processed')
+            .order_by(Document.upload_date.desc()).all()),
+        ('doc_count reconciliation', lambda: reconcile_paragraph_counts(db.session)),
+    ]
+
+def seed(db):
+    from models import Document, Paragraph, DocumentSimilarity, document_paragraph
+
+    documents = [Document(filename=f'd{i}', original_filename=f'd{i}.pdf', file_type='pdf',
+                          file_size=1, status='processed') for i in range(3)]
+    paragraphs = [Paragraph(content=f'p{i}', hash=f'h{i}') for i in range(3)]
+    db.session.add_all(documents + paragraphs)
+    db.session.flush()
+    db.session.execute(document_paragraph.insert(), [
+        {'document_id': d.id, 'paragraph_id': p.id, 'position': i}
+        for d in documents for i, p in enumerate(paragraphs)
+    ])
+    db.session.add(DocumentSimilarity(source_id=documents[0].id, target_id=documents[1].id, similarity_score=0.5))
+    db.session.add(DocumentSimilarity(source_id=documents[2].id, target_id=documents[0].id, similarity_score=0.4))
+    db.session.commit()
+
+def full_scans(plan_rows):
+    """Plan details that walk a whole watched table, or a whole index of one."""
+    scans = []
+    for row in plan_rows:
+        detail = row[-1]
+        words = detail.split()
+        if len(words) >= 2 and words[0] == 'SCAN' and words[1] in WATCHED_TABLES:
+            scans.append(detail)
+    return scans
+
+def main():
+    from flask import Flask
+    from config import Config
+    from models import db, configure_sqlite
+    from utils.migrations import run_migrations
+
+    logging.basicConfig(level=logging.WARNING)
+
+    folder = tempfile.mkdtemp(prefix='query_plans_')
+    try:
+        app = Flask(__name__)
+        app.config.from_object(Config)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(folder, 'plans.db')
+        db.init_app(app)
+
+        failed = False
+        with app.app_context():
+            configure_sqlite(db.engine, app.config)
+            run_migrations(db)
+            seed(db)
+
+            for name, run in hot_paths(db):
+                statements = []
+
+                def record(conn, cursor, statement, parameters, context, executemany):
+                    if not executemany:
+                        statements.append((statement, parameters))
+
+                event.listen(db.engine, 'before_cursor_execute', record)
+                try:
+                    run()
+                finally:
+                    event.remove(db.engine, 'before_cursor_execute', record)
+                db.session.rollback()
+
+                for statement, parameters in statements:
+                    if statement.lstrip().upper().startswith('PRAGMA'):
+                        continue
+                    plan = db.session.connection().exec_driver_sql(
+                        'EXPLAIN QUERY PLAN ' + statement, parameters
+                    ).fetchall()
+                    scans = full_scans(plan)
+                    status = 'FULL SCAN: ' + '; '.join(scans) if scans else 'ok'
+                    failed = failed or bool(scans)
+                    print(f"{name:38s} {status}")
+                    if scans:
+                        print('    ' + ' '.join(statement.split()))
+            db.session.remove()
+        sys.exit(1 if failed else 0)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -8,8 +8,78 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(BASE_DIR, 'instance', 'document_analyzer.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # SQLite profile applied to every connection (see models.configure_sqlite)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'  # Readers don't block on a writer
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'  # Durable with WAL, fsync at checkpoints
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 30000)  # Milliseconds to wait for a lock
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE') or -65536)  # Negative: KiB, i.e. 64 MB per connection
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024)  # Bytes of the file read via mmap
+    SQLITE_TEMP_STORE = os.environ.get('SQLITE_TEMP_STORE') or 'MEMORY'  # Sorts and temp indexes in memory
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max upload size
     LOG_FOLDER = os.path.join(BASE_DIR, 'logs')
     LOG_FILE = os.path.join(LOG_FOLDER, f'app_{datetime.now().strftime("%Y%m%d")}.log')
-    ALLOWED_EXTENSIONS = {'pdf', 'docx'}
\ No newline at end of file
+    # Log pages are read backwards from the end of the file (see utils/log_reader.py)
+    LOG_VIEW_LINES = int(os.environ.get('LOG_VIEW_LINES') or 500)  # Lines per page of the log viewer
+    LOG_SCAN_MAX_BYTES = int(os.environ.get('LOG_SCAN_MAX_BYTES') or 4 * 1024 * 1024)  # Bytes read per page at most
+    # Live log view over Server-Sent Events (see utils/log_stream.py); one reader per process follows LOG_FILE
+    LOG_STREAM_POLL_INTERVAL = float(os.environ.get('LOG_STREAM_POLL_INTERVAL') or 1.0)  # Seconds, where inotify isn't available
+    LOG_STREAM_HEARTBEAT = int(os.environ.get('LOG_STREAM_HEARTBEAT') or 15)  # Seconds between keep-alive comments
+    LOG_STREAM_QUEUE_SIZE = int(os.environ.get('LOG_STREAM_QUEUE_SIZE') or 1000)  # Events buffered per viewer
+    ALLOWED_EXTENSIONS = {'pdf', 'docx'}
+    # What to do when an upload has the same content hash as an existing document:
+    # 'reuse' copies the existing analysis, 'reject' refuses the upload
+    DUPLICATE_UPLOAD_POLICY = os.environ.get('DUPLICATE_UPLOAD_POLICY') or 'reuse'
+    SEARCH_PAGE_SIZE = 50  # Rows per page in the paragraph table and /api/search
+    DELETE_BATCH_SIZE = int(os.environ.get('DELETE_BATCH_SIZE') or 100)  # Documents deleted per transaction
+    # Excel reports are built by 'export' jobs and reused until the corpus changes;
+    # reports not built or downloaded for this long are removed
+    REPORT_RETENTION_SECONDS = int(os.environ.get('REPORT_RETENTION_SECONDS') or 24 * 3600)
+    # Machine-readable dumps under /api/dump (see utils/dumps.py) stream straight from a cursor
+    DUMP_FETCH_SIZE = int(os.environ.get('DUMP_FETCH_SIZE') or 1000)  # Rows fetched from the database at a time
+    DUMP_GZIP_LEVEL = int(os.environ.get('DUMP_GZIP_LEVEL') or 6)
+    # X-Dump-Timestamp is moved back this far, so rows stamped before a dump started but
+    # committed after it are in the next delta too (consumers upsert by ID)
+    DUMP_SINCE_OVERLAP_SECONDS = int(os.environ.get('DUMP_SINCE_OVERLAP_SECONDS') or 300)
+
+    # Rendered page previews, cached by file hash, page, zoom and format (see utils/preview_cache.py)
+    PREVIEW_ZOOM = float(os.environ.get('PREVIEW_ZOOM') or 2.0)  # PDF render scale relative to 72 dpi
+    PREVIEW_CACHE_FOLDER = os.path.join(BASE_DIR, 'instance', 'previews')
+    PREVIEW_CACHE_MAX_BYTES = int(os.environ.get('PREVIEW_CACHE_MAX_BYTES') or 512 * 1024 * 1024)  # 0 disables the cache
+    # After ingestion a background job renders the first pages and a strip of
+    # thumbnails into the cache, so the first view of a document is served warm
+    PREVIEW_PRERENDER_PAGES = int(os.environ.get('PREVIEW_PRERENDER_PAGES') or 3)  # Full-size pages; 0 disables
+    PREVIEW_THUMBNAIL_PAGES = int(os.environ.get('PREVIEW_THUMBNAIL_PAGES') or 20)  # Thumbnails; 0 disables
+    PREVIEW_THUMBNAIL_ZOOM = float(os.environ.get('PREVIEW_THUMBNAIL_ZOOM') or 0.3)
+    PREVIEW_PRERENDER_PRIORITY = int(os.environ.get('PREVIEW_PRERENDER_PRIORITY') or 10)  # Claimed after ingest (0)
+
+    # Open PyMuPDF documents kept per process for rendering and extraction (see utils/pdf_pool.py)
+    PDF_POOL_SIZE = int(os.environ.get('PDF_POOL_SIZE') or 8)  # Idle handles kept open; 0 disables pooling
+    PDF_POOL_IDLE_SECONDS = int(os.environ.get('PDF_POOL_IDLE_SECONDS') or 300)  # Idle handles closed after this
+    PDF_POOL_MAX_BYTES = int(os.environ.get('PDF_POOL_MAX_BYTES') or 256 * 1024 * 1024)  # File bytes held open (estimates their memory)
+
+    # HTTP caching (see utils/http_cache.py): content-addressed previews and
+    # downloads may be reused by browsers this long without revalidating;
+    # JSON APIs are revalidated against the corpus generation on every use
+    HTTP_IMMUTABLE_MAX_AGE = int(os.environ.get('HTTP_IMMUTABLE_MAX_AGE') or 365 * 24 * 3600)
+    HTTP_JSON_MAX_AGE = int(os.environ.get('HTTP_JSON_MAX_AGE') or 0)
+
+    # Background ingestion workers (see worker.py)
+    INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS') or max(1, (os.cpu_count() or 2) // 2))
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL') or 2.0)  # Seconds between polls when idle
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS') or 900)  # Running jobs whose lease wasn't renewed for this long are requeued
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 3)
+    INGEST_PROCESSES = int(os.environ.get('INGEST_PROCESSES') or os.cpu_count() or 1)  # Pool size for parallel ingestion
+    INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE') or 32)  # Ingest jobs claimed per parallel batch
+
+    # Versioned, memory-mapped TF-IDF vectors (see utils/vector_store.py)
+    VECTOR_STORE_FOLDER = os.path.join(BASE_DIR, 'instance', 'vectors')
+    DOCUMENT_VECTORS_PATH = os.path.join(VECTOR_STORE_FOLDER, 'documents')
+    PARAGRAPH_VECTORS_PATH = os.path.join(VECTOR_STORE_FOLDER, 'paragraphs')  # find-similar search index
+
+    # Document similarity: new documents are scored incrementally against the
+    # stored vectors; a full refit happens once the corpus has grown by more
+    # than SIMILARITY_REFIT_RATIO since the last fit
+    SIMILARITY_REFIT_RATIO = float(os.environ.get('SIMILARITY_REFIT_RATIO') or 0.2)
+    # Nonzeros one block of the similarity product may hold; bounds the rows multiplied at a time
+    SIMILARITY_BLOCK_NONZEROS = int(os.environ.get('SIMILARITY_BLOCK_NONZEROS') or 8 * 1024 * 1024)
\ No newline at end of file
@@ -0,0 +1,175 @@
+import os
+import logging
+from sqlalchemy import or_
+
+logger = logging.getLogger(__name__)
+
+def delete_documents(document_ids, db_session, deleted_paragraph_ids=None):
+    """
+    Delete documents and everything that only they reference.
+
+    Runs a fixed number of set-based statements however many paragraphs the
+    documents have: similarity edges, tag links and paragraph links go first
+    (the doc_count triggers update the paragraphs), then the documents, then
+    the paragraphs left without a document. The caller is responsible for
+    committing.
+
+    Args:
+        document_ids (list): IDs of the documents to delete
+        db_session: SQLAlchemy session
+        deleted_paragraph_ids (list): If given, the IDs of the deleted
+            paragraphs are appended to it (for remove_deleted_vectors)
+
+    Returns:
+        tuple: (stored filenames of the deleted documents, number of paragraphs deleted)
+    """
+    from models import Document, DocumentSimilarity, document_paragraph, document_tag
+    from utils.paragraph_counts import delete_orphan_paragraphs
+
+    document_ids = list(document_ids)
+    if not document_ids:
+        return [], 0
+
+    filenames = [row[0] for row in db_session.query(Document.filename).filter(Document.id.in_(document_ids))]
+
+    db_session.query(DocumentSimilarity).filter(or_(
+        DocumentSimilarity.source_id.in_(document_ids),
+        DocumentSimilarity.target_id.in_(document_ids)
+    )).delete(synchronize_session=False)
+    db_session.execute(document_tag.delete().where(document_tag.c.document_id.in_(document_ids)))
+    db_session.execute(document_paragraph.delete().where(document_paragraph.c.document_id.in_(document_ids)))
+    db_session.query(Document).filter(Document.id.in_(document_ids)).delete(synchronize_session=False)
+
+    paragraphs_deleted = delete_orphan_paragraphs(db_session, deleted_paragraph_ids)
+
+    # The bulk statements bypassed the identity map
+    db_session.expire_all()
+    return filenames, paragraphs_deleted
+
+def purge_all_documents(db_session, batch_size):
+    """
+    Delete every document and paragraph with everything that hangs off them.
+
+    Each table is emptied with one statement; paragraphs go before their
+    links, so the doc_count triggers have no paragraph rows left to update.
+    The stored files are removed by 'delete_files' jobs of batch_size files
+    each, and a similarity update is queued. The caller is responsible for
+    committing.
+
+    Args:
+        db_session: SQLAlchemy session
+        batch_size (int): Files per 'delete_files' job
+
+    Returns:
+        tuple: (number of documents deleted, number of paragraphs deleted)
+    """
+    from models import Document, DocumentSimilarity, Paragraph, document_paragraph, document_tag, paragraph_tag
+    from utils.job_queue import enqueue_job
+
+    # Stored filenames for the background file removal
+    filenames = [row[0] for row in db_session.query(Document.filename)]
+    paragraph_count = db_session.query(Paragraph).count()
+
+    db_session.query(DocumentSimilarity).delete(synchronize_session=False)
+    db_session.execute(document_tag.delete())
+    db_session.execute(paragraph_tag.delete())
+    db_session.query(Paragraph).delete(synchronize_session=False)
+    db_session.execute(document_paragraph.delete())
+    db_session.query(Document).delete(synchronize_session=False)
+
+    for i in range(0, len(filenames), batch_size):
+        enqueue_job(db_session, 'delete_files', payload={'filenames': filenames[i:i + batch_size]})
+    enqueue_job(db_session, 'similarity', unique=True)
+
+    # The bulk statements bypassed the identity map
+    db_session.expire_all()
+    return len(filenames), paragraph_count
+
+def remove_deleted_vectors(document_ids, paragraph_ids, document_store_path=None, paragraph_store_path=None):
+    """
+    Mark committed deletions as removed in the document and paragraph vector stores.
+
+    Errors are logged rather than raised: the rows are already gone from the
+    database, and the next full fit of a store leaves them out anyway.
+
+    Args:
+        document_ids (list): IDs of the deleted documents
+        paragraph_ids (list): IDs of the deleted paragraphs
+        document_store_path (str): Document vector store folder
+        paragraph_store_path (str): Paragraph index folder
+    """
+    from utils.vector_store import remove_vectors
+
+    for store_path, ids in ((document_store_path, document_ids), (paragraph_store_path, paragraph_ids)):
+        if not store_path or not ids:
+            continue
+        try:
+            remove_vectors(store_path, ids)
+        except Exception as e:
+            logger.error(f"Error removing deleted rows from vector store {store_path}: {str(e)}")
+
+def delete_documents_in_batches(document_ids, db_session, batch_size, document_store_path=None,
+                                paragraph_store_path=None):
+    """
+    Delete many documents in one transaction per batch.
+
+    Each batch queues a 'delete_files' job that removes its files from the
+    upload folder in a background worker; once the batch has committed, its
+    rows are marked removed in the vector stores (see remove_deleted_vectors)
+    before the next batch starts. A similarity update is queued at the end.
+
+    Args:
+        document_ids (list): IDs of the documents to delete
+        db_session: SQLAlchemy session
+        batch_size (int): Documents deleted per transaction
+        document_store_path (str): Document vector store folder
+        paragraph_store_path (str): Paragraph index folder
+
+    Returns:
+        dict: Number of documents and paragraphs deleted
+    """
+    from utils.job_queue import enqueue_job
+
+    document_ids = list(document_ids)
+    totals = {'documents': 0, 'paragraphs': 0}
+    for i in range(0, len(document_ids), batch_size):
+        batch = document_ids[i:i + batch_size]
+        paragraph_ids = []
+        filenames, paragraphs_deleted = delete_documents(batch, db_session, paragraph_ids)
+        if filenames:
+            enqueue_job(db_session, 'delete_files', payload={'filenames': filenames})
+        db_session.commit()
+        remove_deleted_vectors(batch, paragraph_ids, document_store_path, paragraph_store_path)
+
+        totals['documents'] += len(filenames)
+        totals['paragraphs'] += paragraphs_deleted
+
+    if totals['documents']:
+        enqueue_job(db_session, 'similarity', unique=True)
+        db_session.commit()
+
+    logger.info(f"Deleted {totals['documents']} documents and {totals['paragraphs']} paragraphs")
+    return totals
+
+def remove_document_files(upload_folder, filenames):
+    """
+    Remove stored document files, ignoring ones that are already gone.
+
+    Args:
+        upload_folder (str): Folder the files were stored in
+        filenames (list): Stored filenames (never paths)
+
+    Returns:
+        int: Number of files removed
+    """
+    removed = 0
+    for filename in filenames:
+        file_path = os.path.join(upload_folder, os.path.basename(filename))
+        try:
+            os.remove(file_path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error deleting file {file_path}: {str(e)}")
+    return removed
@@ -1,12 +1,14 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask import send_from_directory, abort, Response, jsonify
-from models import db, Document, Paragraph, document_paragraph, Tag
-from utils.file_utils import allowed_file, save_uploaded_file
-from utils.paragraph_processor import process_paragraphs
-from utils.pdf_extractor import extract_text_from_pdf, create_pdf_preview_info
-from utils.docx_extractor import extract_text_from_docx, create_docx_preview_info
+from models import db, Document, Tag
+from utils.file_utils import allowed_file, save_uploaded_file, save_file_with_hash
+from utils.job_queue import enqueue_job
+from utils.ingestion import find_duplicate_document, copy_document_analysis
+from utils.deletion import delete_documents, purge_all_documents, remove_document_files, remove_deleted_vectors
+from utils.query_helpers import get_document_paragraphs, get_paragraph_documents, get_paragraph_tags, get_document_tags
+from utils.http_cache import not_modified, set_cache_headers
+from werkzeug.utils import secure_filename
 import os
-import json
 import uuid
 
 # Create blueprint
@@ -42,7 +44,7 @@ def upload():
                 flash(result['message'], 'error')
         
         if successful_uploads > 0:
-            flash(f'{successful_uploads} file(s) uploaded and processed successfully', 'success')
+            flash(f'{successful_uploads} file(s) uploaded and queued for processing', 'success')
         
         return redirect(url_for('documents.list'))
     
@@ -52,7 +54,8 @@ def upload():
 def list():
     """Display list of all documents."""
     documents = Document.query.order_by(Document.upload_date.desc()).all()
-    return render_template('documents.html', documents=documents)
+    return render_template('documents.html', documents=documents,
+                           document_tags=get_document_tags([d.id for d in documents]))
 
 @bp.route('/document/<int:id>')
 def view(id):
@@ -75,12 +78,19 @@ def view(id):
     # Get all tags for the tag management modal
     all_tags = Tag.query.order_by(Tag.name).all()
     
+    # Paragraphs with their documents and tags, in a fixed number of queries
+    paragraphs = get_document_paragraphs(document.id)
+    paragraph_ids = [p.id for p in paragraphs]
+    
     return render_template('view.html', 
                         document=document, 
                         current_page=current_page,
                         total_pages=total_pages,
                         similar_documents=similar_documents,
-                        all_tags=all_tags)
+                        all_tags=all_tags,
+                        paragraphs=paragraphs,
+                        paragraph_documents=get_paragraph_documents(paragraph_ids),
+                        paragraph_tags=get_paragraph_tags(paragraph_ids))
 
 @bp.route('/document/delete/<int:id>', methods=['POST'])
 def delete(id):
@@ -90,36 +100,17 @@ def delete(id):
     # Store original filename for flash message
     original_filename = document.original_filename
     
-    # Get the stored filename to delete the physical file later
-    filename = document.filename
-    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-    
-    # First, record all paragraphs associated with this document before deletion
-    paragraphs_to_check = list(document.paragraphs)
-    
-    # Remove the document from the database (will remove associations in junction table)
-    db.session.delete(document)
-    db.session.commit()
-    
-    # Now check if any of those paragraphs need to be deleted
-    paragraphs_deleted = 0
-    for paragraph in paragraphs_to_check:
-        # Reload the paragraph to get its current associations
-        paragraph = Paragraph.query.get(paragraph.id)
-        if paragraph and not paragraph.documents:
-            # If paragraph has no document associations, delete it
-            db.session.delete(paragraph)
-            paragraphs_deleted += 1
-    
+    # Similarity edges, tag and paragraph links, the document and its orphaned
+    # paragraphs go in a fixed number of set-based statements
+    paragraph_ids = []
+    filenames, paragraphs_deleted = delete_documents([document.id], db.session, paragraph_ids)
+    enqueue_job(db.session, 'similarity', unique=True)
     db.session.commit()
+    remove_deleted_vectors([document.id], paragraph_ids,
+                           current_app.config['DOCUMENT_VECTORS_PATH'], current_app.config['PARAGRAPH_VECTORS_PATH'])
     
     # Delete the physical file if it exists
-    if os.path.exists(file_path):
-        try:
-            os.remove(file_path)
-            current_app.logger.info(f"Deleted file: {file_path}")
-        except Exception as e:
-            current_app.logger.error(f"Error deleting file {file_path}: {str(e)}")
+    remove_document_files(current_app.config['UPLOAD_FOLDER'], filenames)
     
     flash(f'Document "{original_filename}" deleted successfully. {paragraphs_deleted} unique paragraphs were also removed.', 'success')
     return redirect(url_for('documents.list'))
@@ -128,37 +119,13 @@ def delete(id):
 def delete_all():
     """Delete all documents and paragraphs from the database and file system."""
     try:
-        # Get all documents for file deletion
-        documents = Document.query.all()
-        
-        # Count documents for flash message
-        document_count = len(documents)
-        
-        # Delete all physical files
-        deleted_files = 0
-        for document in documents:
-            # Delete document file
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], document.filename)
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    deleted_files += 1
-                    current_app.logger.info(f"Deleted file: {file_path}")
-                except Exception as e:
-                    current_app.logger.error(f"Error deleting file {file_path}: {str(e)}")
-        
-        # Get paragraph count for flash message
-        paragraph_count = Paragraph.query.count()
-        
-        # Use a more efficient query approach - delete in the correct order
-        db.session.execute(document_paragraph.delete())
-        db.session.execute(db.delete(Document))
-        db.session.execute(db.delete(Paragraph))
-        
+        # Files are removed by a background worker once the rows are gone
+        document_count, paragraph_count = purge_all_documents(db.session, current_app.config['DELETE_BATCH_SIZE'])
         db.session.commit()
         
-        current_app.logger.info(f"Deleted all {document_count} documents, {deleted_files} files, and {paragraph_count} paragraphs")
-        flash(f'Successfully deleted all {document_count} documents, {deleted_files} files, and {paragraph_count} paragraphs.', 'success')
+        current_app.logger.info(f"Deleted all {document_count} documents and {paragraph_count} paragraphs")
+        flash(f'Successfully deleted all {document_count} documents and {paragraph_count} paragraphs. '
+              f'Their files are being removed in the background.', 'success')
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error deleting all documents: {str(e)}")
@@ -169,32 +136,42 @@ def delete_all():
 @bp.route('/download/<filename>')
 def download_report(filename):
     """Download a generated report file."""
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename, as_attachment=True)
+    # Reports and stored uploads get a new name whenever their content changes;
+    # send_from_directory answers conditional requests from the file's ETag
+    max_age = current_app.config['HTTP_IMMUTABLE_MAX_AGE']
+    response = send_from_directory(current_app.config['UPLOAD_FOLDER'], filename, as_attachment=True, max_age=max_age)
+    return set_cache_headers(response, max_age=max_age, immutable=True)
 
 @bp.route('/generate-preview/<int:document_id>/<int:page_number>')
-def generate_preview(document_id, page_number):
-    """Generate a preview image for a specific document page in memory."""
+@bp.route('/generate-thumbnail/<int:document_id>/<int:page_number>', endpoint='generate_thumbnail', defaults={'thumbnail': True})
+def generate_preview(document_id, page_number, thumbnail=False):
+    """Generate a preview image (or low-resolution thumbnail) for a specific document page in memory."""
     document = Document.query.get_or_404(document_id)
     
-    # Get the file type from preview info
-    file_type = document.get_file_type_from_preview_info()
+    # Content-addressed URLs (?v=<hash prefix>) can be cached for good; plain
+    # ones are revalidated, since the preview settings in the ETag can change and a
+    # deleted document must stop being served
+    immutable = bool(document.content_hash) and request.args.get('v') == document.content_hash[:16]
+    max_age = current_app.config['HTTP_IMMUTABLE_MAX_AGE'] if immutable else 0
     
-    # Get the full path to the document file
-    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], document.filename)
+    # A browser revalidating its copy gets a 304 without the file being opened
+    from utils.preview_cache import get_document_preview, get_preview_etag
+    etag = get_preview_etag(document, page_number, current_app.config, thumbnail)
+    if etag:
+        cached = not_modified(etag, max_age=max_age, immutable=immutable)
+        if cached is not None:
+            return cached
     
-    # Generate the appropriate preview in memory
-    if file_type == 'pdf':
-        from utils.pdf_extractor import generate_page_preview
-        img_data, mimetype = generate_page_preview(document, page_number, file_path)
-    else:  # Default to docx
-        from utils.docx_extractor import generate_section_preview
-        img_data, mimetype = generate_section_preview(document, page_number, file_path)
+    # Served from the preview cache when this page was rendered before
+    img_data, mimetype = get_document_preview(document, page_number, current_app.config['UPLOAD_FOLDER'], current_app.config, thumbnail)
     
     if not img_data:
         return abort(404)
         
     # Return the image data directly
-    return Response(img_data, mimetype=mimetype)
+    response = Response(img_data, mimetype=mimetype)
+    return set_cache_headers(response, get_preview_etag(document, page_number, current_app.config, thumbnail),
+                             max_age=max_age, immutable=immutable)
 
 @bp.route('/preview/<path:filename>')
 def preview_image(filename):
@@ -229,23 +206,24 @@ def preview_image(filename):
 
 @bp.route('/export')
 def export():
-    """Export documents to Excel report."""
-    from utils.excel_exporter import generate_excel_report
-    
-    documents = Document.query.filter_by(status='processed').all()
+    """Export documents to Excel report (built by a background job, reused until the corpus changes)."""
+    from utils.exports import request_report
     
-    if not documents:
+    if Document.query.filter_by(status='processed').first() is None:
         flash('No processed documents to export', 'error')
         return redirect(url_for('documents.list'))
     
     try:
-        report_filename = generate_excel_report(documents, current_app.config['UPLOAD_FOLDER'])
-        flash('Excel report generated successfully', 'success')
-        return redirect(url_for('documents.download_report', filename=report_filename))
+        report_filename, job = request_report(db.session, current_app.config['UPLOAD_FOLDER'], 'excel', {'status': 'processed'})
     except Exception as e:
-        current_app.logger.error(f"Error generating Excel report: {str(e)}")
+        current_app.logger.error(f"Error queueing Excel report: {str(e)}")
         flash(f'Error generating Excel report: {str(e)}', 'error')
         return redirect(url_for('documents.list'))
+    
+    if report_filename:
+        flash('Excel report is up to date', 'success')
+        return redirect(url_for('documents.download_report', filename=report_filename))
+    return redirect(url_for('export_status', job_id=job.id))
 
 # Helper function for processing uploaded documents
 def process_uploaded_document(file):
@@ -278,47 +256,45 @@ def process_uploaded_document(file):
         unique_filename = f"{str(uuid.uuid4())}_{original_filename}"
         file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
         
-        # Save the file
-        file.save(file_path)
+        # Save the file, hashing it while it streams to disk
+        content_hash = save_file_with_hash(file, file_path)
         current_app.logger.info(f"File saved: {file_path}")
         
-        # Create a new document record
+        # Check for an identical document uploaded earlier
+        duplicate = find_duplicate_document(content_hash, processed_only=False)
+        if duplicate and current_app.config['DUPLICATE_UPLOAD_POLICY'] == 'reject':
+            os.remove(file_path)
+            current_app.logger.info(f"Rejected {original_filename}: duplicate of document {duplicate.id}")
+            return {
+                'success': False,
+                'message': f'{file.filename} is identical to "{duplicate.original_filename}" and was not uploaded'
+            }
+        
+        # Create a new document record; extraction happens in a background worker
         document = Document(
             filename=unique_filename,
             original_filename=original_filename,
             file_type=file_type,
-            file_size=os.path.getsize(file_path)
+            file_size=os.path.getsize(file_path),
+            content_hash=content_hash,
+            status='pending'
         )
-        
-        # Extract text based on file type
-        if file_type == 'pdf':
-            text, page_count = extract_text_from_pdf(file_path)
-            preview_info = create_pdf_preview_info(file_path)
-        elif file_type == 'docx':
-            text, page_count = extract_text_from_docx(file_path)
-            preview_info = create_docx_preview_info(file_path, page_count)
-        else:
-            raise ValueError(f"Unsupported file type: {file_type}")
-        
-        document.extracted_text = text
-        document.page_count = page_count
-        document.status = 'processed'
-        
-        # Save preview information as JSON
-        if preview_info:
-            document.preview_data = json.dumps(preview_info)
-        
-        # Save the document to get an ID before processing paragraphs
         db.session.add(document)
-        db.session.commit()
+        db.session.flush()  # Ensure document has an ID for the job
+        
+        # Identical content already analyzed: reuse it instead of queueing extraction
+        if duplicate and duplicate.status == 'processed':
+            copy_document_analysis(duplicate, document, db.session)
+            enqueue_job(db.session, 'similarity', unique=True)
+            db.session.commit()
+            return {'success': True, 'message': f'Reused analysis of "{duplicate.original_filename}"'}
         
-        # Process paragraphs
-        paragraph_count = process_paragraphs(text, document, db.session)
-        document.paragraph_count = paragraph_count
-        current_app.logger.info(f"Found {paragraph_count} paragraphs in {page_count} pages for document {document.original_filename}")
+        # Queue ingestion in the same transaction so the job never points at a missing document
+        enqueue_job(db.session, 'ingest', document_id=document.id)
         db.session.commit()
+        current_app.logger.info(f"Queued document {document.id} ({original_filename}) for ingestion")
         
-        return {'success': True, 'message': 'Document processed successfully'}
+        return {'success': True, 'message': 'Document queued for processing'}
         
     except Exception as e:
         current_app.logger.exception(f"Error processing file {file.filename}")
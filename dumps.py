@@ -0,0 +1,202 @@
+import io
+import csv
+import json
+import zlib
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, or_, exists
+
+logger = logging.getLogger(__name__)
+
+# Formats a dataset can be dumped in: (mimetype, file extension)
+DUMP_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+# Encoded text is handed to the compressor (and the response) in pieces of about this size
+CHUNK_CHARS = 64 * 1024
+
+def _documents_query(since):
+    from models import Document
+
+    statement = select(
+        Document.id, Document.original_filename, Document.file_type, Document.file_size,
+        Document.status, Document.page_count, Document.paragraph_count, Document.content_hash,
+        Document.upload_date, Document.processed_at
+    ).order_by(Document.id)
+    if since is not None:
+        statement = statement.where(or_(Document.upload_date >= since, Document.processed_at >= since))
+    return statement
+
+def _processed_since(since):
+    """Return a subquery of the IDs of documents whose analysis was stored at or after since."""
+    from models import Document
+
+    return select(Document.id).where(Document.processed_at >= since)
+
+def _paragraphs_query(since):
+    from models import Paragraph, document_paragraph
+
+    statement = select(
+        Paragraph.id, Paragraph.hash, Paragraph.doc_count, Paragraph.content
+    ).order_by(Paragraph.id)
+    if since is not None:
+        # Paragraphs have no timestamps of their own: a delta holds those linked
+        # to a document processed since then (new ones and newly shared ones)
+        statement = statement.where(exists().where(
+            document_paragraph.c.paragraph_id == Paragraph.id,
+            document_paragraph.c.document_id.in_(_processed_since(since))
+        ))
+    return statement
+
+def _document_paragraphs_query(since):
+    from models import document_paragraph
+
+    statement = select(
+        document_paragraph.c.document_id, document_paragraph.c.paragraph_id, document_paragraph.c.position
+    ).order_by(document_paragraph.c.document_id, document_paragraph.c.position)
+    if since is not None:
+        statement = statement.where(document_paragraph.c.document_id.in_(_processed_since(since)))
+    return statement
+
+def _similarities_query(since):
+    from models import DocumentSimilarity
+
+    statement = select(
+        DocumentSimilarity.id, DocumentSimilarity.source_id, DocumentSimilarity.target_id,
+        DocumentSimilarity.similarity_score, DocumentSimilarity.created_at
+    ).order_by(DocumentSimilarity.id)
+    if since is not None:
+        statement = statement.where(DocumentSimilarity.created_at >= since)
+    return statement
+
+# Dataset name -> function(since) returning the SELECT it is dumped from
+DATASETS = {
+    'documents': _documents_query,
+    'paragraphs': _paragraphs_query,
+    'document_paragraphs': _document_paragraphs_query,
+    'similarities': _similarities_query,
+}
+
+def parse_since(value):
+    """
+    Parse the since= parameter of a delta dump.
+
+    Args:
+        value (str): ISO 8601 timestamp; one with an offset is converted to UTC
+
+    Returns:
+        datetime: Naive UTC timestamp (as stored by the models), or None for an empty value
+
+    Raises:
+        ValueError: If the value isn't a timestamp
+    """
+    if not value:
+        return None
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    try:
+        since = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid since timestamp: {value!r}")
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+def next_since(started, overlap_seconds):
+    """
+    Return the since= value for the delta after a dump that started at started.
+
+    processed_at and created_at are stamped in Python before the transaction
+    commits, so a row can carry a time before the dump started yet only
+    become visible after the dump read past it. Moving the watermark back by
+    overlap_seconds (longer than any ingest or similarity transaction) keeps
+    such rows in the next delta; rows already pulled are sent again and must
+    be upserted by ID.
+
+    Returns:
+        datetime: Naive UTC timestamp
+    """
+    return started - timedelta(seconds=overlap_seconds)
+
+def iter_rows(db_session, statement, fetch_size):
+    """Yield the rows of a statement, fetching fetch_size rows from the cursor at a time."""
+    result = db_session.execute(statement.execution_options(yield_per=fetch_size))
+    for partition in result.partitions(fetch_size):
+        yield from partition
+
+def _text_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def encode_csv(columns, rows):
+    """Yield CSV text (header first) in chunks of about CHUNK_CHARS."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_text_value(value) for value in row])
+        if buffer.tell() >= CHUNK_CHARS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def encode_ndjson(columns, rows):
+    """Yield JSON Lines (one object per row) in chunks of about CHUNK_CHARS."""
+    lines, size = [], 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, row)), default=_text_value, ensure_ascii=False)
+        lines.append(line)
+        size += len(line) + 1
+        if size >= CHUNK_CHARS:
+            yield '\n'.join(lines) + '\n'
+            lines, size = [], 0
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def gzip_chunks(chunks, level=6):
+    """Compress text chunks into one gzip stream, yielding compressed bytes as they are produced."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_dump(db_session, dataset, fmt, since=None, fetch_size=1000, gzip_level=None):
+    """
+    Stream a dataset straight from a database cursor.
+
+    Nothing beyond fetch_size rows and one encoded chunk is held in memory, so
+    dumps of millions of rows run in constant memory. A delta (since given)
+    holds rows added or changed since then: documents uploaded or processed,
+    the paragraphs and links of documents processed, and similarity scores
+    computed. Deletions aren't part of a delta; a full dump reconciles them.
+    Consecutive deltas overlap (see next_since), so rows may repeat.
+
+    Args:
+        db_session: SQLAlchemy session, kept open while the generator runs
+        dataset (str): Key of DATASETS
+        fmt (str): Key of DUMP_FORMATS
+        since (datetime): Only dump rows changed at or after this (naive UTC) time
+        fetch_size (int): Rows fetched from the cursor at a time
+        gzip_level (int): Compress the stream at this level, or None for plain text
+
+    Returns:
+        generator: str chunks, or bytes chunks of a gzip stream
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset: {dataset}")
+    if fmt not in DUMP_FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+
+    statement = DATASETS[dataset](since)
+    columns = list(statement.selected_columns.keys())
+    encode = encode_csv if fmt == 'csv' else encode_ndjson
+    chunks = encode(columns, iter_rows(db_session, statement, fetch_size))
+    if gzip_level is not None:
+        chunks = gzip_chunks(chunks, gzip_level)
+    return chunks
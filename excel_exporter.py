@@ -1,8 +1,8 @@
-import pandas as pd
 import os
 from datetime import datetime
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 from openpyxl.chart import BarChart, Reference, PieChart
 from openpyxl.drawing.image import Image
@@ -10,6 +10,7 @@ import io
 from PIL import Image as PILImage
 from PIL import ImageDraw, ImageFont
 import logging
+from utils.query_helpers import iter_export_paragraphs
 
 logger = logging.getLogger(__name__)
 
@@ -58,30 +59,119 @@ def generate_cover_image(title, subtitle, output_dir):
         logger.error(f"Error generating cover image: {str(e)}")
         return None
 
-def generate_excel_report(documents, output_dir):
-    """Generate a visually enhanced Excel report from extracted document text and paragraphs."""
+# Column widths of the text and paragraph sheets; the summary sheet is sized
+# from its contents
+TEXT_COLUMN_WIDTHS = [5, 40, 8, 120]
+PARAGRAPH_COLUMN_WIDTHS = [5, 15, 100, 40]
+
+# Excel's limit on the characters in one cell
+CELL_TEXT_LIMIT = 32000
+
+# Paragraph rows written between progress reports
+PROGRESS_EVERY = 1000
+
+def _register_styles(wb):
+    """
+    Add the report's named styles to a workbook.
+
+    Cells then refer to a style by name instead of each carrying its own
+    font, fill, border and alignment objects.
+    """
+    side = Side(style='thin', color="BFBFBF")
+    border = Border(left=side, right=side, top=side, bottom=side)
+    fills = {
+        '': None,
+        '_alt': PatternFill(start_color="F2F6FC", end_color="F2F6FC", fill_type="solid"),
+        '_shared': PatternFill(start_color="E3F2FD", end_color="E3F2FD", fill_type="solid"),
+    }
+
+    wb.add_named_style(NamedStyle(
+        name='report_header',
+        font=Font(bold=True, color="FFFFFF", size=12),
+        fill=PatternFill(start_color="3498DB", end_color="3498DB", fill_type="solid"),
+        border=border,
+        alignment=Alignment(horizontal='center', vertical='center')
+    ))
+    for suffix, fill in fills.items():
+        cell_style = NamedStyle(name=f'report_cell{suffix}', border=border)
+        text_style = NamedStyle(name=f'report_text{suffix}', border=border,
+                                alignment=Alignment(wrap_text=True, vertical='top'))
+        if fill is not None:
+            cell_style.fill = fill
+            text_style.fill = fill
+        wb.add_named_style(cell_style)
+        wb.add_named_style(text_style)
+
+def _cell(ws, value, style=None, font=None):
+    """Create a write-only cell with a named style or a font."""
+    cell = WriteOnlyCell(ws, value=value)
+    if style:
+        cell.style = style
+    if font:
+        cell.font = font
+    return cell
+
+def _header_row(ws, headers):
+    return [_cell(ws, header, 'report_header') for header in headers]
+
+def _set_column_widths(ws, widths):
+    """Column widths have to be set before the first row of a write-only sheet."""
+    for col_idx, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+def _pad_rows(ws, written, row):
+    """
+    Append empty rows after the written ones until the next row appended is row.
+
+    Returns:
+        int: Number of rows written
+    """
+    for _ in range(written, row - 1):
+        ws.append([])
+    return max(written, row - 1)
+
+def generate_excel_report(documents, output_dir, filename=None, progress=None):
+    """
+    Generate a visually enhanced Excel report from extracted document text and paragraphs.
+
+    The workbook is write-only: rows are written to a temporary file as they
+    are appended, styles are shared named styles, and the paragraph sheet is
+    fed from a streaming query, so memory stays flat however many paragraphs
+    are exported.
+
+    Args:
+        documents (list): Documents to include
+        output_dir (str): Folder the report is saved in
+        filename (str): Name to save under (default: timestamped)
+        progress (callable): Called with the estimated percentage done
+
+    Returns:
+        str: Filename of the saved report
+    """
     try:
         logger.info("Generating enhanced Excel report")
         
-        # Create a new workbook with openpyxl
-        wb = Workbook()
+        # Create a new write-only workbook; sheets are written in order
+        wb = Workbook(write_only=True)
+        _register_styles(wb)
+        title_font = Font(size=14, bold=True)
         
         # Create cover sheet
-        cover_sheet = wb.active
-        cover_sheet.title = "Cover"
+        cover_sheet = wb.create_sheet("Cover")
         
-        # Try to add cover image
+        # Try to add cover image (read into memory so the temporary file can go)
         cover_image_path = generate_cover_image("Document Analysis Report", "Content and Paragraph Analysis", output_dir)
         if cover_image_path and os.path.exists(cover_image_path):
-            img = Image(cover_image_path)
+            with open(cover_image_path, 'rb') as f:
+                img = Image(io.BytesIO(f.read()))
             img.width, img.height = 600, 300
             cover_sheet.add_image(img, 'B2')
             # Delete the temporary image file
             os.remove(cover_image_path)
         
         # Add report information to cover page
-        cover_sheet['B15'] = "Report Information"
-        cover_sheet['B15'].font = Font(size=16, bold=True, color="2C3E50")
+        _pad_rows(cover_sheet, 0, 15)
+        cover_sheet.append([None, _cell(cover_sheet, "Report Information", font=Font(size=16, bold=True, color="2C3E50"))])
         
         info_rows = [
             ["Report Date:", datetime.now().strftime("%Y-%m-%d %H:%M")],
@@ -89,24 +179,8 @@ def generate_excel_report(documents, output_dir):
             ["Total Pages:", sum(doc.page_count for doc in documents if doc.page_count)],
             ["Total Paragraphs:", sum(doc.paragraph_count for doc in documents if doc.paragraph_count)]
         ]
-        
-        for idx, (label, value) in enumerate(info_rows, 16):
-            cover_sheet[f'B{idx}'] = label
-            cover_sheet[f'B{idx}'].font = Font(bold=True)
-            cover_sheet[f'C{idx}'] = value
-        
-        # Define styles
-        header_fill = PatternFill(start_color="3498DB", end_color="3498DB", fill_type="solid")
-        alt_row_fill = PatternFill(start_color="F2F6FC", end_color="F2F6FC", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=12)
-        border = Border(
-            left=Side(style='thin', color="BFBFBF"),
-            right=Side(style='thin', color="BFBFBF"),
-            top=Side(style='thin', color="BFBFBF"),
-            bottom=Side(style='thin', color="BFBFBF")
-        )
-        center_aligned = Alignment(horizontal='center', vertical='center')
-        wrapped_alignment = Alignment(wrap_text=True, vertical='top')
+        for label, value in info_rows:
+            cover_sheet.append([None, _cell(cover_sheet, label, font=Font(bold=True)), value])
         
         # Create dashboard sheet
         dashboard = wb.create_sheet("Dashboard")
@@ -114,7 +188,6 @@ def generate_excel_report(documents, output_dir):
         # Prepare data for dashboard charts
         file_types = {}
         doc_sizes = []
-        paragraph_counts = []
         
         for doc in documents:
             # Count file types
@@ -123,32 +196,19 @@ def generate_excel_report(documents, output_dir):
             
             # Collect document sizes for size distribution
             doc_sizes.append((doc.original_filename, doc.file_size / 1024))  # Size in KB
-            
-            # Collect paragraph counts
-            paragraph_counts.append((doc.original_filename, doc.paragraph_count or 0))
         
         # Add file type distribution chart (pie chart)
-        dashboard['A1'] = "File Type Distribution"
-        dashboard['A1'].font = Font(size=14, bold=True)
-        
-        # Write file type data
-        dashboard['A3'] = "File Type"
-        dashboard['B3'] = "Count"
-        dashboard['A3'].font = header_font
-        dashboard['B3'].font = header_font
-        dashboard['A3'].fill = header_fill
-        dashboard['B3'].fill = header_fill
-        
-        row = 4
+        dashboard.append([_cell(dashboard, "File Type Distribution", font=title_font)])
+        _pad_rows(dashboard, 1, 3)
+        dashboard.append(_header_row(dashboard, ["File Type", "Count"]))
         for file_type, count in file_types.items():
-            dashboard[f'A{row}'] = file_type
-            dashboard[f'B{row}'] = count
-            row += 1
+            dashboard.append([file_type, count])
+        last_type_row = 3 + len(file_types)
         
         # Create pie chart
         pie = PieChart()
-        labels = Reference(dashboard, min_col=1, min_row=4, max_row=row-1)
-        data = Reference(dashboard, min_col=2, min_row=3, max_row=row-1)
+        labels = Reference(dashboard, min_col=1, min_row=4, max_row=last_type_row)
+        data = Reference(dashboard, min_col=2, min_row=3, max_row=last_type_row)
         pie.add_data(data, titles_from_data=True)
         pie.set_categories(labels)
         pie.title = "Document Types"
@@ -160,27 +220,20 @@ def generate_excel_report(documents, output_dir):
         # Add the chart to the worksheet
         dashboard.add_chart(pie, "D3")
         
-        # Add document size chart (horizontal bar chart)
-        dashboard['A15'] = "Document Size Distribution"
-        dashboard['A15'].font = Font(size=14, bold=True)
-        
-        # Write size data
-        dashboard['A17'] = "Document"
-        dashboard['B17'] = "Size (KB)"
-        dashboard['A17'].font = header_font
-        dashboard['B17'].font = header_font
-        dashboard['A17'].fill = header_fill
-        dashboard['B17'].fill = header_fill
+        # Add document size chart (horizontal bar chart), below the file types
+        size_title_row = max(15, last_type_row + 2)
+        _pad_rows(dashboard, last_type_row, size_title_row)
+        dashboard.append([_cell(dashboard, "Document Size Distribution", font=title_font)])
+        dashboard.append([])
+        size_header_row = size_title_row + 2
+        dashboard.append(_header_row(dashboard, ["Document", "Size (KB)"]))
         
         # Sort documents by size (largest first)
         doc_sizes.sort(key=lambda x: x[1], reverse=True)
         doc_sizes = doc_sizes[:10]  # Top 10 documents by size
-        
-        row = 18
         for doc_name, size in doc_sizes:
-            dashboard[f'A{row}'] = doc_name
-            dashboard[f'B{row}'] = size
-            row += 1
+            dashboard.append([doc_name, size])
+        last_size_row = size_header_row + len(doc_sizes)
         
         # Create bar chart for document sizes
         bar = BarChart()
@@ -189,8 +242,8 @@ def generate_excel_report(documents, output_dir):
         bar.y_axis.title = "Document"
         bar.x_axis.title = "Size (KB)"
         
-        data = Reference(dashboard, min_col=2, min_row=17, max_row=row-1)
-        cats = Reference(dashboard, min_col=1, min_row=18, max_row=row-1)
+        data = Reference(dashboard, min_col=2, min_row=size_header_row, max_row=last_size_row)
+        cats = Reference(dashboard, min_col=1, min_row=size_header_row + 1, max_row=last_size_row)
         bar.add_data(data, titles_from_data=True)
         bar.set_categories(cats)
         
@@ -199,173 +252,121 @@ def generate_excel_report(documents, output_dir):
         bar.width = 20   # width in cm
         
         # Add the chart to the worksheet
-        dashboard.add_chart(bar, "D17")
+        dashboard.add_chart(bar, f"D{size_header_row}")
         
         # Create summary sheet with enhanced styling
         summary = wb.create_sheet("Summary")
+        summary.freeze_panes = 'A2'
         
-        # Prepare summary data
-        summary_data = []
+        # Prepare summary rows, measuring column widths in the same pass
+        headers = ['ID', 'Filename', 'File Type', 'File Size (KB)', 'Page Count', 'Paragraph Count',
+                   'Upload Date', 'Status', 'Text Length']
+        widths = [len(header) for header in headers]
+        summary_rows = []
         for doc in documents:
-            summary_data.append({
-                'ID': doc.id,
-                'Filename': doc.original_filename,
-                'File Type': doc.file_type.upper(),
-                'File Size (KB)': round(doc.file_size / 1024, 2),
-                'Page Count': doc.page_count or 0,
-                'Paragraph Count': doc.paragraph_count or 0,
-                'Upload Date': doc.upload_date.strftime("%Y-%m-%d %H:%M") if doc.upload_date else "",
-                'Status': doc.status.capitalize() if doc.status else "",
-                'Text Length': len(doc.extracted_text) if doc.extracted_text else 0,
-            })
-        
-        # Write summary headers
-        headers = list(summary_data[0].keys()) if summary_data else []
-        for col_idx, header in enumerate(headers, 1):
-            cell = summary.cell(row=1, column=col_idx, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = border
-            cell.alignment = center_aligned
-        
-        # Write summary data with alternating row colors
-        for row_idx, data_row in enumerate(summary_data, 2):
-            # Apply alternate row styling
-            row_fill = alt_row_fill if row_idx % 2 == 0 else None
-            
-            for col_idx, key in enumerate(headers, 1):
-                cell = summary.cell(row=row_idx, column=col_idx, value=data_row[key])
-                cell.border = border
-                if row_fill:
-                    cell.fill = row_fill
-        
-        # Auto-adjust column widths
-        for col_idx, header in enumerate(headers, 1):
-            column_letter = get_column_letter(col_idx)
-            max_length = len(str(header))
-            
-            for row_idx in range(2, len(summary_data) + 2):
-                cell_value = summary.cell(row=row_idx, column=col_idx).value
-                max_length = max(max_length, len(str(cell_value) if cell_value is not None else ""))
-            
-            adjusted_width = max_length + 4  # Add padding
-            summary.column_dimensions[column_letter].width = min(50, adjusted_width)  # Cap width at 50
+            values = [
+                doc.id,
+                doc.original_filename,
+                doc.file_type.upper(),
+                round(doc.file_size / 1024, 2),
+                doc.page_count or 0,
+                doc.paragraph_count or 0,
+                doc.upload_date.strftime("%Y-%m-%d %H:%M") if doc.upload_date else "",
+                doc.status.capitalize() if doc.status else "",
+                len(doc.extracted_text) if doc.extracted_text else 0,
+            ]
+            widths = [max(width, len(str(value))) for width, value in zip(widths, values)]
+            summary_rows.append(values)
+        
+        # Auto-adjust column widths (padded, capped at 50)
+        _set_column_widths(summary, [min(50, width + 4) for width in widths])
+        
+        # Write summary headers and data with alternating row colors
+        if documents:
+            summary.append(_header_row(summary, headers))
+        for row_idx, values in enumerate(summary_rows, 2):
+            style = 'report_cell_alt' if row_idx % 2 == 0 else 'report_cell'
+            summary.append([_cell(summary, value, style) for value in values])
         
         # Create text extract sheet
         text_sheet = wb.create_sheet("Full Text")
-        
-        # Add headers
-        headers = ["ID", "Filename", "Pages", "Extracted Text"]
-        for col_idx, header in enumerate(headers, 1):
-            cell = text_sheet.cell(row=1, column=col_idx, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = border
-            cell.alignment = center_aligned
-        
-        # Set column widths
-        text_sheet.column_dimensions['A'].width = 5
-        text_sheet.column_dimensions['B'].width = 40
-        text_sheet.column_dimensions['C'].width = 8
-        text_sheet.column_dimensions['D'].width = 120
+        text_sheet.freeze_panes = 'A2'
+        _set_column_widths(text_sheet, TEXT_COLUMN_WIDTHS)
+        text_sheet.append(_header_row(text_sheet, ["ID", "Filename", "Pages", "Extracted Text"]))
         
         # Write text data
         for row_idx, doc in enumerate(documents, 2):
-            text_sheet.cell(row=row_idx, column=1, value=doc.id).border = border
-            text_sheet.cell(row=row_idx, column=2, value=doc.original_filename).border = border
-            text_sheet.cell(row=row_idx, column=3, value=doc.page_count).border = border
+            suffix = '_alt' if row_idx % 2 == 0 else ''
             
             # Truncate text if necessary
-            text_cell = text_sheet.cell(row=row_idx, column=4)
-            text_cell.value = doc.extracted_text[:32000] if doc.extracted_text else "No text extracted"
-            text_cell.border = border
-            text_cell.alignment = wrapped_alignment
-            
-            # Apply alternate row styling
-            if row_idx % 2 == 0:
-                for col in range(1, 5):
-                    text_sheet.cell(row=row_idx, column=col).fill = alt_row_fill
+            text = doc.extracted_text[:CELL_TEXT_LIMIT] if doc.extracted_text else "No text extracted"
             
             # Set row height based on content
             text_sheet.row_dimensions[row_idx].height = 120
+            text_sheet.append([
+                _cell(text_sheet, doc.id, f'report_cell{suffix}'),
+                _cell(text_sheet, doc.original_filename, f'report_cell{suffix}'),
+                _cell(text_sheet, doc.page_count, f'report_cell{suffix}'),
+                _cell(text_sheet, text, f'report_text{suffix}'),
+            ])
+        
+        if progress:
+            progress(10)
         
         # Create paragraph sheet with enhanced styles
         para_sheet = wb.create_sheet("Paragraphs")
+        para_sheet.freeze_panes = 'A2'
+        _set_column_widths(para_sheet, PARAGRAPH_COLUMN_WIDTHS)
+        para_sheet.append(_header_row(para_sheet, ["ID", "Document Count", "Content", "Documents"]))
         
-        # Add headers
-        headers = ["ID", "Document Count", "Content", "Documents"]
-        for col_idx, header in enumerate(headers, 1):
-            cell = para_sheet.cell(row=1, column=col_idx, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = border
-            cell.alignment = center_aligned
-        
-        # Set column widths
-        para_sheet.column_dimensions['A'].width = 5
-        para_sheet.column_dimensions['B'].width = 15
-        para_sheet.column_dimensions['C'].width = 100
-        para_sheet.column_dimensions['D'].width = 40
-        
-        # Get all unique paragraphs from all documents
-        all_paragraphs = set()
-        for doc in documents:
-            for para in doc.paragraphs:
-                all_paragraphs.add(para)
+        # Paragraphs of the exported documents, most shared first, with the
+        # names of the exported documents containing each one
+        export_paragraphs = iter_export_paragraphs([doc.id for doc in documents])
         
-        # Sort paragraphs by number of documents (most shared first)
-        sorted_paragraphs = sorted(all_paragraphs, key=lambda p: len(p.documents), reverse=True)
+        # Upper bound on the rows (shared paragraphs are counted per document)
+        expected_rows = max(1, sum(doc.paragraph_count or 0 for doc in documents))
         
         # Write paragraph data
-        for row_idx, para in enumerate(sorted_paragraphs, 2):
-            # Get a list of document filenames this paragraph appears in
-            doc_list = [doc.original_filename for doc in para.documents if doc in documents]
-            
-            para_sheet.cell(row=row_idx, column=1, value=para.id).border = border
-            para_sheet.cell(row=row_idx, column=2, value=len(doc_list)).border = border
+        for row_idx, (para_id, content, doc_names, doc_count) in enumerate(export_paragraphs, 2):
+            # Highlight shared paragraphs, alternate row styling for the rest
+            if doc_count > 1:
+                suffix = '_shared'
+            elif row_idx % 2 == 0:
+                suffix = '_alt'
+            else:
+                suffix = ''
             
             # Truncate paragraph content for Excel if extremely long
-            content_cell = para_sheet.cell(row=row_idx, column=3)
-            content = para.content
-            if len(content) > 32000:  # Excel cell limit
-                content = content[:32000] + "... (truncated)"
-            content_cell.value = content
-            content_cell.border = border
-            content_cell.alignment = wrapped_alignment
-            
-            doc_cell = para_sheet.cell(row=row_idx, column=4)
-            doc_cell.value = ", ".join(doc_list)
-            doc_cell.border = border
-            doc_cell.alignment = wrapped_alignment
-            
-            # Apply alternate row styling and highlight shared paragraphs
-            if len(doc_list) > 1:
-                # Shared paragraph - light highlight
-                highlight_fill = PatternFill(start_color="E3F2FD", end_color="E3F2FD", fill_type="solid")
-                for col in range(1, 5):
-                    para_sheet.cell(row=row_idx, column=col).fill = highlight_fill
-            elif row_idx % 2 == 0:
-                # Alternate row styling for non-shared paragraphs
-                for col in range(1, 5):
-                    para_sheet.cell(row=row_idx, column=col).fill = alt_row_fill
+            if len(content) > CELL_TEXT_LIMIT:
+                content = content[:CELL_TEXT_LIMIT] + "... (truncated)"
             
             # Set row height based on content
             para_sheet.row_dimensions[row_idx].height = 100
-        
-        # Freeze the header row in all sheets
-        summary.freeze_panes = summary["A2"]
-        text_sheet.freeze_panes = text_sheet["A2"]
-        para_sheet.freeze_panes = para_sheet["A2"]
+            para_sheet.append([
+                _cell(para_sheet, para_id, f'report_cell{suffix}'),
+                _cell(para_sheet, doc_count, f'report_cell{suffix}'),
+                _cell(para_sheet, content, f'report_text{suffix}'),
+                _cell(para_sheet, doc_names, f'report_text{suffix}'),
+            ])
+            # Rows are on disk once appended; drop their dimensions too
+            del para_sheet.row_dimensions[row_idx]
+            
+            if progress and (row_idx - 1) % PROGRESS_EVERY == 0:
+                progress(10 + 85 * min(1, (row_idx - 1) / expected_rows))
         
         # Generate timestamp for filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = os.path.join(output_dir, f'document_analysis_{timestamp}.xlsx')
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f'document_analysis_{timestamp}.xlsx'
+        filename = os.path.join(output_dir, filename)
         
         # Save the workbook
         wb.save(filename)
+        if progress:
+            progress(100)
         
         logger.info(f"Enhanced Excel report generated successfully: {filename}")
         return os.path.basename(filename)
     except Exception as e:
         logger.error(f"Error generating Excel report: {str(e)}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,177 @@
+import os
+import glob
+import json
+import time
+import hashlib
+import logging
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+# Generated reports in the upload folder; the name carries the cache key
+REPORT_PREFIX = 'document_analysis_'
+REPORT_PATTERN = REPORT_PREFIX + '*.xlsx'
+
+# Report types that can be requested, and the file extension of each
+REPORT_TYPES = {'excel': 'xlsx'}
+
+def report_cache_key(db_session, report_type, filters):
+    """
+    Return the cache key of a report: it changes whenever the corpus does.
+
+    Args:
+        db_session: SQLAlchemy session
+        report_type (str): Key of REPORT_TYPES
+        filters (dict): Document filters the report is built from
+
+    Returns:
+        str: Hex key
+    """
+    from utils.http_cache import get_corpus_generation
+
+    generation, _ = get_corpus_generation(db_session)
+    raw = json.dumps([generation, report_type, filters], sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def report_filename(key, report_type='excel'):
+    """Return the stored filename of the report with a cache key."""
+    return f"{REPORT_PREFIX}{key[:16]}.{REPORT_TYPES[report_type]}"
+
+def find_export_job(db_session, key):
+    """Return the queued or running export job building the report with a cache key, if any."""
+    from models import BackgroundJob
+
+    return db_session.query(BackgroundJob).filter(
+        BackgroundJob.dedupe_key == key,
+        BackgroundJob.status.in_(['queued', 'running'])
+    ).first()
+
+def request_report(db_session, output_dir, report_type, filters):
+    """
+    Return a cached report, or the background job that will build it.
+
+    A report already built for the current corpus generation is returned
+    straight away; a request for one that is being built joins the existing
+    job. Otherwise an 'export' job is queued and committed. The job carries
+    the cache key as its dedupe_key, so of two requests racing to queue the
+    same report only one insert commits and the other joins its job.
+
+    Args:
+        db_session: SQLAlchemy session
+        output_dir (str): Folder reports are stored in
+        report_type (str): Key of REPORT_TYPES
+        filters (dict): Document filters (column: value) the report is built from
+
+    Returns:
+        tuple: (filename, None) for a cached report, (None, BackgroundJob) otherwise
+    """
+    from utils.job_queue import enqueue_job
+
+    key = report_cache_key(db_session, report_type, filters)
+    filename = report_filename(key, report_type)
+    path = os.path.join(output_dir, filename)
+    if os.path.exists(path):
+        # Reports in use are kept from being pruned
+        os.utime(path)
+        db_session.commit()
+        return filename, None
+
+    job = find_export_job(db_session, key)
+    if job is None:
+        job = enqueue_job(db_session, 'export', payload={
+            'key': key, 'report_type': report_type, 'filters': filters, 'filename': filename
+        }, dedupe_key=key)
+        try:
+            db_session.commit()
+        except IntegrityError:
+            # Another request queued the same report first
+            db_session.rollback()
+            job = find_export_job(db_session, key)
+            if job is None:
+                # ...and it has finished since
+                return request_report(db_session, output_dir, report_type, filters)
+            return None, job
+        logger.info(f"Queued export job {job.id} for {filename}")
+    return None, job
+
+def set_job_progress(engine, job_id, percent):
+    """
+    Record the progress of a running job.
+
+    Written on a connection of its own, so a job can report progress while
+    its session is in the middle of reading a streaming query.
+    """
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE background_job SET progress = :progress WHERE id = :id"),
+                           {'progress': int(percent), 'id': job_id})
+
+def build_report(job, db, output_dir):
+    """
+    Build the report described by an export job's payload.
+
+    The workbook is written under a temporary name and renamed into place,
+    so a half-written file is never served from the cache.
+
+    Returns:
+        str: Stored filename of the report
+    """
+    from models import Document
+    from utils.excel_exporter import generate_excel_report
+
+    payload = job.get_payload()
+    filename = payload['filename']
+    if os.path.exists(os.path.join(output_dir, filename)):
+        return filename
+
+    documents = Document.query.filter_by(**payload.get('filters', {})).order_by(Document.id).all()
+    if not documents:
+        raise ValueError('No documents match the export filters')
+
+    last_update = [0.0]
+
+    def progress(percent):
+        # At most one progress write per second
+        if time.time() - last_update[0] >= 1 or percent >= 100:
+            set_job_progress(db.engine, job.id, percent)
+            last_update[0] = time.time()
+
+    temp_name = f"{filename}.{os.getpid()}.tmp"
+    try:
+        generate_excel_report(documents, output_dir, filename=temp_name, progress=progress)
+        os.replace(os.path.join(output_dir, temp_name), os.path.join(output_dir, filename))
+    finally:
+        temp_path = os.path.join(output_dir, temp_name)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return filename
+
+def prune_reports(output_dir, max_age_seconds, keep=None):
+    """
+    Remove generated reports older than max_age_seconds.
+
+    Only files named like generated reports are considered; uploaded
+    documents in the same folder are never touched.
+
+    Args:
+        output_dir (str): Folder reports are stored in
+        max_age_seconds (int): Age after which a report is removed
+        keep (str): Filename to keep regardless of age (the one just built)
+
+    Returns:
+        int: Number of reports removed
+    """
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for path in glob.glob(os.path.join(output_dir, REPORT_PATTERN)):
+        if os.path.basename(path) == keep:
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass  # Removed by another worker meanwhile
+    if removed:
+        logger.info(f"Pruned {removed} old reports from {output_dir}")
+    return removed
@@ -1,6 +1,7 @@
 import os
 from werkzeug.utils import secure_filename
 import uuid
+import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
@@ -55,6 +56,41 @@ def validate_file_size(file, max_size):
     
     return True, "File size is valid"
 
+def save_file_with_hash(file, file_path, chunk_size=64 * 1024):
+    """
+    Stream an uploaded file to disk, computing its SHA-256 on the way.
+    
+    Args:
+        file: The uploaded file object
+        file_path (str): Destination path
+        chunk_size (int): Bytes read per chunk
+        
+    Returns:
+        str: Hex digest of the file contents
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'wb') as out:
+        while True:
+            chunk = file.stream.read(chunk_size)
+            if not chunk:
+                break
+            sha256.update(chunk)
+            out.write(chunk)
+    return sha256.hexdigest()
+
+def compute_file_hash(file_path, chunk_size=64 * 1024):
+    """
+    Compute the SHA-256 of a file on disk without loading it into memory.
+    
+    Returns:
+        str: Hex digest of the file contents
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
 def save_uploaded_file(file, upload_folder, allowed_extensions, max_size=16*1024*1024):
     """
     Save an uploaded file with validation.
@@ -90,8 +126,8 @@ def save_uploaded_file(file, upload_folder, allowed_extensions, max_size=16*1024
         unique_filename = f"{str(uuid.uuid4())}_{original_filename}"
         file_path = os.path.join(upload_folder, unique_filename)
         
-        # Save the file
-        file.save(file_path)
+        # Save the file, hashing it while it streams to disk
+        content_hash = save_file_with_hash(file, file_path)
         logger.info(f"File saved: {file_path}")
         
         # Return success and file details
@@ -100,7 +136,8 @@ def save_uploaded_file(file, upload_folder, allowed_extensions, max_size=16*1024
             "unique_filename": unique_filename,
             "file_type": file_type,
             "file_path": file_path,
-            "file_size": os.path.getsize(file_path)
+            "file_size": os.path.getsize(file_path),
+            "content_hash": content_hash
         }
     except Exception as e:
         logger.exception(f"Error saving file {file.filename}: {str(e)}")
@@ -0,0 +1,136 @@
+import uuid
+import logging
+from datetime import datetime
+from functools import wraps
+from sqlalchemy import text
+from flask import request, make_response, current_app
+
+logger = logging.getLogger(__name__)
+
+# Tables whose writes change what the JSON endpoints return. Paragraph rows
+# are only written by ingestion and deletion, which always touch document
+# (status updates, deletes) in the same work, so they aren't watched
+# themselves; that keeps bulk paragraph inserts free of trigger overhead
+CORPUS_TABLES = ('document', 'tag', 'document_tag', 'paragraph_tag', 'document_similarity')
+
+CORPUS_GENERATION_DDL = """CREATE TABLE IF NOT EXISTS corpus_generation (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    epoch VARCHAR(32) NOT NULL,
+    generation INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+)"""
+
+# One counter bumped by triggers on every write to a watched table, so any
+# write path (ORM, bulk statements, other processes) invalidates validators
+CORPUS_GENERATION_TRIGGER_STATEMENTS = [
+    f"""CREATE TRIGGER IF NOT EXISTS corpus_generation_{table}_{event.lower()} AFTER {event} ON {table} BEGIN
+        UPDATE corpus_generation SET generation = generation + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+    END"""
+    for table in CORPUS_TABLES
+    for event in ('INSERT', 'UPDATE', 'DELETE')
+]
+
+def ensure_corpus_generation(db_session):
+    """
+    Create the corpus generation counter and its triggers if they don't exist yet.
+
+    The row gets a random epoch, so validators issued for a database that has
+    since been recreated (and counts from zero again) never match.
+
+    Args:
+        db_session: SQLAlchemy session
+    """
+    db_session.execute(text(CORPUS_GENERATION_DDL))
+    db_session.execute(text(
+        "INSERT OR IGNORE INTO corpus_generation (id, epoch, generation) VALUES (1, :epoch, 0)"
+    ), {'epoch': uuid.uuid4().hex})
+    for statement in CORPUS_GENERATION_TRIGGER_STATEMENTS:
+        db_session.execute(text(statement))
+    db_session.commit()
+
+def get_corpus_generation(db_session):
+    """
+    Return the current corpus generation.
+
+    Returns:
+        tuple: (etag, last_modified datetime), or (None, None) if the
+            counter row is missing
+    """
+    row = db_session.execute(text(
+        "SELECT epoch, generation, updated_at FROM corpus_generation WHERE id = 1"
+    )).first()
+    if row is None:
+        return None, None
+    updated_at = row[2]
+    if isinstance(updated_at, str):
+        updated_at = datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S')
+    return f"{row[0][:12]}-{row[1]}", updated_at
+
+def set_cache_headers(response, etag=None, last_modified=None, max_age=0, immutable=False):
+    """
+    Set validators and Cache-Control on a response.
+
+    Immutable content may be reused by the browser for max_age seconds without
+    asking; anything else must be revalidated on every use (a cheap 304 when
+    the validators still match).
+    """
+    if etag:
+        response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    if immutable:
+        response.headers['Cache-Control'] = f'public, max-age={max_age}, immutable'
+    else:
+        response.headers['Cache-Control'] = f'private, no-cache, max-age={max_age}'
+    return response
+
+def not_modified(etag, last_modified=None, max_age=0, immutable=False):
+    """
+    Answer a conditional GET whose validators still match.
+
+    Returns:
+        Response: 304 response to return as-is, or None if the client's copy
+            is missing or stale and the full response has to be built
+    """
+    # Only the ETag is compared: Last-Modified has one-second resolution and
+    # would hide a second write within the same second
+    if request.method not in ('GET', 'HEAD') or not request.if_none_match.contains(etag):
+        return None
+    response = make_response('', 304)
+    return set_cache_headers(response, etag, last_modified, max_age, immutable)
+
+def conditional_json():
+    """
+    Decorator giving a JSON endpoint validators derived from the corpus generation.
+
+    A request carrying the current ETag is answered with 304 before the view
+    runs; otherwise the view's successful response gets the ETag,
+    Last-Modified and a must-revalidate policy.
+
+    Example usage:
+
+    @app.route('/api/tags')
+    @conditional_json()
+    def api_tags():
+        ...
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            from models import db
+
+            etag, last_modified = get_corpus_generation(db.session)
+            if etag is None:
+                return f(*args, **kwargs)
+
+            max_age = current_app.config['HTTP_JSON_MAX_AGE']
+            cached = not_modified(etag, last_modified, max_age)
+            if cached is not None:
+                return cached
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                set_cache_headers(response, etag, last_modified, max_age)
+            return response
+        return decorated_function
+    return decorator
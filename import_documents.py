@@ -0,0 +1,118 @@
+"""
+Bulk import documents from a directory.
+
+Copies every PDF/DOCX file under the given directory into the upload folder,
+creates Document records and ingests them in parallel: extraction and
+segmentation are spread across a process pool sized to the CPU count while
+this process performs all database writes. Files whose contents match an
+existing document are skipped or reuse its analysis, per DUPLICATE_UPLOAD_POLICY.
+
+    python import_documents.py /path/to/documents --processes 16
+"""
+import os
+import uuid
+import shutil
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+def collect_files(source_dir, allowed_extensions):
+    """Return the paths of all importable files below source_dir."""
+    paths = []
+    for root, _, filenames in os.walk(source_dir):
+        for filename in sorted(filenames):
+            if '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions:
+                paths.append(os.path.join(root, filename))
+    return paths
+
+def main():
+    from app import create_app
+    from models import db, Document, DocumentSimilarity, Paragraph
+    from utils.similarity_analyzer import update_document_similarities, update_paragraph_index
+    from utils.ingestion import ingest_documents_parallel, find_duplicate_document
+    from utils.file_utils import compute_file_hash
+
+    parser = argparse.ArgumentParser(description='Bulk import documents into the document analyzer')
+    parser.add_argument('source_dir', help='Directory to import PDF and DOCX files from')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Number of extraction processes (default: INGEST_PROCESSES)')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='Documents committed per batch (default: INGEST_BATCH_SIZE)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+    app = create_app()
+    with app.app_context():
+        upload_folder = app.config['UPLOAD_FOLDER']
+        processes = args.processes or app.config['INGEST_PROCESSES']
+        batch_size = args.batch_size or app.config['INGEST_BATCH_SIZE']
+
+        paths = collect_files(args.source_dir, app.config['ALLOWED_EXTENSIONS'])
+        logger.info(f"Found {len(paths)} files to import from {args.source_dir}")
+
+        imported = 0
+        failed = 0
+        skipped = 0
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for start in range(0, len(paths), batch_size):
+                documents = []
+                for path in paths[start:start + batch_size]:
+                    content_hash = compute_file_hash(path)
+                    duplicate = find_duplicate_document(content_hash, processed_only=False)
+                    if duplicate and app.config['DUPLICATE_UPLOAD_POLICY'] == 'reject':
+                        logger.info(f"Skipping {path}: identical to document {duplicate.id} ({duplicate.original_filename})")
+                        skipped += 1
+                        continue
+
+                    original_filename = secure_filename(os.path.basename(path))
+                    unique_filename = f"{str(uuid.uuid4())}_{original_filename}"
+                    destination = os.path.join(upload_folder, unique_filename)
+                    shutil.copyfile(path, destination)
+
+                    document = Document(
+                        filename=unique_filename,
+                        original_filename=original_filename,
+                        file_type=original_filename.rsplit('.', 1)[1].lower(),
+                        file_size=os.path.getsize(destination),
+                        content_hash=content_hash,
+                        status='pending'
+                    )
+                    db.session.add(document)
+                    documents.append(document)
+                db.session.commit()
+
+                results = ingest_documents_parallel(documents, upload_folder, db.session, executor=executor)
+                for document in documents:
+                    error = results.get(document.id)
+                    if error is None:
+                        imported += 1
+                    else:
+                        failed += 1
+                        document.status = 'error'
+                        document.error_message = str(error)
+                db.session.commit()
+
+                logger.info(f"Imported {imported + failed + skipped} of {len(paths)} files")
+
+        logger.info(f"Import complete: {imported} processed, {failed} failed, {skipped} duplicates skipped")
+
+        if imported:
+            # Score the imported documents against the corpus (refits if the import was large)
+            update_document_similarities(
+                db, Document, DocumentSimilarity,
+                app.config['DOCUMENT_VECTORS_PATH'],
+                refit_ratio=app.config['SIMILARITY_REFIT_RATIO'],
+                block_nonzeros=app.config['SIMILARITY_BLOCK_NONZEROS']
+            )
+            update_paragraph_index(
+                db, Paragraph,
+                app.config['PARAGRAPH_VECTORS_PATH'],
+                refit_ratio=app.config['SIMILARITY_REFIT_RATIO']
+            )
+
+if __name__ == '__main__':
+    main()
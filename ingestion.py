@@ -0,0 +1,260 @@
+import os
+import json
+import logging
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sqlalchemy import select, literal
+from utils.paragraph_processor import segment_paragraphs, store_paragraphs
+from utils.pdf_extractor import extract_text_from_pdf, create_pdf_preview_info
+from utils.docx_extractor import extract_text_from_docx, create_docx_preview_info
+
+logger = logging.getLogger(__name__)
+
+def extract_document(file_path, file_type):
+    """
+    Extract text and preview information from a stored document file.
+
+    Args:
+        file_path (str): Path to the stored file
+        file_type (str): 'pdf' or 'docx'
+
+    Returns:
+        tuple: (text, page_count, preview_info)
+    """
+    if file_type == 'pdf':
+        text, page_count = extract_text_from_pdf(file_path)
+        preview_info = create_pdf_preview_info(file_path)
+    elif file_type == 'docx':
+        text, page_count = extract_text_from_docx(file_path)
+        preview_info = create_docx_preview_info(file_path, page_count)
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+    return text, page_count, preview_info
+
+def find_duplicate_document(content_hash, exclude_id=None, processed_only=True):
+    """
+    Find an existing document with the same file contents.
+
+    Args:
+        content_hash (str): SHA-256 of the file bytes
+        exclude_id (int): Optional document ID to ignore (the document being ingested)
+        processed_only (bool): Only match documents whose analysis is complete;
+            otherwise match any document that has not failed
+
+    Returns:
+        Document: The oldest matching document, or None
+    """
+    from models import Document
+
+    if not content_hash:
+        return None
+
+    query = Document.query.filter(Document.content_hash == content_hash)
+    if exclude_id:
+        query = query.filter(Document.id != exclude_id)
+    if processed_only:
+        query = query.filter(Document.status == 'processed')
+    else:
+        query = query.filter(Document.status != 'error')
+
+    return query.order_by(Document.id).first()
+
+def copy_document_analysis(source, document, db_session):
+    """
+    Reuse the analysis of an identical, already processed document.
+
+    Copies the extracted text, counts and preview information, and duplicates
+    the source's paragraph associations (with positions) in a single
+    INSERT ... SELECT. The caller is responsible for committing.
+
+    Args:
+        source: Processed Document with the same content hash
+        document: Document to fill in
+        db_session: SQLAlchemy session
+    """
+    from models import document_paragraph
+
+    document.extracted_text = source.extracted_text
+    document.page_count = source.page_count
+    document.paragraph_count = source.paragraph_count
+
+    preview_info = source.get_preview_info()
+    if preview_info:
+        # Point the preview info at this document's own stored file
+        preview_info['base_filename'] = os.path.splitext(document.filename)[0]
+        document.preview_data = json.dumps(preview_info)
+
+    # Replace any partial associations left by an earlier attempt
+    db_session.execute(
+        document_paragraph.delete().where(document_paragraph.c.document_id == document.id)
+    )
+    db_session.execute(
+        document_paragraph.insert().from_select(
+            ['document_id', 'paragraph_id', 'position'],
+            select(
+                literal(document.id),
+                document_paragraph.c.paragraph_id,
+                document_paragraph.c.position
+            ).where(document_paragraph.c.document_id == source.id)
+        )
+    )
+
+    document.status = 'processed'
+    document.processed_at = datetime.utcnow()
+    document.error_message = None
+    logger.info(f"Reused analysis of document {source.id} for duplicate upload {document.original_filename}")
+
+def analyze_file(file_path, file_type):
+    """
+    Run the CPU-bound part of ingestion: extraction and segmentation.
+
+    Touches no database state and returns only picklable data, so it can be
+    submitted to a ProcessPoolExecutor.
+
+    Returns:
+        dict: text, page_count, preview_info and paragraphs (in document order)
+    """
+    text, page_count, preview_info = extract_document(file_path, file_type)
+    return {
+        'text': text,
+        'page_count': page_count,
+        'preview_info': preview_info,
+        'paragraphs': segment_paragraphs(text)
+    }
+
+def store_analysis(document, analysis, db_session):
+    """
+    Write the result of analyze_file for a document and mark it processed.
+
+    Returns:
+        int: Number of paragraphs associated with the document
+    """
+    document.extracted_text = analysis['text']
+    document.page_count = analysis['page_count']
+    if analysis['preview_info']:
+        document.preview_data = json.dumps(analysis['preview_info'])
+
+    paragraph_count = store_paragraphs(analysis['paragraphs'], document, db_session)
+
+    document.paragraph_count = paragraph_count
+    document.status = 'processed'
+    document.processed_at = datetime.utcnow()
+    document.error_message = None
+    db_session.commit()
+
+    logger.info(f"Found {paragraph_count} paragraphs in {document.page_count} pages for document {document.original_filename}")
+    return paragraph_count
+
+def ingest_document(document, upload_folder, db_session):
+    """
+    Run the ingestion pipeline for a pending document.
+
+    The document moves through pending -> extracting -> segmenting -> processed,
+    committing at each stage so the status is visible to the web process while
+    the worker is busy. Re-running the pipeline on a partially ingested document
+    is safe: paragraph associations that already exist are skipped.
+
+    Args:
+        document: Document object in 'pending' (or a retried) state
+        upload_folder (str): Folder containing the stored file
+        db_session: SQLAlchemy session
+
+    Returns:
+        int: Number of paragraphs associated with the document
+    """
+    file_path = os.path.join(upload_folder, document.filename)
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Document file not found: {file_path}")
+
+    # Identical content was already analyzed: skip extraction entirely
+    duplicate = find_duplicate_document(document.content_hash, exclude_id=document.id)
+    if duplicate:
+        copy_document_analysis(duplicate, document, db_session)
+        db_session.commit()
+        return document.paragraph_count
+
+    # Stage 1: text extraction
+    document.status = 'extracting'
+    document.error_message = None
+    db_session.commit()
+
+    text, page_count, preview_info = extract_document(file_path, document.file_type)
+
+    # Stage 2: paragraph segmentation
+    document.status = 'segmenting'
+    db_session.commit()
+
+    analysis = {
+        'text': text,
+        'page_count': page_count,
+        'preview_info': preview_info,
+        'paragraphs': segment_paragraphs(text)
+    }
+    return store_analysis(document, analysis, db_session)
+
+def ingest_documents_parallel(documents, upload_folder, db_session, executor=None, max_workers=None):
+    """
+    Ingest several documents, fanning extraction and segmentation out to processes.
+
+    analyze_file runs in a process pool while the calling process acts as the
+    single database writer, storing each result as soon as it completes. This
+    keeps all SQLite writes on one connection, so throughput scales with the
+    number of cores rather than being limited by write contention.
+
+    Args:
+        documents (list): Document objects to ingest
+        upload_folder (str): Folder containing the stored files
+        db_session: SQLAlchemy session used by the writer
+        executor: Optional existing ProcessPoolExecutor to reuse
+        max_workers (int): Pool size when no executor is given (default: CPU count)
+
+    Returns:
+        dict: Mapping of document ID to the exception raised for it, or None on success
+    """
+    results = {}
+    if not documents:
+        return results
+
+    for document in documents:
+        document.status = 'extracting'
+        document.error_message = None
+    db_session.commit()
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+
+    try:
+        futures = {}
+        for document in documents:
+            file_path = os.path.join(upload_folder, document.filename)
+            if not os.path.exists(file_path):
+                results[document.id] = FileNotFoundError(f"Document file not found: {file_path}")
+                continue
+
+            duplicate = find_duplicate_document(document.content_hash, exclude_id=document.id)
+            if duplicate:
+                copy_document_analysis(duplicate, document, db_session)
+                db_session.commit()
+                results[document.id] = None
+                continue
+
+            futures[executor.submit(analyze_file, file_path, document.file_type)] = document
+
+        # Single writer: store results in completion order
+        for future in as_completed(futures):
+            document = futures[future]
+            try:
+                store_analysis(document, future.result(), db_session)
+                results[document.id] = None
+            except Exception as e:
+                db_session.rollback()
+                logger.error(f"Error ingesting document {document.original_filename}: {str(e)}")
+                results[document.id] = e
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    logger.info(f"Parallel ingestion finished: {sum(1 for e in results.values() if e is None)} of {len(documents)} documents processed")
+    return results
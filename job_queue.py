@@ -0,0 +1,240 @@
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import func, text
+from sqlalchemy.exc import OperationalError
+from models import BackgroundJob, Document
+
+logger = logging.getLogger(__name__)
+
+def enqueue_job(db_session, job_type, document_id=None, payload=None, priority=0, unique=False, dedupe_key=None):
+    """
+    Add a job to the durable job table.
+
+    The job is only visible to workers once the caller commits the session,
+    so it can be queued in the same transaction as the document it refers to.
+
+    Args:
+        db_session: SQLAlchemy session
+        job_type (str): Handler name registered in worker.py (e.g. 'ingest')
+        document_id (int): Optional document the job operates on
+        payload (dict): Optional JSON-serializable job arguments
+        priority (int): Lower values are claimed first
+        unique (bool): Reuse an already queued job of the same type and document
+            instead of adding another one
+        dedupe_key (str): Key no other queued or running job may hold; enforced
+            by a unique index, so a concurrent duplicate fails with
+            IntegrityError when the session is committed
+
+    Returns:
+        BackgroundJob: The queued job
+    """
+    if unique:
+        existing = db_session.query(BackgroundJob).filter(
+            BackgroundJob.job_type == job_type,
+            BackgroundJob.document_id == document_id,
+            BackgroundJob.status == 'queued'
+        ).first()
+        if existing is not None:
+            return existing
+
+    job = BackgroundJob(
+        job_type=job_type,
+        document_id=document_id,
+        payload=json.dumps(payload) if payload else None,
+        priority=priority,
+        status='queued',
+        dedupe_key=dedupe_key
+    )
+    db_session.add(job)
+    return job
+
+def claim_next_job(db_session, worker_id, job_types=None, max_races=5):
+    """
+    Atomically claim the next queued job for a worker.
+
+    Claiming is a conditional UPDATE on the job's status, so when several
+    worker processes race for the same row exactly one of them wins; the
+    losers simply try the next candidate. No external broker is needed.
+
+    Args:
+        db_session: SQLAlchemy session
+        worker_id (str): Identifier recorded on the claimed job
+        job_types (list): Optional list of job types this worker handles
+        max_races (int): How many lost races to tolerate before giving up
+
+    Returns:
+        BackgroundJob: The claimed job, or None if the queue is empty
+    """
+    for _ in range(max_races):
+        query = db_session.query(BackgroundJob.id).filter(BackgroundJob.status == 'queued')
+        if job_types:
+            query = query.filter(BackgroundJob.job_type.in_(job_types))
+        candidate = query.order_by(BackgroundJob.priority, BackgroundJob.id).first()
+
+        if candidate is None:
+            # End the read transaction so we don't pin an old snapshot while idle
+            db_session.commit()
+            return None
+
+        claimed = db_session.query(BackgroundJob).filter(
+            BackgroundJob.id == candidate.id,
+            BackgroundJob.status == 'queued'
+        ).update({
+            'status': 'running',
+            'worker_id': worker_id,
+            'locked_at': datetime.utcnow(),
+            'attempts': BackgroundJob.attempts + 1
+        }, synchronize_session=False)
+        db_session.commit()
+
+        if claimed == 1:
+            return db_session.get(BackgroundJob, candidate.id)
+
+        logger.debug(f"Worker {worker_id} lost the race for job {candidate.id}, retrying")
+
+    return None
+
+def claim_jobs(db_session, worker_id, job_types=None, limit=1):
+    """
+    Claim up to `limit` queued jobs for a worker that processes them as a batch.
+
+    Returns:
+        list: Claimed BackgroundJob objects (empty if the queue is empty)
+    """
+    jobs = []
+    while len(jobs) < limit:
+        job = claim_next_job(db_session, worker_id, job_types)
+        if job is None:
+            break
+        jobs.append(job)
+    return jobs
+
+def complete_job(db_session, job):
+    """Mark a claimed job as successfully finished."""
+    job.status = 'done'
+    job.error_message = None
+    job.finished_at = datetime.utcnow()
+    db_session.commit()
+
+def fail_job(db_session, job, error, max_attempts):
+    """
+    Record a job failure, requeueing it if it has attempts left.
+
+    Returns:
+        bool: True if the job will be retried, False if it failed permanently
+    """
+    retry = (job.attempts or 0) < max_attempts
+    job.status = 'queued' if retry else 'failed'
+    job.error_message = str(error)
+    job.worker_id = None
+    job.locked_at = None
+    if not retry:
+        job.finished_at = datetime.utcnow()
+    db_session.commit()
+    return retry
+
+def renew_leases(engine, job_ids, worker_id):
+    """
+    Move the lease of running jobs forward to now.
+
+    Written on a connection of its own, so it doesn't wait for (or commit)
+    the handler's session. Jobs taken over by another worker are left alone.
+
+    Returns:
+        int: Number of leases renewed
+    """
+    with engine.begin() as connection:
+        result = connection.execute(text(
+            "UPDATE background_job SET locked_at = :now "
+            "WHERE id IN ({}) AND status = 'running' AND worker_id = :worker_id".format(
+                ', '.join(str(int(job_id)) for job_id in job_ids))
+        ), {'now': datetime.utcnow(), 'worker_id': worker_id})
+        return result.rowcount
+
+@contextmanager
+def lease_heartbeat(engine, job_ids, worker_id, lease_seconds):
+    """
+    Keep the leases of claimed jobs alive while a with block runs them.
+
+    A daemon thread renews the leases every third of lease_seconds, so a
+    job that legitimately runs longer than the lease (a full similarity
+    refit, a large export) isn't requeued and run twice; a worker that
+    dies stops renewing and its jobs are recovered by requeue_stale_jobs.
+    """
+    job_ids = list(job_ids)
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(lease_seconds / 3):
+            try:
+                renew_leases(engine, job_ids, worker_id)
+            except OperationalError as e:
+                # The database is busy; the next beat comes well before the lease runs out
+                logger.warning(f"Could not renew the lease of jobs {job_ids}: {str(e)}")
+
+    thread = threading.Thread(target=beat, name='lease-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def requeue_stale_jobs(db_session, lease_seconds, max_attempts):
+    """
+    Return jobs abandoned by dead workers to the queue.
+
+    A job stays 'running' if its worker crashed or the box restarted mid-job.
+    Workers renew the lease of the jobs they run (see lease_heartbeat), so
+    one whose lease hasn't been renewed for lease_seconds has lost its
+    worker; it is requeued, or failed if it has already used up its
+    attempts, and the document of a failed ingest job is marked 'error'.
+
+    Returns:
+        int: Number of jobs requeued
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=lease_seconds)
+    stale = BackgroundJob.query.filter(
+        BackgroundJob.status == 'running',
+        BackgroundJob.locked_at < cutoff
+    ).all()
+
+    requeued = 0
+    for job in stale:
+        error = f"Lease held by {job.worker_id} expired"
+        if (job.attempts or 0) < max_attempts:
+            job.status = 'queued'
+            requeued += 1
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            if job.job_type == 'ingest' and job.document_id:
+                # As in the worker's failure path, the document must not stay 'extracting'
+                document = Document.query.get(job.document_id)
+                if document is not None and document.status != 'processed':
+                    document.status = 'error'
+                    document.error_message = error
+        job.error_message = error
+        job.worker_id = None
+        job.locked_at = None
+
+    db_session.commit()
+    if stale:
+        logger.warning(f"Recovered {len(stale)} stale jobs ({requeued} requeued)")
+    return requeued
+
+def get_queue_counts(db_session, job_type=None):
+    """
+    Get the number of jobs in each status.
+
+    Returns:
+        dict: Dictionary mapping status to job count
+    """
+    query = db_session.query(BackgroundJob.status, func.count(BackgroundJob.id))
+    if job_type:
+        query = query.filter(BackgroundJob.job_type == job_type)
+
+    return {status: count for status, count in query.group_by(BackgroundJob.status).all()}
@@ -0,0 +1,200 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bytes read per seek when scanning a log file backwards from the end
+TAIL_BLOCK_SIZE = 64 * 1024
+
+def parse_log_line(line):
+    """
+    Parse a line written by the app's log formatter.
+
+    Expected format: "2023-01-01 12:34:56,789 INFO: message [in file.py:line]"
+
+    Returns:
+        dict: timestamp, level, message and location; a line in another format
+            (a traceback, say) comes back whole as the message of an UNKNOWN entry
+    """
+    try:
+        parts = line.split(' ', 3)
+        timestamp = f"{parts[0]} {parts[1]}"
+        level = parts[2].strip(':')
+        message = parts[3]
+
+        # Extract location if present
+        location = ""
+        if " [in " in message and message.endswith("]"):
+            message, location = message.rsplit(" [in ", 1)
+            location = f"[in {location}"
+
+        return {
+            'timestamp': timestamp,
+            'level': level,
+            'message': message.strip(),
+            'location': location.strip()
+        }
+    except Exception:
+        return {
+            'timestamp': '',
+            'level': 'UNKNOWN',
+            'message': line.strip(),
+            'location': ''
+        }
+
+def matches_level(line, level):
+    """Return True if a log line was logged at level (any line when level is empty)."""
+    return not level or f" {level.upper()}: " in line
+
+def _decode(raw):
+    return raw.decode('utf-8', errors='replace').rstrip('\r\n')
+
+def read_tail(log_path, limit, level=None, before=None, max_scan_bytes=None):
+    """
+    Return the last lines of a log file, reading backwards from the end in blocks.
+
+    Only complete lines are returned: a line still being written at the end
+    of the file is left for the next read. Scanning stops once limit lines
+    have matched or max_scan_bytes have been read, so the cost of a call
+    doesn't grow with the size of the file.
+
+    Args:
+        log_path (str): Path of the log file
+        limit (int): Maximum number of lines to return
+        level (str): Only return lines logged at this level (e.g. 'ERROR')
+        before (int): Byte offset to read backwards from (a 'before' cursor);
+            defaults to the end of the file
+        max_scan_bytes (int): Stop after reading this many bytes
+
+    Returns:
+        dict: lines (oldest first, as (start, end, text) tuples of byte
+            offsets and text), before (cursor for the page of older lines,
+            None at the start of the file) and after (cursor for lines
+            written later, see read_forward)
+    """
+    with open(log_path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size if before is None else max(0, min(before, size))
+
+        found = []  # Newest first
+        position = end
+        remainder = b''  # Start of the line that continues into the block read last
+        scanned = 0
+        older = None  # Start of the oldest line looked at so far
+        after = None
+        while position > 0 and len(found) < limit:
+            if max_scan_bytes is not None and scanned >= max_scan_bytes:
+                break
+            length = min(TAIL_BLOCK_SIZE, position)
+            position -= length
+            f.seek(position)
+            buffer = f.read(length) + remainder
+            scanned += length
+
+            parts = buffer.split(b'\n')
+            # The first part may begin before this block, unless it is the start of the file
+            remainder = parts.pop(0) if position > 0 else b''
+            offset = position + (len(remainder) + 1 if position > 0 else 0)
+            starts = []
+            for part in parts:
+                starts.append(offset)
+                offset += len(part) + 1
+
+            if after is None and parts:
+                # Everything up to the last newline is complete
+                after = end - len(parts[-1])
+                parts, starts = parts[:-1], starts[:-1]
+
+            for start, part in zip(reversed(starts), reversed(parts)):
+                older = start
+                line = _decode(part)
+                if line and matches_level(line, level):
+                    found.append((start, start + len(part) + 1, line))
+                    if len(found) >= limit:
+                        break
+
+    if after is None:
+        after = end
+    if older is None:
+        # No complete line before end: older pages start where the scan stopped,
+        # so the cursor always moves back (or ends at the start of the file)
+        older = position
+    return {
+        'lines': found[::-1],
+        'before': older if older > 0 else None,
+        'after': after
+    }
+
+def read_forward(log_path, after, limit, level=None, max_scan_bytes=None):
+    """
+    Return the lines written after a byte offset, for paging forward or polling.
+
+    Args:
+        log_path (str): Path of the log file
+        after (int): Byte offset to read from (an 'after' cursor)
+        limit (int): Maximum number of lines to return
+        level (str): Only return lines logged at this level
+        max_scan_bytes (int): Stop after reading this many bytes
+
+    Returns:
+        dict: lines (as (start, end, text) tuples; end is the offset after
+            the newline, which can't be derived from text once a trailing \\r
+            is stripped or invalid UTF-8 replaced) and after, the cursor for
+            the next call; a cursor past the end of the file (which has since been
+            rotated) starts over from the beginning
+    """
+    lines = []
+    with open(log_path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        if after > size:
+            after = 0
+        if after > 0:
+            # A cursor in the middle of a line skips to the next one
+            f.seek(after - 1)
+            if f.read(1) != b'\n':
+                f.readline()
+                after = f.tell()
+        f.seek(after)
+
+        start = after
+        while len(lines) < limit:
+            if max_scan_bytes is not None and start - after >= max_scan_bytes:
+                break
+            raw = f.readline()
+            if not raw.endswith(b'\n'):
+                break  # End of file, or a line still being written
+            line = _decode(raw)
+            if line and matches_level(line, level):
+                lines.append((start, start + len(raw), line))
+            start += len(raw)
+
+    return {'lines': lines, 'after': start}
+
+def get_log_entries(log_path, limit, level=None, before=None, after=None, max_scan_bytes=None):
+    """
+    Return one page of parsed log entries.
+
+    With an after cursor the page holds the entries written since then;
+    otherwise it holds the last limit entries before the before cursor (the
+    end of the file by default).
+
+    Returns:
+        dict: entries (oldest first, each with the byte offset of its line),
+            returned_count and the before and after cursors
+    """
+    if after is not None:
+        page = read_forward(log_path, after, limit, level, max_scan_bytes)
+    else:
+        page = read_tail(log_path, limit, level, before, max_scan_bytes)
+
+    entries = []
+    for offset, _, line in page['lines']:
+        entry = parse_log_line(line)
+        entry['offset'] = offset
+        entries.append(entry)
+    return {
+        'entries': entries,
+        'returned_count': len(entries),
+        'before': page.get('before'),
+        'after': page['after']
+    }
@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import queue
+import select
+import ctypes
+import ctypes.util
+import logging
+import threading
+from utils.log_reader import parse_log_line, matches_level, read_forward
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the log file per wake-up at most, so a burst can't stall publishing
+READ_CHUNK_SIZE = 1024 * 1024
+
+# How long a browser waits before reconnecting a closed stream
+RECONNECT_MILLISECONDS = 2000
+
+# inotify events on the log folder that mean the log file was written or rotated
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+# Open followers per process, keyed by log path
+_followers = {}
+_followers_lock = threading.Lock()
+
+class _DirectoryWatcher:
+    """
+    Wakes a thread when a file in a directory changes, through Linux inotify.
+
+    Bound with ctypes so there is no extra dependency; create() returns None
+    where inotify isn't available and callers fall back to polling.
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    @classmethod
+    def create(cls, directory):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return None
+            mask = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+                os.close(fd)
+                return None
+            return cls(fd)
+        except (OSError, AttributeError):
+            return None
+
+    def wait(self, timeout):
+        """Block until something in the directory changes or timeout seconds pass."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            # The events themselves don't matter, only that there were some
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+class LogSubscriber:
+    """One viewer of a followed log: a bounded queue of SSE events at one level."""
+
+    def __init__(self, level=None, queue_size=1000):
+        self.level = level.upper() if level else None
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = False  # Set when the viewer fell behind and was unsubscribed
+
+class LogFollower:
+    """
+    Shared tail reader of one log file.
+
+    A single thread per process reads new lines as they are written, parses
+    each once and hands the encoded event to every subscriber whose level it
+    matches, so the cost of following the log doesn't grow with the number
+    of viewers. The thread is started by the first subscriber and stops once
+    the last one has gone.
+
+    The thread wakes on inotify events for the log folder where available,
+    otherwise every poll_interval seconds. A log rotated by
+    RotatingFileHandler (renamed, with a new file in its place) or truncated
+    is detected by its inode and size: the old file is read to the end and
+    the new one followed from its start.
+
+    A subscriber whose queue fills up is dropped rather than letting it
+    hold back the others; its stream ends and the browser reconnects.
+    """
+
+    def __init__(self, log_path, poll_interval=1.0):
+        self.log_path = log_path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self._file = None
+        self._inode = None
+        self._partial = b''  # Start of a line still being written
+        self._skip_partial = False  # Opened in the middle of a line, whose end is skipped
+        self.position = 0  # Offset after the last complete line read from the current file
+
+    def subscribe(self, level=None, queue_size=1000):
+        """
+        Register a viewer, starting the reader thread if needed.
+
+        Returns:
+            tuple: (LogSubscriber, position) - the subscriber gets every line
+                written after position in the current log file
+        """
+        subscriber = LogSubscriber(level, queue_size)
+        with self._lock:
+            if self._thread is None:
+                self._open(at_end=True)
+                self._thread = threading.Thread(target=self._run, name='log-follower', daemon=True)
+                self._thread.start()
+            self._subscribers.add(subscriber)
+            return subscriber, self.position
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _open(self, at_end):
+        """(Re)open the log file, at its end or its start. Caller holds the lock or owns the thread."""
+        if self._file is not None:
+            self._file.close()
+        self._file, self._inode, self._partial, self._skip_partial, self.position = None, None, b'', False, 0
+        try:
+            self._file = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            return
+        stat = os.fstat(self._file.fileno())
+        self._inode = (stat.st_dev, stat.st_ino)
+        if at_end and stat.st_size:
+            self._file.seek(stat.st_size - 1)
+            self._skip_partial = self._file.read(1) != b'\n'
+            self.position = stat.st_size
+
+    def _run(self):
+        watcher = _DirectoryWatcher.create(os.path.dirname(self.log_path) or '.')
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        if self._file is not None:
+                            self._file.close()
+                            self._file = None
+                        self._thread = None
+                        return
+                try:
+                    self._read_new()
+                except Exception as e:
+                    logger.error(f"Error following log file {self.log_path}: {str(e)}")
+                if watcher is not None:
+                    # Events wake the thread; the timeout only bounds how late it notices no one is left
+                    watcher.wait(max(self.poll_interval, 5.0))
+                else:
+                    time.sleep(self.poll_interval)
+        finally:
+            if watcher is not None:
+                watcher.close()
+
+    def _rotated(self):
+        """Return True if the path now holds a different or truncated file."""
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return False  # Mid-rotation: keep reading the old file until the new one appears
+        return (stat.st_dev, stat.st_ino) != self._inode or stat.st_size < self.position
+
+    def _read_new(self):
+        if self._file is None:
+            with self._lock:
+                self._open(at_end=False)
+            if self._file is None:
+                return
+
+        rotated = self._rotated()
+        data = self._file.read(READ_CHUNK_SIZE)
+        while data:
+            self._publish(data, flush=False)
+            data = self._file.read(READ_CHUNK_SIZE)
+        if rotated:
+            # The old file is complete; a line left without a newline ends with it
+            self._publish(b'', flush=True)
+            with self._lock:
+                self._open(at_end=False)
+            if self._file is not None:
+                self._read_new()
+
+    def _publish(self, data, flush):
+        buffer = self._partial + data
+        lines = buffer.split(b'\n')
+        self._partial = b'' if flush else lines.pop()
+        if flush and not lines[-1]:
+            lines.pop()
+
+        events = []
+        start = self.position
+        for raw in lines:
+            end = start + len(raw) + 1
+            if self._skip_partial:
+                self._skip_partial = False
+            else:
+                line = raw.decode('utf-8', errors='replace').rstrip('\r')
+                if line:
+                    events.append((line, format_log_event(line, start, end)))
+            start = end
+
+        with self._lock:
+            self.position = start
+            for subscriber in list(self._subscribers):
+                for line, event in events:
+                    if not matches_level(line, subscriber.level):
+                        continue
+                    try:
+                        subscriber.queue.put_nowait(event)
+                    except queue.Full:
+                        subscriber.dropped = True
+                        self._subscribers.discard(subscriber)
+                        break
+
+def format_log_event(line, start, end):
+    """
+    Encode one log line as a Server-Sent Event.
+
+    The event id is the offset after the line, so a reconnecting EventSource
+    sends it back as Last-Event-ID and picks up from there.
+    """
+    entry = parse_log_line(line)
+    entry['offset'] = start
+    return f"id: {end}\nevent: log\ndata: {json.dumps(entry)}\n\n"
+
+def get_log_follower(log_path, poll_interval=1.0):
+    """Return this process's follower of a log file."""
+    with _followers_lock:
+        follower = _followers.get(log_path)
+        if follower is None:
+            follower = _followers[log_path] = LogFollower(log_path, poll_interval)
+        return follower
+
+def format_skipped_event(start, end):
+    """
+    Encode a marker for log lines a catch-up didn't send.
+
+    Its id is the offset the stream carries on from, so a reconnect doesn't
+    try to catch up on the same lines again.
+    """
+    return f"id: {end}\nevent: skipped\ndata: {json.dumps({'from': start, 'to': end})}\n\n"
+
+def stream_log_events(follower, level=None, after=None, catch_up_lines=500, catch_up_bytes=4 * 1024 * 1024,
+                      heartbeat=15, queue_size=1000):
+    """
+    Generate the Server-Sent Events of a live log view.
+
+    Lines written after the after cursor but before the viewer subscribed
+    are read from the file first, catch_up_lines at a time, so a reconnect
+    doesn't lose the lines it missed. Catching up reads catch_up_bytes at
+    most; when there is more to read than that, a 'skipped' event tells the
+    viewer which byte range it didn't get. A comment is sent every heartbeat
+    seconds without events, which keeps proxies from closing the connection
+    and notices viewers that have gone away.
+
+    Args:
+        follower: LogFollower of the log file
+        level (str): Only stream lines logged at this level
+        after (int): Offset cursor (Last-Event-ID, or the after cursor of the page)
+        catch_up_lines (int): Lines read from the file per catch-up read
+        catch_up_bytes (int): Bytes read from the file to catch up at most
+        heartbeat (int): Seconds between keep-alive comments
+        queue_size (int): Events buffered for a slow viewer before it is dropped
+
+    Yields:
+        str: Encoded events
+    """
+    subscriber, position = follower.subscribe(level, queue_size)
+    try:
+        yield f"retry: {RECONNECT_MILLISECONDS}\n\n"
+        cursor = after
+        while cursor is not None and cursor < position:
+            budget = catch_up_bytes - (cursor - after)
+            if budget <= 0:
+                yield format_skipped_event(cursor, position)
+                break
+            try:
+                page = read_forward(follower.log_path, cursor, catch_up_lines, level, max_scan_bytes=budget)
+            except FileNotFoundError:
+                break
+            for start, end, line in page['lines']:
+                if end > position:
+                    break  # Already queued by the follower
+                yield format_log_event(line, start, end)
+            if page['after'] <= cursor:
+                break  # Nothing complete left to read
+            cursor = page['after']
+
+        while True:
+            try:
+                event = subscriber.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                if subscriber.dropped:
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            yield event
+            if subscriber.dropped and subscriber.queue.empty():
+                return
+    finally:
+        follower.unsubscribe(subscriber)
@@ -1,7 +1,12 @@
 import os
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, abort, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, abort, send_file, Response
 import io
 from utils.file_utils import sanitize_path, list_files_in_directory
+from utils.log_reader import read_tail, get_log_entries
+from utils.log_stream import get_log_follower, stream_log_events
+
+# Upper bound on the limit= of the entries API
+MAX_API_LINES = 5000
 
 # Create blueprint
 bp = Blueprint('logs', __name__)
@@ -17,18 +22,21 @@ def list():
     # Sort log files by modification time (newest first)
     log_files.sort(key=lambda f: os.path.getmtime(os.path.join(log_dir, f)), reverse=True)
     
-    # Read current log file
+    # Read the last page of the current log file
     current_log_path = current_app.config['LOG_FILE']
+    before = request.args.get('before', type=int)
     try:
-        with open(current_log_path, 'r') as f:
-            log_contents = f.readlines()
+        page = read_tail(current_log_path, current_app.config['LOG_VIEW_LINES'], before=before,
+                         max_scan_bytes=current_app.config['LOG_SCAN_MAX_BYTES'])
+        log_contents = [f"{line}\n" for _, _, line in page['lines']]
+        before, after = page['before'], page['after']
     except FileNotFoundError:
-        log_contents = ["No log file found."]
+        log_contents, before, after = ["No log file found."], None, 0
     except Exception as e:
         current_app.logger.error(f"Error reading log file: {str(e)}")
-        log_contents = [f"Error reading log file: {str(e)}"]
+        log_contents, before, after = [f"Error reading log file: {str(e)}"], None, None
     
-    return render_template('logs.html', log_files=log_files, log_contents=log_contents)
+    return render_template('logs.html', log_files=log_files, log_contents=log_contents, before=before, after=after)
 
 @bp.route('/<path:filename>')
 def view(filename):
@@ -46,14 +54,18 @@ def view(filename):
         flash('Log file not found', 'error')
         return redirect(url_for('logs.list'))
     
+    # One page at a time, newest first; ?before= pages back through older lines
+    before = request.args.get('before', type=int)
     try:
-        with open(log_path, 'r') as f:
-            log_contents = f.readlines()
+        page = read_tail(log_path, current_app.config['LOG_VIEW_LINES'], before=before,
+                         max_scan_bytes=current_app.config['LOG_SCAN_MAX_BYTES'])
+        log_contents = [f"{line}\n" for _, _, line in page['lines']]
+        before = page['before']
     except Exception as e:
         current_app.logger.error(f"Error reading log file {log_path}: {str(e)}")
-        log_contents = [f"Error reading log file: {str(e)}"]
+        log_contents, before = [f"Error reading log file: {str(e)}"], None
     
-    return render_template('view_log.html', filename=filename, log_contents=log_contents)
+    return render_template('view_log.html', filename=filename, log_contents=log_contents, before=before)
 
 @bp.route('/download/<path:filename>')
 def download(filename):
@@ -80,64 +92,24 @@ def download(filename):
 
 @bp.route('/api/latest')
 def latest_logs():
-    """API endpoint to get the latest log entries."""
+    """
+    API endpoint to get the latest log entries.
+    
+    Returns the last limit entries, or with ?before=<cursor> the page before
+    an earlier one and with ?after=<cursor> the entries written since an
+    earlier call. Only the bytes of the requested page are read.
+    """
     log_path = current_app.config['LOG_FILE']
-    limit = request.args.get('limit', default=100, type=int)
+    limit = max(1, min(request.args.get('limit', default=100, type=int), MAX_API_LINES))
     level = request.args.get('level', default=None, type=str)
     
     try:
-        # Read the log file
-        with open(log_path, 'r') as f:
-            log_lines = f.readlines()
-        
-        # Filter by level if specified
-        if level:
-            log_lines = [line for line in log_lines if f" {level.upper()}: " in line]
-        
-        # Get the last N lines
-        latest_entries = log_lines[-limit:] if limit > 0 else log_lines
-        
-        # Parse log entries into a more structured format
-        parsed_entries = []
-        for line in latest_entries:
-            try:
-                # Parse based on expected format: "2023-01-01 12:34:56 INFO: message [in file.py:line]"
-                parts = line.split(' ', 3)
-                timestamp = f"{parts[0]} {parts[1]}"
-                level_with_colon = parts[2]
-                message_with_location = parts[3]
-                
-                # Split level from colon
-                level = level_with_colon.strip(':')
-                
-                # Extract location if present
-                location = ""
-                message = message_with_location
-                if " [in " in message_with_location and message_with_location.endswith("]"):
-                    message, location = message_with_location.rsplit(" [in ", 1)
-                    location = f"[in {location}"
-                
-                parsed_entries.append({
-                    'timestamp': timestamp,
-                    'level': level,
-                    'message': message.strip(),
-                    'location': location.strip()
-                })
-            except Exception:
-                # If parsing fails, include the raw line
-                parsed_entries.append({
-                    'timestamp': '',
-                    'level': 'UNKNOWN',
-                    'message': line.strip(),
-                    'location': ''
-                })
-        
-        return {
-            'success': True,
-            'entries': parsed_entries,
-            'total_count': len(log_lines),
-            'returned_count': len(parsed_entries)
-        }
+        page = get_log_entries(log_path, limit, level=level,
+                               before=request.args.get('before', type=int),
+                               after=request.args.get('after', type=int),
+                               max_scan_bytes=current_app.config['LOG_SCAN_MAX_BYTES'])
+        page['success'] = True
+        return page
     except Exception as e:
         current_app.logger.error(f"Error fetching log entries: {str(e)}")
         return {
@@ -145,3 +117,26 @@ def latest_logs():
             'error': str(e),
             'entries': []
         }
+
+@bp.route('/api/stream')
+def stream_logs():
+    """
+    Server-Sent Events of new entries in the current log file.
+    
+    ?level= filters entries on the server; ?after=<cursor> (or the
+    Last-Event-ID of a reconnecting browser) first sends the entries written
+    since that cursor. Viewers in a process share one reader of the file.
+    """
+    after = request.headers.get('Last-Event-ID', type=int)
+    if after is None:
+        after = request.args.get('after', type=int)
+    follower = get_log_follower(current_app.config['LOG_FILE'], current_app.config['LOG_STREAM_POLL_INTERVAL'])
+    events = stream_log_events(follower, level=request.args.get('level'), after=after,
+                               catch_up_lines=current_app.config['LOG_VIEW_LINES'],
+                               catch_up_bytes=current_app.config['LOG_SCAN_MAX_BYTES'],
+                               heartbeat=current_app.config['LOG_STREAM_HEARTBEAT'],
+                               queue_size=current_app.config['LOG_STREAM_QUEUE_SIZE'])
+    response = Response(events, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop reverse proxies from buffering the stream
+    return response
@@ -0,0 +1,43 @@
+"""
+Apply pending schema migrations without starting the web app.
+
+The web app and the workers refuse to start on a database with pending
+migrations (only a new, empty one is created by them), so run this once
+after upgrading, before starting them.
+
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # only print the schema version
+"""
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+def main():
+    from flask import Flask
+    from config import Config
+    from models import db, configure_sqlite
+    from utils.migrations import run_migrations, get_schema_version, LATEST_VERSION
+
+    parser = argparse.ArgumentParser(description='Apply document analyzer schema migrations')
+    parser.add_argument('--status', action='store_true', help='Print the schema version and exit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+    # A bare app: create_app refuses to start until the migrations have been applied
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    with app.app_context():
+        configure_sqlite(db.engine, app.config)
+        current = get_schema_version(db.session)
+        logger.info(f"Schema version {current if current is not None else 'unversioned'}, latest {LATEST_VERSION}")
+        if args.status:
+            return
+
+        applied = run_migrations(db)
+        logger.info(f"Applied migrations: {', '.join(map(str, applied)) or 'none'}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+import logging
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Rows updated per transaction by data migrations on large tables
+MIGRATION_BATCH_SIZE = 500
+
+SCHEMA_VERSION_DDL = """CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description VARCHAR(200) NOT NULL,
+    applied_at DATETIME NOT NULL
+)"""
+
+def get_columns(db_session, table):
+    """Return the column names of a table."""
+    return {row[1] for row in db_session.execute(text(f"PRAGMA table_info({table})"))}
+
+def add_column(db_session, table, column, definition):
+    """
+    Add a column unless the table already has it.
+
+    Returns:
+        bool: True if the column was added
+    """
+    if column in get_columns(db_session, table):
+        return False
+    try:
+        db_session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+    except OperationalError as e:
+        # Another process starting up at the same time added it first
+        if 'duplicate column' not in str(e):
+            raise
+        db_session.rollback()
+        return False
+    db_session.commit()
+    logger.info(f"Added column {table}.{column}")
+    return True
+
+def has_autoincrement(db_session, table_name):
+    """Return True if a table is missing or its primary key is already AUTOINCREMENT."""
+    current = db_session.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {'name': table_name}).scalar()
+    return current is None or 'AUTOINCREMENT' in current.upper()
+
+def rebuild_with_autoincrement(db, db_session, table_name, floor=0):
+    """
+    Recreate a table so its integer primary key is AUTOINCREMENT.
+
+    Without it SQLite hands out the highest rowid again once that row has
+    been deleted, and an ID kept outside the table (a vector store row, a
+    link in a browser) then silently refers to a different row. ALTER TABLE
+    can't make the change, so the table is copied into one created from the
+    model, the old one dropped and the copy renamed; its indexes and
+    triggers are recreated from their stored SQL.
+
+    Args:
+        db: Flask-SQLAlchemy instance (for the model's DDL)
+        db_session: SQLAlchemy session
+        table_name (str): Table to rebuild
+        floor (int): Highest ID known to have been used outside the table;
+            new rows are numbered above it
+
+    Returns:
+        bool: True if the table was rebuilt
+    """
+    from sqlalchemy.schema import CreateTable
+
+    if has_autoincrement(db_session, table_name):
+        return False
+
+    table = db.metadata.tables[table_name]
+    copy_name = f"{table_name}_rebuild"
+    ddl = str(CreateTable(table).compile(dialect=db_session.get_bind().dialect)).strip()
+    ddl = ddl.replace(f"CREATE TABLE {table_name} ", f"CREATE TABLE {copy_name} ", 1)
+    existing = get_columns(db_session, table_name)
+    columns = ', '.join(column.name for column in table.columns if column.name in existing)
+    dependents = [row[0] for row in db_session.execute(text(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = :name AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+    ), {'name': table_name})]
+
+    # A copy left behind by an interrupted rebuild is discarded
+    db_session.execute(text(f"DROP TABLE IF EXISTS {copy_name}"))
+    db_session.execute(text(ddl))
+    db_session.execute(text(f"INSERT INTO {copy_name} ({columns}) SELECT {columns} FROM {table_name}"))
+    # Triggers on other tables that mention this one would fail the rename's schema check
+    db_session.execute(text("PRAGMA legacy_alter_table = ON"))
+    try:
+        db_session.execute(text(f"DROP TABLE {table_name}"))
+        db_session.execute(text(f"ALTER TABLE {copy_name} RENAME TO {table_name}"))
+    finally:
+        db_session.execute(text("PRAGMA legacy_alter_table = OFF"))
+    for statement in dependents:
+        db_session.execute(text(statement))
+
+    db_session.execute(text(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT :name, 0 "
+        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+    ), {'name': table_name})
+    db_session.execute(text(
+        "UPDATE sqlite_sequence SET seq = MAX(seq, :floor) WHERE name = :name"
+    ), {'name': table_name, 'floor': floor})
+    db_session.commit()
+    logger.info(f"Rebuilt {table_name} with an AUTOINCREMENT primary key")
+    return True
+
+def highest_stored_id(config_key):
+    """
+    Return the highest ID in the vector store at an app config path, or 0.
+
+    Rows deleted before IDs stopped being reused may still have vectors
+    there, so new rows must be numbered above them.
+    """
+    try:
+        from flask import current_app
+        from utils.vector_store import open_vector_store
+
+        store = open_vector_store(current_app.config[config_key])
+    except Exception as e:
+        logger.warning(f"Could not read the vector store at {config_key}: {str(e)}")
+        return 0
+    if store is None or not len(store.ids):
+        return 0
+    return int(store.ids.max())
+
+def migrate_document_columns(db, db_session):
+    """Columns added to document after the first release."""
+    add_column(db_session, 'document', 'preview_data', 'TEXT')
+    add_column(db_session, 'document', 'page_count', 'INTEGER DEFAULT 0')
+    add_column(db_session, 'document', 'paragraph_count', 'INTEGER DEFAULT 0')
+    add_column(db_session, 'document', 'content_hash', 'VARCHAR(64)')
+
+def migrate_paragraph_positions(db, db_session):
+    """
+    Add document_paragraph.position and number the links written before it existed.
+
+    Legacy links are numbered in insertion (rowid) order within each document,
+    MIGRATION_BATCH_SIZE documents per transaction.
+    """
+    add_column(db_session, 'document_paragraph', 'position', 'INTEGER')
+
+    document_ids = [row[0] for row in db_session.execute(text(
+        "SELECT DISTINCT document_id FROM document_paragraph WHERE position IS NULL ORDER BY document_id"
+    ))]
+    for i in range(0, len(document_ids), MIGRATION_BATCH_SIZE):
+        batch = document_ids[i:i + MIGRATION_BATCH_SIZE]
+        db_session.execute(text("""
+            UPDATE document_paragraph SET position = (
+                SELECT COUNT(*) FROM document_paragraph AS earlier
+                WHERE earlier.document_id = document_paragraph.document_id
+                  AND earlier.rowid < document_paragraph.rowid
+            )
+            WHERE position IS NULL AND document_id BETWEEN :first AND :last
+        """), {'first': batch[0], 'last': batch[-1]})
+        db_session.commit()
+    if document_ids:
+        logger.info(f"Numbered paragraph positions of {len(document_ids)} documents")
+
+def migrate_paragraph_doc_count(db, db_session):
+    """Add paragraph.doc_count and the triggers that maintain it (counts are reconciled in batches)."""
+    from utils.paragraph_counts import ensure_paragraph_counts
+
+    add_column(db_session, 'paragraph', 'doc_count', 'INTEGER NOT NULL DEFAULT 0')
+    ensure_paragraph_counts(db_session)
+
+def migrate_search_index(db, db_session):
+    """Full-text search tables and the triggers that keep them in sync."""
+    from utils.search_index import ensure_search_index
+
+    ensure_search_index(db_session)
+
+def migrate_model_indexes(db, db_session):
+    """Create every index declared on the models that an older database lacks."""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db_session.connection(), checkfirst=True)
+    db_session.commit()
+
+def migrate_corpus_generation(db, db_session):
+    """Corpus generation counter and triggers behind the JSON APIs' ETags."""
+    from utils.http_cache import ensure_corpus_generation
+
+    ensure_corpus_generation(db_session)
+
+def migrate_job_progress(db, db_session):
+    """Progress column for long-running background jobs."""
+    add_column(db_session, 'background_job', 'progress', 'INTEGER DEFAULT 0')
+
+def migrate_document_processed_at(db, db_session):
+    """document.processed_at, backfilled from the upload date of processed documents."""
+    add_column(db_session, 'document', 'processed_at', 'DATETIME')
+    db_session.execute(text(
+        "UPDATE document SET processed_at = upload_date WHERE status = 'processed' AND processed_at IS NULL"
+    ))
+    db_session.commit()
+
+def migrate_document_autoincrement(db, db_session):
+    """Stop document IDs from being reused after a delete."""
+    if has_autoincrement(db_session, 'document'):
+        return
+    rebuild_with_autoincrement(db, db_session, 'document', floor=highest_stored_id('DOCUMENT_VECTORS_PATH'))
+
+def migrate_paragraph_autoincrement(db, db_session):
+    """Stop paragraph IDs from being reused after orphan cleanup."""
+    if has_autoincrement(db_session, 'paragraph'):
+        return
+    rebuild_with_autoincrement(db, db_session, 'paragraph', floor=highest_stored_id('PARAGRAPH_VECTORS_PATH'))
+
+def migrate_job_dedupe_key(db, db_session):
+    """background_job.dedupe_key and the partial unique index on it."""
+    add_column(db_session, 'background_job', 'dedupe_key', 'VARCHAR(64)')
+    migrate_model_indexes(db, db_session)
+
+# Ordered (version, description, function(db, db_session)) steps. Append new
+# migrations at the end; never renumber or edit one that has shipped. Each
+# step must be safe to run against a database that already has its changes,
+# because create_all builds a fresh database in its final shape.
+MIGRATIONS = [
+    (1, 'document preview, count and content hash columns', migrate_document_columns),
+    (2, 'document_paragraph.position', migrate_paragraph_positions),
+    (3, 'paragraph.doc_count and its triggers', migrate_paragraph_doc_count),
+    (4, 'full-text search index', migrate_search_index),
+    (5, 'indexes declared on the models', migrate_model_indexes),
+    (6, 'indexes for similarity, paragraph-link and document-status lookups', migrate_model_indexes),
+    (7, 'corpus generation counter for HTTP validators', migrate_corpus_generation),
+    (8, 'background_job.progress', migrate_job_progress),
+    (9, 'document.processed_at', migrate_document_processed_at),
+    (10, 'AUTOINCREMENT document IDs', migrate_document_autoincrement),
+    (11, 'AUTOINCREMENT paragraph IDs', migrate_paragraph_autoincrement),
+    (12, 'background_job.dedupe_key', migrate_job_dedupe_key),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(db_session):
+    """
+    Return the version of the last applied migration.
+
+    Returns:
+        int: Schema version, or None for a database without a schema_version table
+    """
+    exists = db_session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    )).first()
+    if not exists:
+        return None
+    return db_session.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+def run_migrations(db, db_session=None):
+    """
+    Bring the database schema up to LATEST_VERSION.
+
+    A current database is only read. Otherwise missing tables are created
+    first, then each pending migration runs in order and is recorded in
+    schema_version.
+
+    Args:
+        db: Flask-SQLAlchemy instance (for metadata and create_all)
+        db_session: SQLAlchemy session (defaults to db.session)
+
+    Returns:
+        list: Versions applied by this call
+    """
+    db_session = db_session or db.session
+
+    current = get_schema_version(db_session)
+    if current is not None and current >= LATEST_VERSION:
+        db_session.commit()
+        return []
+
+    db_session.execute(text(SCHEMA_VERSION_DDL))
+    db_session.commit()
+    db.create_all()
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if current is not None and version <= current:
+            continue
+        logger.info(f"Applying schema migration {version}: {description}")
+        migrate(db, db_session)
+        db_session.execute(text(
+            "INSERT OR IGNORE INTO schema_version (version, description, applied_at) VALUES (:version, :description, :applied_at)"
+        ), {'version': version, 'description': description, 'applied_at': datetime.utcnow()})
+        db_session.commit()
+        applied.append(version)
+
+    logger.info(f"Database schema is at version {LATEST_VERSION}")
+    return applied
+
+def check_schema(db, db_session=None):
+    """
+    Make sure the database schema is current before an app process uses it.
+
+    A new, empty database is created in its final shape straight away. An
+    existing database is only checked: migrations such as the table
+    rebuilds copy whole tables, so they are applied by migrate.py once,
+    rather than by every web and worker process as it starts.
+
+    Raises:
+        RuntimeError: If an existing database has migrations pending
+    """
+    db_session = db_session or db.session
+
+    has_tables = db_session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'document'"
+    )).first()
+    if not has_tables:
+        run_migrations(db, db_session)
+        return
+
+    current = get_schema_version(db_session)
+    db_session.commit()
+    if current is None or current < LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {current if current is not None else 'unversioned'}, "
+            f"latest is {LATEST_VERSION}; run 'python migrate.py' before starting the app"
+        )
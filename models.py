@@ -1,14 +1,53 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 import json
 import os
 
 db = SQLAlchemy()
 
+def sqlite_pragmas(config):
+    """
+    Return the SQLite performance profile from config as (pragma, value) pairs.
+
+    WAL lets readers proceed while a writer commits, and busy_timeout makes
+    writers wait for each other instead of failing with "database is locked".
+    """
+    return [
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', int(config['SQLITE_BUSY_TIMEOUT'])),
+        ('cache_size', int(config['SQLITE_CACHE_SIZE'])),
+        ('mmap_size', int(config['SQLITE_MMAP_SIZE'])),
+        ('temp_store', config['SQLITE_TEMP_STORE']),
+    ]
+
+def configure_sqlite(engine, config):
+    """
+    Apply sqlite_pragmas(config) to every new connection of the engine.
+
+    Does nothing for other database backends.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
 # Association table for many-to-many relationship between documents and paragraphs
 document_paragraph = db.Table('document_paragraph',
     db.Column('document_id', db.Integer, db.ForeignKey('document.id'), primary_key=True),
-    db.Column('paragraph_id', db.Integer, db.ForeignKey('paragraph.id'), primary_key=True)
+    db.Column('paragraph_id', db.Integer, db.ForeignKey('paragraph.id'), primary_key=True),
+    db.Column('position', db.Integer, nullable=True),  # Order of the paragraph within the document
+    # Paragraph -> documents lookups and doc_count reconciliation
+    db.Index('ix_document_paragraph_paragraph_document', 'paragraph_id', 'document_id'),
+    # A document's paragraphs in reading order
+    db.Index('ix_document_paragraph_document_position', 'document_id', 'position')
 )
 
 # Association table for document similarities
@@ -22,9 +61,12 @@ class DocumentSimilarity(db.Model):
     source = db.relationship('Document', foreign_keys=[source_id], backref='outgoing_similarities')
     target = db.relationship('Document', foreign_keys=[target_id], backref='incoming_similarities')
     
-    # Add a constraint to prevent duplicate pairs
+    # Add a constraint to prevent duplicate pairs; the indexes serve a document's
+    # strongest neighbours in either direction without sorting
     __table_args__ = (
         db.UniqueConstraint('source_id', 'target_id', name='unique_document_pair'),
+        db.Index('ix_document_similarity_source_score', 'source_id', 'similarity_score'),
+        db.Index('ix_document_similarity_target_score', 'target_id', 'similarity_score'),
     )
 
 # Association table for many-to-many relationship between documents and tags
@@ -62,11 +104,13 @@ class Document(db.Model):
     file_type = db.Column(db.String(10), nullable=False)  # pdf or docx
     file_size = db.Column(db.Integer, nullable=False)  # Size in bytes
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)  # When the analysis was last stored (delta dumps)
     extracted_text = db.Column(db.Text, nullable=True)
-    status = db.Column(db.String(20), default='pending')  # pending, processed, error
+    status = db.Column(db.String(20), default='pending')  # pending, extracting, segmenting, processed, error
     error_message = db.Column(db.Text, nullable=True)
     page_count = db.Column(db.Integer, default=0)  # Number of pages in the document
     paragraph_count = db.Column(db.Integer, default=0)  # Number of paragraphs identified
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 of the file bytes
     
     # Store preview data as JSON
     preview_data = db.Column(db.Text, nullable=True)  # JSON storage for preview info
@@ -78,6 +122,13 @@ class Document(db.Model):
     paragraphs = db.relationship('Paragraph', secondary=document_paragraph, 
                                 back_populates='documents')
 
+    # Processed documents in upload order (exports, similarity, document lists)
+    __table_args__ = (
+        db.Index('ix_document_status_upload_date', 'status', 'upload_date'),
+        # IDs of deleted documents are never handed out again (vector stores and URLs keep them)
+        {'sqlite_autoincrement': True},
+    )
+
     def get_preview_info(self):
         """Return preview information as a dictionary."""
         if not self.preview_data:
@@ -173,6 +224,11 @@ class Paragraph(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     hash = db.Column(db.String(64), nullable=False, unique=True)  # For efficient lookups
+    # Number of documents containing the paragraph, maintained by triggers (see utils/paragraph_counts.py)
+    doc_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
+
+    # IDs of deleted paragraphs are never handed out again (the paragraph index keeps them)
+    __table_args__ = {'sqlite_autoincrement': True}
     
     # Many-to-many relationship with documents
     documents = db.relationship('Document', secondary=document_paragraph, 
@@ -183,4 +239,40 @@ class Paragraph(db.Model):
         return self.tags.all()
     
     def __repr__(self):
-        return f'<Paragraph {self.id}>'
\ No newline at end of file
+        return f'<Paragraph {self.id}>'
+
+class BackgroundJob(db.Model):
+    """Durable work item drained by the worker processes started from worker.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(30), nullable=False)  # ingest, similarity, delete_files, prerender, export
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=True)
+    payload = db.Column(db.Text, nullable=True)  # JSON storage for job arguments
+    status = db.Column(db.String(20), default='queued')  # queued, running, done, failed
+    priority = db.Column(db.Integer, default=0)  # Lower values are claimed first
+    attempts = db.Column(db.Integer, default=0)
+    progress = db.Column(db.Integer, default=0)  # Percent done, for jobs that report it (export)
+    worker_id = db.Column(db.String(100), nullable=True)  # Worker currently holding the job
+    locked_at = db.Column(db.DateTime, nullable=True)  # When the current lease was taken
+    error_message = db.Column(db.Text, nullable=True)
+    dedupe_key = db.Column(db.String(64), nullable=True)  # At most one queued or running job per key
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # Workers poll for the next queued job in priority order
+    __table_args__ = (
+        db.Index('ix_background_job_claim', 'status', 'priority', 'id'),
+        db.Index('ix_background_job_dedupe_key', 'dedupe_key', unique=True,
+                 sqlite_where=db.text("dedupe_key IS NOT NULL AND status IN ('queued', 'running')")),
+    )
+
+    def get_payload(self):
+        """Return the job payload as a dictionary."""
+        if not self.payload:
+            return {}
+        try:
+            return json.loads(self.payload)
+        except:
+            return {}
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} {self.job_type} {self.status}>'
\ No newline at end of file
@@ -0,0 +1,107 @@
+import logging
+from sqlalchemy import text, select, exists, and_
+
+logger = logging.getLogger(__name__)
+
+# Keep paragraph.doc_count equal to the paragraph's rows in document_paragraph.
+# Triggers cover every write path (ORM collections, the bulk executemany in
+# store_paragraphs, INSERT ... SELECT in copy_document_analysis, bulk deletes)
+# without extra application code
+DOC_COUNT_TRIGGER_STATEMENTS = [
+    """CREATE TRIGGER IF NOT EXISTS paragraph_doc_count_insert AFTER INSERT ON document_paragraph BEGIN
+        UPDATE paragraph SET doc_count = doc_count + 1 WHERE id = new.paragraph_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS paragraph_doc_count_delete AFTER DELETE ON document_paragraph BEGIN
+        UPDATE paragraph SET doc_count = doc_count - 1 WHERE id = old.paragraph_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS paragraph_doc_count_update AFTER UPDATE OF paragraph_id ON document_paragraph BEGIN
+        UPDATE paragraph SET doc_count = doc_count - 1 WHERE id = old.paragraph_id;
+        UPDATE paragraph SET doc_count = doc_count + 1 WHERE id = new.paragraph_id;
+    END""",
+]
+
+DOC_COUNT_TRIGGERS = ('paragraph_doc_count_insert', 'paragraph_doc_count_delete', 'paragraph_doc_count_update')
+
+# Paragraph IDs reconciled per transaction, so large tables don't hold the write lock
+RECONCILE_BATCH_SIZE = 20000
+
+def ensure_paragraph_counts(db_session):
+    """
+    Create the triggers that maintain paragraph.doc_count if they don't exist yet.
+
+    When the triggers are new (an existing database, or one whose column was
+    just added) the counts are reconciled from document_paragraph afterwards;
+    the triggers already keep concurrent writes counted while that runs.
+
+    Args:
+        db_session: SQLAlchemy session
+    """
+    existing = {row[0] for row in db_session.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'paragraph_doc_count_%'"
+    ))}
+    for statement in DOC_COUNT_TRIGGER_STATEMENTS:
+        db_session.execute(text(statement))
+    db_session.commit()
+    if not existing.issuperset(DOC_COUNT_TRIGGERS):
+        fixed = reconcile_paragraph_counts(db_session)
+        logger.info(f"Created paragraph document-count triggers, reconciled {fixed} paragraphs")
+
+def reconcile_paragraph_counts(db_session, commit=True, batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Recompute paragraph.doc_count from document_paragraph where it has drifted.
+
+    Works through the paragraph table in ID ranges of batch_size.
+
+    Args:
+        db_session: SQLAlchemy session
+        commit (bool): Commit after each batch
+        batch_size (int): Paragraph IDs per batch
+
+    Returns:
+        int: Number of paragraphs whose count was corrected
+    """
+    max_id = db_session.execute(text("SELECT MAX(id) FROM paragraph")).scalar() or 0
+
+    fixed = 0
+    for start in range(0, max_id, batch_size):
+        result = db_session.execute(text("""
+            UPDATE paragraph SET doc_count = (
+                SELECT COUNT(*) FROM document_paragraph WHERE document_paragraph.paragraph_id = paragraph.id
+            )
+            WHERE id > :start AND id <= :end AND doc_count != (
+                SELECT COUNT(*) FROM document_paragraph WHERE document_paragraph.paragraph_id = paragraph.id
+            )
+        """), {'start': start, 'end': start + batch_size})
+        fixed += result.rowcount
+        if commit:
+            db_session.commit()
+    return fixed
+
+def delete_orphan_paragraphs(db_session, deleted_ids=None):
+    """
+    Delete paragraphs that no longer belong to any document, with their tag links.
+
+    Candidates come from the doc_count index instead of checking each
+    paragraph's documents; the NOT EXISTS anti-join keeps a paragraph whose
+    count has drifted but still has documents. The caller is responsible
+    for committing.
+
+    Args:
+        db_session: SQLAlchemy session
+        deleted_ids (list): If given, the IDs of the deleted paragraphs are
+            appended to it
+
+    Returns:
+        int: Number of paragraphs deleted
+    """
+    from models import Paragraph, paragraph_tag, document_paragraph
+
+    orphan_filter = and_(
+        Paragraph.doc_count == 0,
+        ~exists().where(document_paragraph.c.paragraph_id == Paragraph.id)
+    )
+    orphans = select(Paragraph.id).where(orphan_filter)
+    if deleted_ids is not None:
+        deleted_ids.extend(row[0] for row in db_session.execute(orphans))
+    db_session.execute(paragraph_tag.delete().where(paragraph_tag.c.paragraph_id.in_(orphans)))
+    return db_session.query(Paragraph).filter(orphan_filter).delete(synchronize_session=False)
@@ -1,4 +1,5 @@
 import hashlib
+import math
 import re
 import logging
 import unicodedata
@@ -414,38 +415,104 @@ def extract_paragraphs(text):
     logger.info(f"Extracted {len(processed_paragraphs)} paragraphs")
     return processed_paragraphs
 
-def is_container(paragraph, other_paragraphs):
+# Character shingle length used by the containment index
+SHINGLE_SIZE = 8
+
+def normalize_for_comparison(text):
+    """Lowercase and collapse whitespace so paragraphs can be compared."""
+    return ' '.join(text.lower().split())
+
+def find_container_paragraphs(paragraphs, candidate_indexes=None, min_length=100,
+                              threshold=0.9, min_contained=2):
     """
-    Check if this paragraph is a container of multiple others.
-    Uses SequenceMatcher for accurate substring detection.
+    Find paragraphs that contain several other paragraphs of the same document.
+    
+    A paragraph of at least min_length characters is a container when at least
+    min_contained shorter paragraphs appear in it, either verbatim or sharing a
+    contiguous run of at least threshold of their (normalized) length.
+    
+    Every paragraph is normalized once and its character shingles are put in an
+    inverted index. A shared run of L characters implies at least L - k + 1
+    shared shingle positions, so only paragraphs passing that bound are verified
+    with SequenceMatcher, instead of running it on every pair.
+    
+    Args:
+        paragraphs (list): Paragraph texts of one document
+        candidate_indexes (iterable): Indexes to test as containers (default: all)
+        min_length (int): Minimum length of a container paragraph
+        threshold (float): Fraction of a paragraph that must be matched contiguously
+        min_contained (int): Number of contained paragraphs that makes a container
+        
+    Returns:
+        set: Indexes of container paragraphs
     """
-    if len(paragraph) < 100:
-        return False
+    k = SHINGLE_SIZE
+    normalized = [normalize_for_comparison(p) for p in paragraphs]
+    
+    # Inverted index: shingle -> {paragraph index: number of positions with that shingle}
+    shingle_index = {}
+    for idx, text in enumerate(normalized):
+        for pos in range(len(text) - k + 1):
+            postings = shingle_index.setdefault(text[pos:pos + k], {})
+            postings[idx] = postings.get(idx, 0) + 1
     
-    # Normalize paragraph
-    norm_para = ' '.join(paragraph.lower().split())
+    # Shared shingle positions required for each paragraph to possibly match
+    required_hits = [math.ceil(threshold * len(text)) - k + 1 for text in normalized]
     
-    # Count contained paragraphs
-    contained = 0
-    for other in other_paragraphs:
-        if other == paragraph or len(other) >= len(paragraph):
+    # Paragraphs too short for the shingle bound to prune anything are always verified
+    unprunable = [idx for idx, required in enumerate(required_hits) if required <= 0]
+    
+    if candidate_indexes is None:
+        candidate_indexes = range(len(paragraphs))
+    
+    containers = set()
+    for idx in candidate_indexes:
+        paragraph = paragraphs[idx]
+        if len(paragraph) < min_length:
             continue
         
-        # Normalize other paragraph
-        norm_other = ' '.join(other.lower().split())
+        norm_para = normalized[idx]
         
-        # Check if other is fully contained in paragraph
-        if norm_other in norm_para:
-            contained += 1
-        else:
-            # Check with SequenceMatcher for near-matches
-            matcher = SequenceMatcher(None, norm_para, norm_other)
-            match = matcher.find_longest_match(0, len(norm_para), 0, len(norm_other))
-            if match.size >= len(norm_other) * 0.9:
+        # For every other paragraph, count its shingle positions that occur in this one
+        hits = {}
+        for shingle in {norm_para[pos:pos + k] for pos in range(len(norm_para) - k + 1)}:
+            for other_idx, count in shingle_index[shingle].items():
+                hits[other_idx] = hits.get(other_idx, 0) + count
+        
+        candidates = [other_idx for other_idx, count in hits.items() if count >= required_hits[other_idx]]
+        candidates.extend(other_idx for other_idx in unprunable if other_idx not in hits)
+        
+        contained = 0
+        for other_idx in candidates:
+            other = paragraphs[other_idx]
+            if other == paragraph or len(other) >= len(paragraph):
+                continue
+            
+            norm_other = normalized[other_idx]
+            if norm_other in norm_para:
                 contained += 1
+            else:
+                # Verify the near-match with an exact longest common substring
+                matcher = SequenceMatcher(None, norm_para, norm_other, autojunk=False)
+                match = matcher.find_longest_match(0, len(norm_para), 0, len(norm_other))
+                if match.size >= len(norm_other) * threshold:
+                    contained += 1
+            
+            if contained >= min_contained:
+                containers.add(idx)
+                break
     
-    # It's a container if it contains multiple other paragraphs
-    return contained >= 2
+    return containers
+
+def is_container(paragraph, other_paragraphs):
+    """
+    Check if this paragraph is a container of multiple others.
+    
+    Prefer find_container_paragraphs when checking every paragraph of a
+    document, which builds the shingle index only once.
+    """
+    paragraphs = [paragraph] + list(other_paragraphs)
+    return 0 in find_container_paragraphs(paragraphs, candidate_indexes=[0])
 
 def hash_paragraph(paragraph):
     """Create a hash for a paragraph to identify exact duplicates."""
@@ -455,31 +522,28 @@ def hash_paragraph(paragraph):
     # Create a SHA256 hash
     return hashlib.sha256(normalized.encode()).hexdigest()
 
-def process_paragraphs(text, document, db_session):
+def segment_paragraphs(text):
     """
-    Process text into paragraphs and associate with document.
-    This function maintains the exact signature expected by app.py.
-    """
-    from models import Paragraph
-    import sqlite3
+    Split text into the paragraphs that will be stored for a document.
+    
+    This is the CPU-bound half of paragraph processing and touches no database
+    state, so it can run in a worker process (see utils.ingestion).
     
+    Args:
+        text (str): Extracted document text
+        
+    Returns:
+        list: Paragraph texts in document order, with container paragraphs removed
+    """
     # Extract paragraphs
     paragraphs = extract_paragraphs(text)
     logger.info(f"Initial extraction: {len(paragraphs)} paragraphs")
     
-    # Remove container paragraphs (except structured content)
-    filtered_paragraphs = []
-    containers_removed = 0
-    
-    for paragraph in paragraphs:
-        # Keep structured content intact
-        if is_structured_content(paragraph):
-            filtered_paragraphs.append(paragraph)
-        # Remove container paragraphs
-        elif not is_container(paragraph, paragraphs):
-            filtered_paragraphs.append(paragraph)
-        else:
-            containers_removed += 1
+    # Remove container paragraphs (except structured content, which is kept intact)
+    candidate_indexes = [idx for idx, paragraph in enumerate(paragraphs) if not is_structured_content(paragraph)]
+    containers = find_container_paragraphs(paragraphs, candidate_indexes)
+    filtered_paragraphs = [paragraph for idx, paragraph in enumerate(paragraphs) if idx not in containers]
+    containers_removed = len(containers)
     
     # Safety check - if we removed too many, revert to original
     if containers_removed > 0 and len(filtered_paragraphs) < 2:
@@ -487,51 +551,87 @@ def process_paragraphs(text, document, db_session):
         filtered_paragraphs = paragraphs
     
     logger.info(f"After processing: {len(filtered_paragraphs)} paragraphs ({containers_removed} containers removed)")
+    return filtered_paragraphs
+
+# Rows per statement for batched queries, well under SQLite's bound-variable limit
+BATCH_SIZE = 400
+
+def store_paragraphs(paragraphs, document, db_session):
+    """
+    Store segmented paragraphs and associate them with a document.
     
-    # Process each paragraph
-    paragraph_count = 0
-    exact_match_count = 0
+    Works in bulk rather than per paragraph: all hashes are resolved with one
+    IN query, missing paragraphs are added with one multi-row INSERT, and the
+    document_paragraph rows (with their positions) are written with a single
+    executemany. Each step is chunked by BATCH_SIZE for very long documents.
     
-    for position, paragraph_text in enumerate(filtered_paragraphs):
-        # Create hash for efficient lookup
-        paragraph_hash = hash_paragraph(paragraph_text)
-        
-        # Check if paragraph already exists in database
-        paragraph = Paragraph.query.filter_by(hash=paragraph_hash).first()
-        
-        if not paragraph:
-            # Create new paragraph
-            paragraph = Paragraph(
-                content=paragraph_text, 
-                hash=paragraph_hash
-            )
-            db_session.add(paragraph)
-            db_session.flush()  # Ensure paragraph has an ID
-        else:
-            exact_match_count += 1
+    Args:
+        paragraphs (list): Paragraph texts in document order (from segment_paragraphs)
+        document: Document object (must already have an ID)
+        db_session: SQLAlchemy session
         
-        # Associate paragraph with document if not already associated
-        if paragraph not in document.paragraphs:
-            # First add the paragraph to the document (creates the association)
-            document.paragraphs.append(paragraph)
-            db_session.flush()
-            
-            try:
-                # Get direct database connection to handle position setting
-                connection = db_session.connection().connection
-                cursor = connection.cursor()
-                
-                # Update the position using direct SQL
-                cursor.execute(
-                    "UPDATE document_paragraph SET position = ? WHERE document_id = ? AND paragraph_id = ?",
-                    (position, document.id, paragraph.id)
-                )
-                
-                paragraph_count += 1
-            except Exception as e:
-                logger.error(f"Error setting position: {str(e)}")
-                # Continue processing even if position setting fails
-                paragraph_count += 1
-    
-    logger.info(f"Document processing complete: {paragraph_count} paragraphs added")
+    Returns:
+        int: Number of paragraphs newly associated with the document
+    """
+    from models import Paragraph, document_paragraph
+    
+    # Hash each paragraph once, keeping the first position of each distinct paragraph
+    by_hash = {}
+    for position, paragraph_text in enumerate(paragraphs):
+        paragraph_hash = hash_paragraph(paragraph_text)
+        if paragraph_hash not in by_hash:
+            by_hash[paragraph_hash] = (position, paragraph_text)
+    
+    if not by_hash:
+        logger.info("Document processing complete: 0 paragraphs added")
+        return 0
+    
+    hashes = list(by_hash)
+    
+    def resolve_ids(hash_list):
+        ids = {}
+        for i in range(0, len(hash_list), BATCH_SIZE):
+            rows = db_session.query(Paragraph.hash, Paragraph.id)\
+                .filter(Paragraph.hash.in_(hash_list[i:i + BATCH_SIZE])).all()
+            ids.update({paragraph_hash: paragraph_id for paragraph_hash, paragraph_id in rows})
+        return ids
+    
+    # Resolve paragraphs that already exist in the database
+    paragraph_ids = resolve_ids(hashes)
+    exact_match_count = len(paragraph_ids)
+    
+    # Insert the missing paragraphs; OR IGNORE tolerates a concurrent worker
+    # inserting the same paragraph between our SELECT and INSERT
+    missing = [{'content': by_hash[h][1], 'hash': h} for h in hashes if h not in paragraph_ids]
+    if missing:
+        insert_stmt = Paragraph.__table__.insert().prefix_with('OR IGNORE', dialect='sqlite')
+        for i in range(0, len(missing), BATCH_SIZE):
+            db_session.execute(insert_stmt.values(missing[i:i + BATCH_SIZE]))
+        paragraph_ids.update(resolve_ids([row['hash'] for row in missing]))
+    
+    # Skip associations that already exist (e.g. when a failed ingestion is retried)
+    already_linked = {
+        row[0] for row in db_session.query(document_paragraph.c.paragraph_id)
+        .filter(document_paragraph.c.document_id == document.id).all()
+    }
+    
+    association_rows = [
+        {'document_id': document.id, 'paragraph_id': paragraph_ids[h], 'position': by_hash[h][0]}
+        for h in hashes if paragraph_ids[h] not in already_linked
+    ]
+    if association_rows:
+        db_session.execute(document_paragraph.insert(), association_rows)
+    
+    # The association rows were written outside the ORM collection
+    db_session.expire(document, ['paragraphs'])
+    
+    paragraph_count = len(association_rows)
+    logger.info(f"Document processing complete: {paragraph_count} paragraphs added ({exact_match_count} already known)")
     return paragraph_count
+
+def process_paragraphs(text, document, db_session):
+    """
+    Process text into paragraphs and associate with document.
+    This function maintains the exact signature expected by app.py.
+    """
+    return store_paragraphs(segment_paragraphs(text), document, db_session)
\ No newline at end of file
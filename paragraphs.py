@@ -1,7 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from models import db, Document, Paragraph, Tag
-from utils.query_helpers import get_shared_paragraphs, get_paragraphs_with_counts, get_document_paragraph_counts
-from utils.excel_exporter import generate_excel_report
+from utils.query_helpers import get_shared_paragraph_page, get_document_paragraph_counts, get_paragraph_page, get_paragraph_stats
+# Aliased: get_paragraph_tags is also the name of the tags API view below
+from utils.query_helpers import get_paragraph_documents, get_paragraph_tags as load_paragraph_tags
+from utils.exports import request_report
+from utils.http_cache import conditional_json
 
 # Create blueprint
 bp = Blueprint('paragraphs', __name__)
@@ -9,36 +12,42 @@ bp = Blueprint('paragraphs', __name__)
 @bp.route('/')
 def list():
     """View paragraph analysis page."""
-    # Get paragraphs and document counts using optimized query
-    paragraphs_with_counts = get_paragraphs_with_counts()
+    # Only the first page is rendered; the table loads more through /api/search
+    paragraphs, next_cursor = get_paragraph_page(current_app.config['SEARCH_PAGE_SIZE'])
     
-    # Split into paragraphs and counts
-    paragraphs = [p for p, _ in paragraphs_with_counts]
+    # First page of shared paragraphs, most shared first; the rest come from /api/shared-paragraphs
+    shared_paragraphs, shared_cursor = get_shared_paragraph_page(current_app.config['SEARCH_PAGE_SIZE'])
     
-    # Get shared paragraphs (more efficiently)
-    shared_paragraphs = get_shared_paragraphs(order_by_count=True)
+    # Documents and tags for every row on the page, in a fixed number of queries
+    paragraph_ids = [p.id for p in paragraphs] + [p.id for p in shared_paragraphs]
     
     return render_template('paragraphs.html', 
                            paragraphs=paragraphs, 
-                           shared_paragraphs=shared_paragraphs)
+                           next_cursor=next_cursor,
+                           paragraph_stats=get_paragraph_stats(),
+                           shared_paragraphs=shared_paragraphs,
+                           shared_cursor=shared_cursor,
+                           paragraph_documents=get_paragraph_documents(paragraph_ids),
+                           paragraph_tags=load_paragraph_tags(paragraph_ids))
 
 @bp.route('/export')
 def export():
-    """Export paragraphs to Excel."""
-    documents = Document.query.filter_by(status='processed').all()
-    
-    if not documents:
+    """Export paragraphs to Excel (built by a background job, reused until the corpus changes)."""
+    if Document.query.filter_by(status='processed').first() is None:
         flash('No processed documents to export', 'error')
         return redirect(url_for('paragraphs.list'))
     
     try:
-        report_filename = generate_excel_report(documents, current_app.config['UPLOAD_FOLDER'])
-        flash('Excel report with paragraphs generated successfully', 'success')
-        return redirect(url_for('documents.download_report', filename=report_filename))
+        report_filename, job = request_report(db.session, current_app.config['UPLOAD_FOLDER'], 'excel', {'status': 'processed'})
     except Exception as e:
-        current_app.logger.exception(f"Error generating Excel report: {str(e)}")
+        current_app.logger.exception(f"Error queueing Excel report: {str(e)}")
         flash(f'Error generating Excel report: {str(e)}', 'error')
         return redirect(url_for('paragraphs.list'))
+    
+    if report_filename:
+        flash('Excel report is up to date', 'success')
+        return redirect(url_for('documents.download_report', filename=report_filename))
+    return redirect(url_for('export_status', job_id=job.id))
 
 @bp.route('/<int:id>/tag', methods=['POST'])
 def tag_paragraph(id):
@@ -65,6 +74,7 @@ def tag_paragraph(id):
         return redirect(url_for('paragraphs.list'))
 
 @bp.route('/<int:id>/tags')
+@conditional_json()
 def get_paragraph_tags(id):
     """API endpoint to get tags for a paragraph."""
     paragraph = Paragraph.query.get_or_404(id)
@@ -84,6 +94,8 @@ def get_paragraph_tags(id):
 def find_similar():
     """Find paragraphs similar to the provided text."""
     from utils.similarity_analyzer import find_similar_paragraphs
+    from utils.vector_store import open_vector_store, VectorStoreError
+    from utils.job_queue import enqueue_job
     
     # Get text from request
     text = request.form.get('text', '')
@@ -96,14 +108,35 @@ def find_similar():
             'results': []
         })
         
+    store_path = current_app.config['PARAGRAPH_VECTORS_PATH']
+    try:
+        store = open_vector_store(store_path)
+    except VectorStoreError as e:
+        current_app.logger.error(str(e))
+        return jsonify({
+            'success': False,
+            'message': 'The paragraph index could not be read, please try again shortly',
+            'results': []
+        })
+    if store is None:
+        # The index is built by a background worker, never inside a request
+        enqueue_job(db.session, 'similarity', unique=True)
+        db.session.commit()
+        return jsonify({
+            'success': False,
+            'message': 'The paragraph index is being built, please try again shortly',
+            'results': []
+        })
+    
     # Find similar paragraphs
-    results = find_similar_paragraphs(text, Paragraph, min_similarity, limit=10)
+    results = find_similar_paragraphs(text, Paragraph, min_similarity, limit=10, store_path=store_path)
     
     # Format results for JSON response
+    documents = get_paragraph_documents([para.id for para, _ in results])
     formatted_results = []
     for para, score in results:
         # Get document names
-        doc_names = [doc.original_filename for doc in para.documents]
+        doc_names = [doc['filename'] for doc in documents.get(para.id, [])]
         
         formatted_results.append({
             'id': para.id,
@@ -2,6 +2,7 @@ import fitz  # PyMuPDF
 import os
 import logging
 import io
+from utils.pdf_pool import open_pdf
 
 logger = logging.getLogger(__name__)
 
@@ -9,15 +10,16 @@ def extract_text_from_pdf(file_path):
     """Extract text from a PDF file using PyMuPDF."""
     try:
         logger.info(f"Extracting text from PDF: {file_path}")
-        doc = fitz.open(file_path)
-        text = ""
-        
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text += page.get_text()
-        
-        page_count = len(doc)
-        doc.close()
+        # One-shot read in an ingest worker process: a pooled handle would
+        # never be checked out again, so the file is opened and closed directly
+        with fitz.open(file_path) as doc:
+            text = ""
+            
+            for page_num in range(len(doc)):
+                page = doc.load_page(page_num)
+                text += page.get_text()
+            
+            page_count = len(doc)
         logger.info(f"Successfully extracted text from PDF: {file_path}")
         return text, page_count
     except Exception as e:
@@ -38,8 +40,8 @@ def create_pdf_preview_info(file_path):
     """
     try:
         logger.info(f"Creating preview info for PDF: {file_path}")
-        doc = fitz.open(file_path)
-        total_doc_pages = len(doc)
+        with fitz.open(file_path) as doc:
+            total_doc_pages = len(doc)
         
         # Get the base filename without extension
         base_filename = os.path.splitext(os.path.basename(file_path))[0]
@@ -51,19 +53,19 @@ def create_pdf_preview_info(file_path):
             'file_type': 'pdf'
         }
         
-        doc.close()
         return preview_info
     except Exception as e:
         logger.error(f"Error creating PDF preview info for {file_path}: {str(e)}")
         return None
 
-def generate_page_preview(document, page_number, file_path):
+def generate_page_preview(document, page_number, file_path, zoom=2.0):
     """Generate a preview image for a specific page of a PDF document in memory.
     
     Args:
         document: Document object
         page_number: Page number to generate (1-based index)
         file_path: Path to the PDF file
+        zoom: Render scale relative to 72 dpi
         
     Returns:
         tuple: (bytes, str) - Image data as bytes and mimetype
@@ -85,15 +87,14 @@ def generate_page_preview(document, page_number, file_path):
             logger.error(f"Document file not found: {file_path}")
             return None, None
             
-        doc = fitz.open(file_path)
-        
-        # Load the requested page (adjust for 0-based indexing)
-        page = doc.load_page(page_number - 1)
-        
-        # Render page to an image with higher resolution for better quality
-        zoom_factor = 2.0  # Adjust as needed for quality vs. file size
-        mat = fitz.Matrix(zoom_factor, zoom_factor)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
+        # Pooled handle: paging through a document opens the file only once
+        with open_pdf(file_path) as doc:
+            # Load the requested page (adjust for 0-based indexing)
+            page = doc.load_page(page_number - 1)
+            
+            # Render page to an image with higher resolution for better quality
+            mat = fitz.Matrix(zoom, zoom)
+            pix = page.get_pixmap(matrix=mat, alpha=False)
         
         # Save the image to a bytes buffer instead of a file
         img_bytes = pix.tobytes("png")
@@ -104,8 +105,25 @@ def generate_page_preview(document, page_number, file_path):
         
         logger.info(f"Preview generated in memory for page {page_number} of document ID {document.id}")
         
-        doc.close()
         return buffer.getvalue(), "image/png"
     except Exception as e:
         logger.error(f"Error generating page preview: {str(e)}")
-        return None, None
\ No newline at end of file
+        return None, None
+
+def render_pdf_pages(file_path, renders):
+    """Render several pages of a PDF to PNG with one pooled handle.
+    
+    Args:
+        file_path: Path to the PDF file
+        renders: Iterable of (page_number, zoom) pairs, page numbers 1-based
+        
+    Yields:
+        tuple: (page_number, zoom, bytes) for each page that exists
+    """
+    with open_pdf(file_path) as doc:
+        for page_number, zoom in renders:
+            if page_number < 1 or page_number > len(doc):
+                continue
+            page = doc.load_page(page_number - 1)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            yield page_number, zoom, pix.tobytes("png")
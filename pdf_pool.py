@@ -0,0 +1,155 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+class PdfDocumentPool:
+    """
+    Per-process LRU of open PyMuPDF documents.
+
+    Opening a PDF parses its xref table and page tree, which dominates the
+    cost of rendering one page of a large file. Handles are checked out for
+    exclusive use (fitz documents aren't thread-safe) and returned to the
+    pool afterwards, so paging through a document pays the open once.
+
+    Handles are keyed by path, modification time and size, so a replaced
+    file is reopened. Idle handles are closed after idle_seconds, and the
+    least recently used ones whenever more than max_open are idle or their
+    files add up to more than max_bytes. File size only estimates the memory
+    MuPDF holds for a document (pages it has loaded and decoded fonts and
+    images can take more), so max_bytes is a soft bound, not a measurement.
+    """
+
+    def __init__(self, max_open, idle_seconds, max_bytes):
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._idle = OrderedDict()  # {key: [(doc, size, returned_at)]}, least recently used first
+        self._idle_count = 0
+        self._idle_bytes = 0
+        self.opened = 0  # Number of fitz.open calls, for monitoring
+        self.reused = 0
+
+    @contextmanager
+    def checkout(self, file_path):
+        """
+        Borrow an open document for the duration of a with block.
+
+        A handle in use elsewhere is never shared: a second concurrent
+        checkout of the same file opens another handle.
+        """
+        stat = os.stat(file_path)
+        key = (os.path.realpath(file_path), stat.st_mtime_ns, stat.st_size)
+
+        doc = None
+        with self._lock:
+            handles = self._idle.get(key)
+            if handles:
+                doc, size, _ = handles.pop()
+                self._idle_count -= 1
+                self._idle_bytes -= size
+                if not handles:
+                    del self._idle[key]
+                self.reused += 1
+        if doc is None:
+            doc = fitz.open(file_path)
+            with self._lock:
+                self.opened += 1
+
+        completed = False
+        try:
+            yield doc
+            completed = True
+        finally:
+            # A handle whose user failed may be in an unknown state, so it isn't reused
+            with self._lock:
+                if completed and self.max_open > 0:
+                    self._idle.setdefault(key, []).append((doc, stat.st_size, time.monotonic()))
+                    self._idle.move_to_end(key)
+                    self._idle_count += 1
+                    self._idle_bytes += stat.st_size
+                    doc = None
+                self._trim()
+            if doc is not None:
+                doc.close()
+
+    def _trim(self):
+        """Close expired handles, then least recently used ones over the limits. Caller holds the lock."""
+        now = time.monotonic()
+        for key in list(self._idle):
+            handles = self._idle[key]
+            for entry in [h for h in handles if now - h[2] > self.idle_seconds]:
+                self._close(key, entry)
+
+        while self._idle and (self._idle_count > self.max_open or self._idle_bytes > self.max_bytes):
+            key = next(iter(self._idle))
+            self._close(key, self._idle[key][0])
+
+    def _close(self, key, entry):
+        handles = self._idle[key]
+        handles.remove(entry)
+        if not handles:
+            del self._idle[key]
+        self._idle_count -= 1
+        self._idle_bytes -= entry[1]
+        try:
+            entry[0].close()
+        except Exception as e:
+            logger.warning(f"Error closing pooled PDF {key[0]}: {str(e)}")
+
+    def close_idle(self, older_than=None):
+        """
+        Close idle handles (all of them by default).
+
+        Args:
+            older_than (float): Only close handles idle for more than this many seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            for key in list(self._idle):
+                for entry in list(self._idle[key]):
+                    if older_than is None or now - entry[2] > older_than:
+                        self._close(key, entry)
+
+    def stats(self):
+        """Return counters for monitoring: idle handles, their file bytes, opens and reuses."""
+        with self._lock:
+            return {'idle': self._idle_count, 'idle_bytes': self._idle_bytes,
+                    'opened': self.opened, 'reused': self.reused}
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pdf_pool():
+    """
+    Return this process's pool, sized from Config (PDF_POOL_*).
+
+    A process forked from one that already had a pool gets a fresh one;
+    handles are never shared across processes. A daemon thread closes
+    handles that stay idle past PDF_POOL_IDLE_SECONDS even when no further
+    checkouts come in.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            from config import Config
+            _pool = PdfDocumentPool(Config.PDF_POOL_SIZE, Config.PDF_POOL_IDLE_SECONDS, Config.PDF_POOL_MAX_BYTES)
+            _pool_pid = os.getpid()
+            threading.Thread(target=_reap_idle, args=(_pool,), name='pdf-pool-reaper', daemon=True).start()
+        return _pool
+
+def _reap_idle(pool):
+    while pool is _pool:
+        time.sleep(max(1, pool.idle_seconds / 2))
+        pool.close_idle(older_than=pool.idle_seconds)
+
+def open_pdf(file_path):
+    """Check out a pooled, open fitz document for a with block."""
+    return get_pdf_pool().checkout(file_path)
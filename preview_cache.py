@@ -0,0 +1,305 @@
+import os
+import time
+import errno
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# After an eviction the cache is trimmed to this fraction of its limit, so the
+# next few writes don't each trigger another directory scan
+EVICT_TO_RATIO = 0.9
+
+# Hits refresh an entry's mtime (the LRU clock) at most this often
+TOUCH_INTERVAL = 60
+
+# Open caches per process, keyed by folder
+_caches = {}
+_caches_lock = threading.Lock()
+
+class PreviewCache:
+    """
+    Content-addressed, size-bounded cache of rendered preview images on disk.
+
+    Entries are keyed by (file hash, page, zoom, format), so a cached image
+    stays valid for as long as a file with those bytes exists and several
+    documents with the same content share it. Layout under the folder:
+
+        ab/ab34...e1.png        one file per entry, sharded by key prefix
+
+    Files are written to a temporary file and renamed into place, so readers
+    in other processes never see a partial image. A hit bumps the file's
+    mtime; when the folder grows past max_bytes the least recently used
+    entries are removed until it is back under EVICT_TO_RATIO of the limit.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None  # Bytes in the folder as last scanned plus this process's writes
+        os.makedirs(folder, exist_ok=True)
+
+    @staticmethod
+    def make_key(file_hash, page, zoom, fmt):
+        """Return the cache key for one rendering of one page."""
+        return hashlib.sha256(f"{file_hash}:{page}:{zoom}:{fmt}".encode('utf-8')).hexdigest()
+
+    def _path(self, key, fmt):
+        return os.path.join(self.folder, key[:2], f"{key}.{fmt}")
+
+    def get(self, key, fmt):
+        """
+        Return the cached image bytes, or None on a miss.
+
+        Args:
+            key (str): Key from make_key
+            fmt (str): Image format (file extension)
+        """
+        path = self._path(key, fmt)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Could not read cached preview {path}: {str(e)}")
+            return None
+
+        try:
+            if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL:
+                os.utime(path)
+        except OSError:
+            pass  # Evicted by another process since the read
+        return data
+
+    def contains(self, key, fmt):
+        """Return True if an entry is cached, without reading it or bumping it."""
+        return os.path.exists(self._path(key, fmt))
+
+    def put(self, key, fmt, data):
+        """
+        Store image bytes atomically and evict old entries if the cache is full.
+
+        Failures are logged and swallowed: the cache is an optimisation and
+        the caller already has the image it rendered.
+        """
+        path = self._path(key, fmt)
+        folder = os.path.dirname(path)
+        temp_path = None
+        try:
+            os.makedirs(folder, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            temp_path = None
+        except OSError as e:
+            logger.warning(f"Could not cache preview {path}: {str(e)}")
+            return
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        """Return ([(mtime, size, path)], total bytes) for the entries on disk."""
+        entries, total = [], 0
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith('.tmp'):
+                    # Left behind by a process that died mid-write
+                    if time.time() - stat.st_mtime > 3600:
+                        self._remove(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        return entries, total
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is under its target size."""
+        entries, total = self._scan()
+        target = self.max_bytes * EVICT_TO_RATIO
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            if self._remove(path):
+                removed += 1
+            total -= size
+        self._size = total
+        if removed:
+            logger.info(f"Evicted {removed} cached previews, {total / (1024 * 1024):.1f} MB left")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError as e:
+            # Another process evicting at the same time got there first
+            if e.errno != errno.ENOENT:
+                logger.warning(f"Could not remove cached preview {path}: {str(e)}")
+            return False
+
+    def clear(self):
+        """Remove every entry. Returns the number of files removed."""
+        with self._lock:
+            entries, _ = self._scan()
+            removed = sum(1 for _, _, path in entries if self._remove(path))
+            self._size = 0
+        return removed
+
+def get_preview_cache(config):
+    """
+    Return this process's cache for the configured folder.
+
+    Args:
+        config: Flask config (PREVIEW_CACHE_FOLDER, PREVIEW_CACHE_MAX_BYTES)
+
+    Returns:
+        PreviewCache: Shared cache, or None when PREVIEW_CACHE_MAX_BYTES is 0
+    """
+    folder = config['PREVIEW_CACHE_FOLDER']
+    max_bytes = config['PREVIEW_CACHE_MAX_BYTES']
+    if not max_bytes:
+        return None
+    with _caches_lock:
+        cache = _caches.get(folder)
+        if cache is None or cache.max_bytes != max_bytes:
+            cache = _caches[folder] = PreviewCache(folder, max_bytes)
+        return cache
+
+def _preview_format(document, config, thumbnail=False):
+    """Return (zoom, format, mimetype) a document's previews are rendered with."""
+    zoom = None
+    if document.get_file_type_from_preview_info() == 'pdf':
+        zoom = config['PREVIEW_THUMBNAIL_ZOOM'] if thumbnail else config['PREVIEW_ZOOM']
+    return zoom, 'png', 'image/png'
+
+def get_preview_etag(document, page_number, config, thumbnail=False):
+    """
+    Return a strong ETag for a page preview without touching the document file.
+
+    The ETag is the preview's cache key, so it changes exactly when the
+    rendered image would.
+
+    Returns:
+        str: ETag, or None for a document whose content hash isn't known yet
+    """
+    if not document.content_hash:
+        return None
+    zoom, fmt, _ = _preview_format(document, config, thumbnail)
+    return PreviewCache.make_key(document.content_hash, page_number, zoom, fmt)
+
+def get_document_preview(document, page_number, upload_folder, config, thumbnail=False):
+    """
+    Return a page preview of a document, rendering it only on a cache miss.
+
+    PDF pages are rendered at PREVIEW_ZOOM (PREVIEW_THUMBNAIL_ZOOM for
+    thumbnails); DOCX sections are rendered by docx_extractor at a fixed
+    size. A document stored before content hashes existed gets its hash
+    computed here and saved, so later hits skip it.
+
+    Args:
+        document: Document object
+        page_number (int): Page (or DOCX section) number, 1-based
+        upload_folder (str): Folder the document file is stored in
+        config: Flask config
+        thumbnail (bool): Return the low-resolution rendering
+
+    Returns:
+        tuple: (bytes, str) - Image data and mimetype, or (None, None)
+    """
+    from models import db
+    from utils.file_utils import compute_file_hash
+    from utils.pdf_extractor import generate_page_preview
+    from utils.docx_extractor import generate_section_preview
+
+    file_path = os.path.join(upload_folder, document.filename)
+    zoom, fmt, mimetype = _preview_format(document, config, thumbnail)
+
+    cache = get_preview_cache(config)
+    key = None
+    if cache is not None and os.path.exists(file_path):
+        if not document.content_hash:
+            document.content_hash = compute_file_hash(file_path)
+            db.session.commit()
+        key = get_preview_etag(document, page_number, config, thumbnail)
+        data = cache.get(key, fmt)
+        if data is not None:
+            return data, mimetype
+
+    if zoom is not None:
+        data, mimetype = generate_page_preview(document, page_number, file_path, zoom=zoom)
+    else:  # Default to docx
+        data, mimetype = generate_section_preview(document, page_number, file_path)
+
+    if data and key:
+        cache.put(key, fmt, data)
+    return data, mimetype
+
+def prerender_previews(document, upload_folder, config):
+    """
+    Render the previews a document view asks for first into the cache.
+
+    Covers the first PREVIEW_PRERENDER_PAGES pages at full size and the first
+    PREVIEW_THUMBNAIL_PAGES as thumbnails. Entries already cached (an
+    identical file, or a page someone has opened meanwhile) are skipped, and
+    a PDF is opened once for all of its pages.
+
+    Args:
+        document: Document object
+        upload_folder (str): Folder the document file is stored in
+        config: Flask config
+
+    Returns:
+        int: Number of images rendered
+    """
+    from utils.pdf_extractor import render_pdf_pages
+    from utils.docx_extractor import generate_section_preview
+
+    cache = get_preview_cache(config)
+    file_path = os.path.join(upload_folder, document.filename)
+    if cache is None or not document.content_hash or not os.path.exists(file_path):
+        return 0
+
+    page_count = document.get_preview_count()
+    wanted = [(page, False) for page in range(1, min(page_count, config['PREVIEW_PRERENDER_PAGES']) + 1)]
+    wanted += [(page, True) for page in range(1, min(page_count, config['PREVIEW_THUMBNAIL_PAGES']) + 1)]
+
+    # {(page, zoom): cache key} for the renderings not cached yet; DOCX
+    # sections have one size, so a page's preview and thumbnail share a key
+    missing = {}
+    for page, thumbnail in wanted:
+        zoom, fmt, _ = _preview_format(document, config, thumbnail)
+        key = PreviewCache.make_key(document.content_hash, page, zoom, fmt)
+        if (page, zoom) not in missing and not cache.contains(key, fmt):
+            missing[(page, zoom)] = key
+
+    rendered = 0
+    if document.get_file_type_from_preview_info() == 'pdf':
+        for page, zoom, data in render_pdf_pages(file_path, sorted(missing)):
+            cache.put(missing[(page, zoom)], 'png', data)
+            rendered += 1
+    else:
+        for page, _ in sorted(missing):
+            data, _ = generate_section_preview(document, page, file_path)
+            if data:
+                cache.put(missing[(page, None)], 'png', data)
+                rendered += 1
+    return rendered
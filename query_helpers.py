@@ -1,5 +1,14 @@
-from sqlalchemy import func, and_, or_
-from models import db, Document, Paragraph, document_paragraph, Tag, DocumentSimilarity
+from sqlalchemy import func, and_, or_, text
+from models import db, Document, Paragraph, document_paragraph, Tag, DocumentSimilarity, document_tag, paragraph_tag
+
+# IDs bound per IN (...) clause; older SQLite builds allow at most 999 variables
+IN_BATCH_SIZE = 500
+
+def _batched(ids):
+    """Split a list of IDs into IN-clause sized batches."""
+    ids = list(ids)
+    for i in range(0, len(ids), IN_BATCH_SIZE):
+        yield ids[i:i + IN_BATCH_SIZE]
 
 def get_shared_paragraphs(order_by_count=True):
     """
@@ -11,21 +20,12 @@ def get_shared_paragraphs(order_by_count=True):
     Returns:
         list: List of Paragraph objects with count > 1
     """
-    # First, create a subquery to count documents per paragraph
-    paragraph_counts = db.session.query(
-        document_paragraph.c.paragraph_id,
-        func.count(document_paragraph.c.document_id).label('doc_count')
-    ).group_by(document_paragraph.c.paragraph_id).subquery()
-    
-    # Then join with Paragraph table and filter for count > 1
-    query = Paragraph.query.join(
-        paragraph_counts,
-        Paragraph.id == paragraph_counts.c.paragraph_id
-    ).filter(paragraph_counts.c.doc_count > 1)
+    # Range scan on the maintained doc_count index, no GROUP BY over document_paragraph
+    query = Paragraph.query.filter(Paragraph.doc_count > 1)
     
     # Order by count if requested
     if order_by_count:
-        query = query.order_by(paragraph_counts.c.doc_count.desc())
+        query = query.order_by(Paragraph.doc_count.desc(), Paragraph.id)
     
     return query.all()
 
@@ -36,22 +36,9 @@ def get_paragraphs_with_counts():
     Returns:
         list: List of (Paragraph, count) tuples
     """
-    # Create a subquery to count documents per paragraph
-    paragraph_counts = db.session.query(
-        document_paragraph.c.paragraph_id,
-        func.count(document_paragraph.c.document_id).label('doc_count')
-    ).group_by(document_paragraph.c.paragraph_id).subquery()
-    
-    # Join with Paragraph table and select both paragraph and count
-    results = db.session.query(
-        Paragraph, 
-        paragraph_counts.c.doc_count
-    ).join(
-        paragraph_counts,
-        Paragraph.id == paragraph_counts.c.paragraph_id
-    ).order_by(paragraph_counts.c.doc_count.desc()).all()
-    
-    return results
+    return db.session.query(Paragraph, Paragraph.doc_count)\
+        .filter(Paragraph.doc_count > 0)\
+        .order_by(Paragraph.doc_count.desc(), Paragraph.id).all()
 
 def check_tag_name_exists(name, exclude_id=None):
     """
@@ -141,9 +128,228 @@ def get_document_paragraph_counts():
     Returns:
         dict: Dictionary mapping paragraph_id to document count
     """
-    counts = db.session.query(
-        document_paragraph.c.paragraph_id,
-        func.count(document_paragraph.c.document_id).label('count')
-    ).group_by(document_paragraph.c.paragraph_id).all()
+    counts = db.session.query(Paragraph.id, Paragraph.doc_count)\
+        .filter(Paragraph.doc_count > 0).all()
     
     return {row[0]: row[1] for row in counts}
+
+
+def get_paragraph_page(limit, after_id=0):
+    """
+    Get one page of paragraphs in ID order (keyset pagination).
+    
+    Args:
+        limit (int): Page size
+        after_id (int): ID of the last paragraph of the previous page
+    
+    Returns:
+        tuple: (list of Paragraph objects, cursor for the next page or None)
+    """
+    from utils.search_index import encode_cursor
+    
+    paragraphs = Paragraph.query.filter(Paragraph.id > after_id)\
+        .order_by(Paragraph.id).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(paragraphs) > limit:
+        paragraphs = paragraphs[:limit]
+        next_cursor = encode_cursor(0.0, paragraphs[-1].id)
+    
+    return paragraphs, next_cursor
+
+def get_shared_paragraph_page(limit, cursor=None):
+    """
+    Get one page of shared paragraphs, most shared first (keyset pagination).
+    
+    Pages are read from the doc_count index in (doc_count DESC, id) order,
+    so every page costs the same however many paragraphs are shared.
+    
+    Args:
+        limit (int): Page size
+        cursor (str): Cursor returned with the previous page
+    
+    Returns:
+        tuple: (list of Paragraph objects, cursor for the next page or None)
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    from utils.search_index import encode_cursor, decode_cursor
+    
+    query = Paragraph.query.filter(Paragraph.doc_count > 1)
+    if cursor:
+        last_count, last_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Paragraph.doc_count < last_count,
+            and_(Paragraph.doc_count == last_count, Paragraph.id > last_id)
+        ))
+    paragraphs = query.order_by(Paragraph.doc_count.desc(), Paragraph.id).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(paragraphs) > limit:
+        paragraphs = paragraphs[:limit]
+        next_cursor = encode_cursor(paragraphs[-1].doc_count, paragraphs[-1].id)
+    
+    return paragraphs, next_cursor
+
+def get_paragraph_documents(paragraph_ids):
+    """
+    Get the documents containing each of the given paragraphs in one query per batch.
+    
+    Args:
+        paragraph_ids (list): Paragraph IDs
+    
+    Returns:
+        dict: Mapping of paragraph_id to a list of {'id', 'filename', 'file_type'} dicts
+    """
+    documents = {}
+    for batch in _batched(paragraph_ids):
+        rows = db.session.query(
+            document_paragraph.c.paragraph_id,
+            Document.id,
+            Document.original_filename,
+            Document.file_type
+        ).join(
+            Document, Document.id == document_paragraph.c.document_id
+        ).filter(
+            document_paragraph.c.paragraph_id.in_(batch)
+        ).order_by(document_paragraph.c.paragraph_id, Document.id).all()
+        
+        for paragraph_id, doc_id, filename, file_type in rows:
+            documents.setdefault(paragraph_id, []).append({
+                'id': doc_id,
+                'filename': filename,
+                'file_type': file_type
+            })
+    return documents
+
+def get_paragraph_tags(paragraph_ids):
+    """
+    Get the tags of each of the given paragraphs in one query per batch.
+    
+    Args:
+        paragraph_ids (list): Paragraph IDs
+    
+    Returns:
+        dict: Mapping of paragraph_id to a list of Tag objects, sorted by name
+    """
+    tags = {}
+    for batch in _batched(paragraph_ids):
+        rows = db.session.query(paragraph_tag.c.paragraph_id, Tag)\
+            .join(Tag, Tag.id == paragraph_tag.c.tag_id)\
+            .filter(paragraph_tag.c.paragraph_id.in_(batch))\
+            .order_by(Tag.name).all()
+        for paragraph_id, tag in rows:
+            tags.setdefault(paragraph_id, []).append(tag)
+    return tags
+
+def get_document_tags(document_ids):
+    """
+    Get the tags of each of the given documents in one query per batch.
+    
+    Args:
+        document_ids (list): Document IDs
+    
+    Returns:
+        dict: Mapping of document_id to a list of Tag objects, sorted by name
+    """
+    tags = {}
+    for batch in _batched(document_ids):
+        rows = db.session.query(document_tag.c.document_id, Tag)\
+            .join(Tag, Tag.id == document_tag.c.tag_id)\
+            .filter(document_tag.c.document_id.in_(batch))\
+            .order_by(Tag.name).all()
+        for document_id, tag in rows:
+            tags.setdefault(document_id, []).append(tag)
+    return tags
+
+def get_document_paragraphs(document_id):
+    """
+    Get the paragraphs of a document in reading order.
+    
+    Args:
+        document_id (int): Document ID
+    
+    Returns:
+        list: List of Paragraph objects
+    """
+    return Paragraph.query.join(
+        document_paragraph, document_paragraph.c.paragraph_id == Paragraph.id
+    ).filter(
+        document_paragraph.c.document_id == document_id
+    ).order_by(document_paragraph.c.position, Paragraph.id).all()
+
+def iter_export_paragraphs(document_ids):
+    """
+    Stream the paragraphs of a set of documents with the names of the
+    documents (within the set) that contain them.
+    
+    Runs in two passes so that paragraph content is never sorted: the first
+    ranks (paragraph ID, document count) pairs into a temporary table, the
+    second walks that table in rank order and joins in each paragraph's
+    content and filenames. Rows are read from the cursor as they are
+    consumed instead of being collected first, so memory stays flat however
+    many paragraphs are exported.
+    
+    Args:
+        document_ids (list): Document IDs included in the export
+    
+    Yields:
+        tuple: (paragraph_id, content, filenames joined by ', ', document count),
+            most shared first
+    """
+    connection = db.session.connection()
+    connection.execute(text("CREATE TEMP TABLE IF NOT EXISTS export_document (id INTEGER PRIMARY KEY)"))
+    connection.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS export_paragraph "
+        "(rank INTEGER PRIMARY KEY, paragraph_id INTEGER NOT NULL, shared INTEGER NOT NULL)"
+    ))
+    connection.execute(text("DELETE FROM export_document"))
+    connection.execute(text("DELETE FROM export_paragraph"))
+    for batch in _batched(document_ids):
+        connection.execute(text("INSERT OR IGNORE INTO export_document (id) VALUES (:id)"),
+                           [{'id': document_id} for document_id in batch])
+    try:
+        # Pass 1: only integer pairs are sorted; rank follows insertion order
+        connection.execute(text("""
+            INSERT INTO export_paragraph (paragraph_id, shared)
+            SELECT document_paragraph.paragraph_id, COUNT(*) AS shared
+            FROM export_document
+            JOIN document_paragraph ON document_paragraph.document_id = export_document.id
+            GROUP BY document_paragraph.paragraph_id
+            ORDER BY shared DESC, document_paragraph.paragraph_id
+        """))
+        # Pass 2: walk the ranks in order, looking each paragraph up by primary key
+        result = connection.execution_options(stream_results=True).execute(text("""
+            SELECT paragraph.id, paragraph.content,
+                   (SELECT group_concat(original_filename, ', ') FROM (
+                        SELECT document.original_filename
+                        FROM document_paragraph
+                        JOIN export_document ON export_document.id = document_paragraph.document_id
+                        JOIN document ON document.id = document_paragraph.document_id
+                        WHERE document_paragraph.paragraph_id = export_paragraph.paragraph_id
+                        ORDER BY document.id
+                   )),
+                   export_paragraph.shared
+            FROM export_paragraph
+            JOIN paragraph ON paragraph.id = export_paragraph.paragraph_id
+            ORDER BY export_paragraph.rank
+        """))
+        for row in result:
+            yield tuple(row)
+    finally:
+        connection.execute(text("DELETE FROM export_document"))
+        connection.execute(text("DELETE FROM export_paragraph"))
+
+def get_paragraph_stats():
+    """
+    Count all paragraphs and those shared by more than one document.
+    
+    Returns:
+        dict: total, shared and unique paragraph counts
+    """
+    total = db.session.query(func.count(Paragraph.id)).scalar() or 0
+    shared = db.session.query(func.count(Paragraph.id))\
+        .filter(Paragraph.doc_count > 1).scalar() or 0
+    
+    return {'total': total, 'shared': shared, 'unique': total - shared}
@@ -0,0 +1,38 @@
+"""
+Recompute the maintained paragraph.doc_count column from document_paragraph.
+
+The column is kept in sync by triggers; run this after editing the database
+by hand or restoring a backup made before the triggers existed. With
+--delete-orphans, paragraphs that belong to no document are removed too.
+
+    python reconcile_paragraph_counts.py --delete-orphans
+"""
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+def main():
+    from app import create_app
+    from models import db
+    from utils.paragraph_counts import reconcile_paragraph_counts, delete_orphan_paragraphs
+
+    parser = argparse.ArgumentParser(description='Recompute paragraph document counts')
+    parser.add_argument('--delete-orphans', action='store_true',
+                        help='Also delete paragraphs that belong to no document')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+    app = create_app()
+    with app.app_context():
+        fixed = reconcile_paragraph_counts(db.session)
+        logger.info(f"Corrected the document count of {fixed} paragraphs")
+
+        if args.delete_orphans:
+            deleted = delete_orphan_paragraphs(db.session)
+            db.session.commit()
+            logger.info(f"Deleted {deleted} paragraphs without documents")
+
+if __name__ == '__main__':
+    main()
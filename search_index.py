@@ -0,0 +1,188 @@
+import re
+import json
+import base64
+import logging
+from markupsafe import escape
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Snippet markers that cannot occur in extracted text; replaced with <mark>
+# after the snippet has been HTML-escaped
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+SNIPPET_TOKENS = 32
+
+# External-content FTS5 tables over paragraph.content and the document text,
+# kept in sync by triggers so every insert path (ORM, bulk INSERT OR IGNORE,
+# INSERT ... SELECT) is indexed without extra application code
+FTS_SETUP_STATEMENTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS paragraph_fts USING fts5(
+        content, content='paragraph', content_rowid='id', tokenize='porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS paragraph_fts_insert AFTER INSERT ON paragraph BEGIN
+        INSERT INTO paragraph_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS paragraph_fts_delete AFTER DELETE ON paragraph BEGIN
+        INSERT INTO paragraph_fts(paragraph_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS paragraph_fts_update AFTER UPDATE OF content ON paragraph BEGIN
+        INSERT INTO paragraph_fts(paragraph_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO paragraph_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS document_fts USING fts5(
+        original_filename, extracted_text, content='document', content_rowid='id', tokenize='porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS document_fts_insert AFTER INSERT ON document BEGIN
+        INSERT INTO document_fts(rowid, original_filename, extracted_text)
+        VALUES (new.id, new.original_filename, new.extracted_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS document_fts_delete AFTER DELETE ON document BEGIN
+        INSERT INTO document_fts(document_fts, rowid, original_filename, extracted_text)
+        VALUES ('delete', old.id, old.original_filename, old.extracted_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS document_fts_update AFTER UPDATE OF original_filename, extracted_text ON document BEGIN
+        INSERT INTO document_fts(document_fts, rowid, original_filename, extracted_text)
+        VALUES ('delete', old.id, old.original_filename, old.extracted_text);
+        INSERT INTO document_fts(rowid, original_filename, extracted_text)
+        VALUES (new.id, new.original_filename, new.extracted_text);
+    END""",
+]
+
+# Per scope: FTS table, column used for snippets (-1: best matching), base table
+SEARCH_SCOPES = {
+    'paragraphs': ('paragraph_fts', 0, 'paragraph'),
+    'documents': ('document_fts', -1, 'document'),
+}
+
+def ensure_search_index(db_session):
+    """
+    Create the full-text search tables and triggers if they don't exist yet.
+
+    When a table is created for an existing database it is populated from
+    its base table with the FTS5 'rebuild' command.
+
+    Args:
+        db_session: SQLAlchemy session
+
+    Returns:
+        bool: True if full-text search is available, False if this SQLite
+            build has no FTS5 support
+    """
+    try:
+        existing = {row[0] for row in db_session.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('paragraph_fts', 'document_fts')"
+        ))}
+        for statement in FTS_SETUP_STATEMENTS:
+            db_session.execute(text(statement))
+        for fts_table in ('paragraph_fts', 'document_fts'):
+            if fts_table not in existing:
+                db_session.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+                logger.info(f"Created full-text index {fts_table}")
+        db_session.commit()
+        return True
+    except Exception as e:
+        db_session.rollback()
+        logger.warning(f"Full-text search is not available: {str(e)}")
+        return False
+
+def build_match_query(query_text):
+    """
+    Turn user input into a safe FTS5 MATCH expression.
+
+    Every word is quoted, so FTS5 operators and punctuation in the input are
+    treated as text; all words must match and the last one is a prefix, so
+    results update while the user is still typing.
+
+    Returns:
+        str: MATCH expression, or None if the input contains no words
+    """
+    words = re.findall(r'\w+', query_text or '', re.UNICODE)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def encode_cursor(score, row_id):
+    """Encode the sort key of the last returned row as an opaque cursor."""
+    raw = json.dumps([score, row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        score, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(score), int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def _highlight(snippet):
+    """HTML-escape a snippet and turn the match markers into <mark> tags."""
+    html = str(escape(snippet or ''))
+    return html.replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+def search(db_session, query_text, scope='paragraphs', limit=20, cursor=None):
+    """
+    Full-text search with ranked, highlighted snippets and keyset pagination.
+
+    Results are ordered by BM25 rank (then ID); the cursor holds the rank and
+    ID of the last row of the previous page, so fetching any page costs the
+    same regardless of how deep it is. An empty query lists rows by ID.
+
+    Args:
+        db_session: SQLAlchemy session
+        query_text (str): Words to search for
+        scope (str): 'paragraphs' or 'documents'
+        limit (int): Page size
+        cursor (str): Cursor returned with the previous page
+
+    Returns:
+        dict: 'results' (list of dicts with id, score and snippet HTML) and
+            'next_cursor' (None on the last page)
+
+    Raises:
+        ValueError: For an unknown scope or a malformed cursor
+    """
+    if scope not in SEARCH_SCOPES:
+        raise ValueError(f"Unknown search scope: {scope}")
+    fts_table, snippet_column, base_table = SEARCH_SCOPES[scope]
+    after_score, after_id = decode_cursor(cursor) if cursor else (None, 0)
+
+    match = build_match_query(query_text)
+    if match is None:
+        # No search terms: plain keyset pagination over the base table
+        text_column = 'content' if scope == 'paragraphs' else 'extracted_text'
+        rows = db_session.execute(text(
+            f"SELECT id, 0.0 AS score, substr({text_column}, 1, 300) AS snippet FROM {base_table} "
+            f"WHERE id > :after_id ORDER BY id LIMIT :limit"
+        ), {'after_id': after_id, 'limit': limit + 1}).fetchall()
+        snippets = [str(escape(row.snippet or '')) for row in rows]
+    else:
+        keyset = ''
+        if after_score is not None:
+            keyset = f"AND (bm25({fts_table}) > :after_score OR (bm25({fts_table}) = :after_score AND rowid > :after_id))"
+        rows = db_session.execute(text(
+            f"SELECT rowid AS id, bm25({fts_table}) AS score, "
+            f"snippet({fts_table}, {snippet_column}, :mark_start, :mark_end, '…', {SNIPPET_TOKENS}) AS snippet "
+            f"FROM {fts_table} WHERE {fts_table} MATCH :match {keyset} "
+            f"ORDER BY score, rowid LIMIT :limit"
+        ), {
+            'match': match, 'after_score': after_score, 'after_id': after_id, 'limit': limit + 1,
+            'mark_start': _MARK_START, 'mark_end': _MARK_END
+        }).fetchall()
+        snippets = [_highlight(row.snippet) for row in rows]
+
+    results = [
+        {'id': row.id, 'score': row.score, 'snippet': snippet}
+        for row, snippet in zip(rows[:limit], snippets[:limit])
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.score, last.id)
+
+    return {'results': results, 'next_cursor': next_cursor}
@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from models import db, Document, DocumentSimilarity, Paragraph
-from utils.similarity_analyzer import calculate_document_similarities, get_similarity_network_data
+from utils.similarity_analyzer import calculate_document_similarities, get_similarity_network_data, explain_similarity
+from utils.http_cache import conditional_json
+from utils.query_helpers import get_document_paragraphs, get_paragraph_tags
 
 # Create blueprint
 bp = Blueprint('similarity', __name__)
@@ -34,7 +36,15 @@ def calculate():
         min_similarity = float(request.form.get('min_similarity', 0.3))
         min_similarity = max(0.1, min(0.9, min_similarity))  # Constrain to reasonable range
         
-        pairs_added = calculate_document_similarities(db, Document, DocumentSimilarity, min_similarity)
+        # Optionally keep only each document's strongest relationships
+        top_k = request.form.get('top_k', type=int)
+        top_k = top_k if top_k and top_k > 0 else None
+        
+        pairs_added = calculate_document_similarities(
+            db, Document, DocumentSimilarity, min_similarity, top_k=top_k,
+            store_path=current_app.config['DOCUMENT_VECTORS_PATH'],
+            block_nonzeros=current_app.config['SIMILARITY_BLOCK_NONZEROS']
+        )
         
         if pairs_added is False:
             flash('Not enough documents to calculate similarities (need at least 2)', 'warning')
@@ -61,24 +71,32 @@ def compare(doc1, doc2):
     
     similarity_score = similarity.similarity_score if similarity else 0
     
-    # Find shared paragraphs more efficiently
-    doc1_paragraphs = set(document1.paragraphs)
-    doc2_paragraphs = set(document2.paragraphs)
-    shared_paragraphs = list(doc1_paragraphs.intersection(doc2_paragraphs))
+    # Terms that explain the score, from the stored document vectors
+    shared_terms = explain_similarity(current_app.config['DOCUMENT_VECTORS_PATH'], doc1, doc2)
+    
+    # Find shared paragraphs, keeping each document's reading order
+    doc1_paragraphs = get_document_paragraphs(document1.id)
+    doc2_paragraphs = get_document_paragraphs(document2.id)
+    doc1_ids = {p.id for p in doc1_paragraphs}
+    doc2_ids = {p.id for p in doc2_paragraphs}
+    shared_paragraphs = [p for p in doc1_paragraphs if p.id in doc2_ids]
     
     # Find unique paragraphs
-    unique_to_doc1 = list(doc1_paragraphs - doc2_paragraphs)
-    unique_to_doc2 = list(doc2_paragraphs - doc1_paragraphs)
+    unique_to_doc1 = [p for p in doc1_paragraphs if p.id not in doc2_ids]
+    unique_to_doc2 = [p for p in doc2_paragraphs if p.id not in doc1_ids]
     
     return render_template('compare_documents.html',
                           doc1=document1,
                           doc2=document2,
                           similarity_score=similarity_score,
+                          shared_terms=shared_terms,
                           shared_paragraphs=shared_paragraphs,
                           unique_to_doc1=unique_to_doc1,
-                          unique_to_doc2=unique_to_doc2)
+                          unique_to_doc2=unique_to_doc2,
+                          paragraph_tags=get_paragraph_tags(doc1_ids | doc2_ids))
 
 @bp.route('/api/network-data')
+@conditional_json()
 def network_data():
     """API endpoint to get similarity network data for visualization."""
     min_similarity = float(request.args.get('min_similarity', 0.3))
@@ -92,6 +110,7 @@ def network_data():
     return jsonify(visualization_data)
 
 @bp.route('/api/document-similarity/<int:doc_id>')
+@conditional_json()
 def document_similarity(doc_id):
     """API endpoint to get similarity data for a specific document."""
     document = Document.query.get_or_404(doc_id)
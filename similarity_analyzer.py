@@ -1,11 +1,107 @@
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
+from sklearn.pipeline import make_pipeline
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer, TfidfTransformer
+from utils.vector_store import (open_vector_store, save_vector_store, write_vector_store, append_vectors,
+                                VectorStoreError, SEGMENT_ROWS)
 import logging
 
 logger = logging.getLogger(__name__)
 
-def calculate_document_similarities(db, Document, DocumentSimilarity, min_similarity=0.3):
+# Rows of the TF-IDF matrix multiplied against the corpus at a time. One block's
+# product holds up to rows x number of documents nonzeros, so the rows per block
+# are derived from a budget of nonzeros (Config.SIMILARITY_BLOCK_NONZEROS) and
+# capped at BLOCK_SIZE
+BLOCK_SIZE = 1024
+BLOCK_NONZEROS = 8 * 1024 * 1024  # About 16 bytes each as COO: 128 MB per block
+
+def similarity_block_size(corpus_size, max_nonzeros=BLOCK_NONZEROS):
+    """Return the rows per block whose product against corpus_size rows stays within max_nonzeros."""
+    return max(1, min(BLOCK_SIZE, max_nonzeros // max(1, corpus_size)))
+
+# Paragraph search: character n-grams are hashed into a fixed feature space, so
+# new paragraphs can be vectorized without refitting a vocabulary
+PARAGRAPH_FEATURES = 2 ** 20
+# Paragraphs read from the database per chunk while building the index
+PARAGRAPH_CHUNK_SIZE = 5000
+# Highest-weighted (rarest) query n-grams used to find candidate paragraphs
+QUERY_FEATURES = 48
+# Candidates per requested result that are scored exactly
+CANDIDATES_PER_RESULT = 20
+
+def _insert_similarity_pairs(db, DocumentSimilarity, source_ids, target_ids, scores):
+    """Insert similarity rows with a single executemany, ignoring existing pairs."""
+    if not len(scores):
+        return 0
+    db.session.execute(
+        DocumentSimilarity.__table__.insert().prefix_with('OR IGNORE', dialect='sqlite'),
+        [
+            {'source_id': source_id, 'target_id': target_id, 'similarity_score': score}
+            for source_id, target_id, score in zip(source_ids, target_ids, scores)
+        ]
+    )
+    return len(scores)
+
+def iter_similarity_pairs(tfidf_matrix, min_similarity=0.3, top_k=None, block_size=None):
+    """
+    Yield document pairs with cosine similarity >= min_similarity, block by block.
+
+    Rows of tfidf_matrix must be L2-normalized (TfidfVectorizer's default), so the
+    sparse product of a row block with the transposed matrix is the cosine
+    similarity. Only one block of the product exists at a time; nothing of
+    size n x n is ever allocated.
+
+    Args:
+        tfidf_matrix: Sparse (CSR) matrix with one L2-normalized row per document
+        min_similarity: Minimum similarity threshold (0.0-1.0)
+        top_k: Optional maximum number of neighbours kept per document. A pair is
+            kept if it is in the top k of either document.
+        block_size: Number of rows multiplied per block (default: similarity_block_size)
+
+    Yields:
+        tuple: (rows, cols, scores) numpy arrays with rows < cols
+    """
+    matrix = tfidf_matrix.tocsr()
+    transposed = matrix.T.tocsc()
+    n = matrix.shape[0]
+    block_size = block_size or similarity_block_size(n)
+
+    seen = set() if top_k else None
+    for start in range(0, n, block_size):
+        block = (matrix[start:start + block_size] @ transposed).tocoo()
+
+        rows = block.row + start
+        cols = block.col
+        scores = block.data
+
+        # Threshold and drop self-similarity with a single vectorized mask
+        keep = np.nonzero((scores >= min_similarity) & (rows != cols))[0]
+        rows, cols, scores = rows[keep], cols[keep], scores[keep]
+
+        if top_k:
+            # Rank each row's neighbours by descending score and keep the first top_k
+            order = np.lexsort((-scores, rows))
+            rows, cols, scores = rows[order], cols[order], scores[order]
+            row_starts = np.searchsorted(rows, rows, side='left')
+            keep = np.nonzero(np.arange(len(rows)) - row_starts < top_k)[0]
+            rows, cols, scores = rows[keep], cols[keep], scores[keep]
+
+            # Normalize to (low, high) and drop pairs already emitted from the other side
+            low = np.minimum(rows, cols)
+            high = np.maximum(rows, cols)
+            keys = low.astype(np.int64) * n + high
+            keys, first = np.unique(keys, return_index=True)
+            fresh = np.fromiter((key not in seen for key in keys.tolist()), dtype=bool, count=len(keys))
+            seen.update(keys[fresh].tolist())
+            first = first[fresh]
+            yield low[first], high[first], scores[first]
+        else:
+            # Upper triangle only: each pair is produced once, by its lower row
+            keep = np.nonzero(rows < cols)[0]
+            yield rows[keep], cols[keep], scores[keep]
+
+def calculate_document_similarities(db, Document, DocumentSimilarity, min_similarity=0.3, top_k=None,
+                                    store_path=None, block_nonzeros=BLOCK_NONZEROS):
     """
     Calculate similarity between all documents and store in database.
     Only stores relationships with similarity score >= min_similarity.
@@ -15,12 +111,18 @@ def calculate_document_similarities(db, Document, DocumentSimilarity, min_simila
         Document: Document model class
         DocumentSimilarity: DocumentSimilarity model class
         min_similarity: Minimum similarity threshold (0.0-1.0)
+        top_k: Optional maximum number of similar documents kept per document
+        store_path: Optional vector store folder to save the fitted vectors to, so
+            new documents can later be scored by update_document_similarities
+        block_nonzeros: Budget of nonzeros in one block of the similarity product
         
     Returns:
         int: Number of similarity pairs added, or False if not enough documents
     """
-    # Get all processed documents
-    documents = Document.query.filter_by(status='processed').all()
+    # Get all processed documents (only the columns needed)
+    documents = db.session.query(Document.id, Document.extracted_text)\
+        .filter(Document.status == 'processed')\
+        .order_by(Document.id).all()
     if len(documents) < 2:
         logger.info("Not enough documents to calculate similarities (need at least 2)")
         return False
@@ -28,8 +130,8 @@ def calculate_document_similarities(db, Document, DocumentSimilarity, min_simila
     logger.info(f"Calculating similarities for {len(documents)} documents")
     
     # Extract document IDs and text
-    doc_ids = [doc.id for doc in documents]
-    doc_texts = [doc.extracted_text for doc in documents]
+    doc_ids = np.array([doc.id for doc in documents])
+    doc_texts = [doc.extracted_text or '' for doc in documents]
     
     # Calculate TF-IDF vectors
     vectorizer = TfidfVectorizer(stop_words='english', max_features=5000)
@@ -39,9 +141,6 @@ def calculate_document_similarities(db, Document, DocumentSimilarity, min_simila
         logger.error(f"Error calculating TF-IDF matrix: {str(e)}")
         return False
     
-    # Calculate cosine similarity between all document pairs
-    similarity_matrix = cosine_similarity(tfidf_matrix)
-    
     # Clear existing similarities
     try:
         db.session.execute(db.delete(DocumentSimilarity))
@@ -52,22 +151,14 @@ def calculate_document_similarities(db, Document, DocumentSimilarity, min_simila
         logger.error(f"Error clearing existing similarities: {str(e)}")
         return False
     
-    # Store significant similarities
+    # Store significant similarities, one executemany per block
     pairs_added = 0
     try:
-        for i in range(len(documents)):
-            for j in range(i+1, len(documents)):  # Only upper triangle to avoid duplicates
-                similarity = similarity_matrix[i, j]
-                
-                # Only store if similarity is above threshold
-                if similarity >= min_similarity:
-                    sim = DocumentSimilarity(
-                        source_id=doc_ids[i],
-                        target_id=doc_ids[j],
-                        similarity_score=float(similarity)
-                    )
-                    db.session.add(sim)
-                    pairs_added += 1
+        for rows, cols, scores in iter_similarity_pairs(tfidf_matrix, min_similarity, top_k=top_k,
+                                                         block_size=similarity_block_size(len(doc_ids), block_nonzeros)):
+            pairs_added += _insert_similarity_pairs(
+                db, DocumentSimilarity, doc_ids[rows].tolist(), doc_ids[cols].tolist(), scores.tolist()
+            )
         
         db.session.commit()
         logger.info(f"Added {pairs_added} document similarity relationships")
@@ -76,8 +167,364 @@ def calculate_document_similarities(db, Document, DocumentSimilarity, min_simila
         logger.error(f"Error storing similarity relationships: {str(e)}")
         return False
     
+    if store_path:
+        save_vector_store(store_path, vectorizer, tfidf_matrix, doc_ids,
+                          params={'min_similarity': min_similarity, 'top_k': top_k})
+    
+    return pairs_added
+
+def update_document_similarities(db, Document, DocumentSimilarity, store_path, refit_ratio=0.2,
+                                 block_nonzeros=BLOCK_NONZEROS):
+    """
+    Score newly processed documents against the persisted vector store.
+
+    Documents that are processed but not yet in the store are transformed with
+    the frozen vocabulary and compared against the existing corpus only; their
+    relationships are inserted without touching the rest of the table and
+    their vectors are appended to the store. Rows of deleted documents are
+    marked removed by the delete (see remove_vectors) and dropped by the next
+    full fit.
+
+    Falls back to a full calculate_document_similarities when no store exists
+    or when the corpus has grown by more than refit_ratio since the last fit,
+    so the vocabulary and IDF weights are refreshed periodically.
+
+    Concurrent updates are safe: a document whose vectors were lost to a
+    concurrent refit is simply rescored by the next update.
+
+    Args:
+        db: SQLAlchemy database instance
+        Document: Document model class
+        DocumentSimilarity: DocumentSimilarity model class
+        store_path: Vector store folder
+        refit_ratio: Fraction of new documents that triggers a full refit
+        block_nonzeros: Budget of nonzeros in one block of the similarity product
+
+    Returns:
+        int: Number of similarity pairs added, or False if not enough documents
+
+    Raises:
+        VectorStoreError: If the saved vectors can't be read; the store is
+            left alone rather than replaced by a full recomputation
+    """
+    store = open_vector_store(store_path)
+    if store is None:
+        logger.info("No saved document vectors, running a full similarity calculation")
+        return calculate_document_similarities(db, Document, DocumentSimilarity, store_path=store_path,
+                                               block_nonzeros=block_nonzeros)
+    
+    min_similarity = store.params.get('min_similarity', 0.3)
+    top_k = store.params.get('top_k')
+    
+    processed_ids = {doc_id for doc_id, in db.session.query(Document.id).filter(Document.status == 'processed')}
+    known_ids = store.ids.tolist()
+    # Current rows of documents that still exist (the newest row if one was appended twice)
+    valid_rows = np.array([row for row, doc_id in enumerate(known_ids)
+                           if doc_id in processed_ids and store.row_for(doc_id) == row], dtype=np.int64)
+    new_ids = sorted(processed_ids - set(known_ids))
+    if not new_ids:
+        return 0
+    
+    if len(valid_rows) + len(new_ids) > store.fitted_count * (1 + refit_ratio):
+        logger.info("Corpus grew past the refit threshold since the last fit, refitting document vectors")
+        return calculate_document_similarities(
+            db, Document, DocumentSimilarity, min_similarity, top_k=top_k, store_path=store_path,
+            block_nonzeros=block_nonzeros
+        )
+    
+    existing_ids = np.asarray(store.ids)[valid_rows]
+    existing_matrix = store.matrix[valid_rows]
+    
+    texts = dict(db.session.query(Document.id, Document.extracted_text).filter(Document.id.in_(new_ids)))
+    new_matrix = store.vectorizer.transform([texts.get(doc_id) or '' for doc_id in new_ids])
+    
+    candidate_ids = np.concatenate([existing_ids, np.array(new_ids)]).astype(np.int64)
+    candidates = sparse.vstack([existing_matrix, new_matrix]).tocsr()
+    offset = len(existing_ids)
+    
+    pairs_added = 0
+    try:
+        # Remove relationships left by an earlier, partially saved update
+        db.session.execute(db.delete(DocumentSimilarity).where(
+            DocumentSimilarity.source_id.in_(new_ids) | DocumentSimilarity.target_id.in_(new_ids)
+        ))
+        
+        block_size = similarity_block_size(candidates.shape[0], block_nonzeros)
+        for start in range(0, len(new_ids), block_size):
+            block = (new_matrix[start:start + block_size] @ candidates.T).tocoo()
+            rows = block.row + offset + start
+            cols = block.col
+            scores = block.data
+            
+            # Each pair once: a new document is matched against everything before it
+            keep = np.nonzero((scores >= min_similarity) & (cols < rows))[0]
+            rows, cols, scores = rows[keep], cols[keep], scores[keep]
+            
+            if top_k:
+                order = np.lexsort((-scores, rows))
+                rows, cols, scores = rows[order], cols[order], scores[order]
+                row_starts = np.searchsorted(rows, rows, side='left')
+                keep = np.nonzero(np.arange(len(rows)) - row_starts < top_k)[0]
+                rows, cols, scores = rows[keep], cols[keep], scores[keep]
+            
+            pairs_added += _insert_similarity_pairs(
+                db, DocumentSimilarity,
+                candidate_ids[cols].tolist(), candidate_ids[rows].tolist(), scores.tolist()
+            )
+        
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error storing incremental similarity relationships: {str(e)}")
+        return False
+    
+    append_vectors(store, new_matrix, new_ids)
+    logger.info(f"Scored {len(new_ids)} new documents incrementally, added {pairs_added} similarity relationships")
     return pairs_added
 
+def explain_similarity(store_path, doc_id1, doc_id2, top_n=10):
+    """
+    List the terms that contribute most to the similarity of two documents.
+
+    Uses the saved document vectors: the cosine similarity of two L2-normalized
+    TF-IDF vectors is the sum of the products of their term weights, so each
+    shared term's product is its share of the score.
+
+    Args:
+        store_path: Vector store folder
+        doc_id1: First document ID
+        doc_id2: Second document ID
+        top_n: Maximum number of terms to return
+
+    Returns:
+        list: (term, contribution) tuples, strongest first; empty if either
+            document has no saved vector
+    """
+    try:
+        store = open_vector_store(store_path)
+    except VectorStoreError as e:
+        logger.warning(str(e))
+        return []
+    if store is None:
+        return []
+    
+    vector1 = store.vector(doc_id1)
+    vector2 = store.vector(doc_id2)
+    if vector1 is None or vector2 is None:
+        return []
+    
+    products = vector1.multiply(vector2).tocoo()
+    if not products.nnz:
+        return []
+    
+    terms = store.vectorizer.get_feature_names_out()
+    order = np.argsort(-products.data)[:top_n]
+    return [(str(terms[products.col[i]]), float(products.data[i])) for i in order]
+
+def _paragraph_vectorizer():
+    """Hashed character n-gram counts followed by sublinear TF-IDF weighting."""
+    return make_pipeline(
+        HashingVectorizer(analyzer='char_wb', ngram_range=(3, 5), n_features=PARAGRAPH_FEATURES,
+                          alternate_sign=False, norm=None, lowercase=True),
+        TfidfTransformer(sublinear_tf=True)
+    )
+
+def _iter_paragraph_chunks(db, Paragraph, after_id=0):
+    """Yield (ids, contents) for paragraphs with an ID above after_id, in ID order."""
+    while True:
+        rows = db.session.query(Paragraph.id, Paragraph.content)\
+            .filter(Paragraph.id > after_id)\
+            .order_by(Paragraph.id)\
+            .limit(PARAGRAPH_CHUNK_SIZE).all()
+        if not rows:
+            return
+        after_id = rows[-1].id
+        yield [row.id for row in rows], [row.content for row in rows]
+
+def build_paragraph_vectors(store_path, iter_chunks):
+    """
+    Vectorize a paragraph corpus into a new paragraph index in bounded memory.
+
+    Makes two passes over the corpus: the first counts document frequencies
+    to fix the IDF weights, the second transforms the paragraphs and writes
+    them out in segments of SEGMENT_ROWS, so only one segment is ever held in
+    memory. Segments include a column index, which search_paragraph_index
+    uses as an inverted index from n-gram to paragraphs.
+
+    Args:
+        store_path (str): Paragraph index folder
+        iter_chunks: Callable returning a fresh iterator of (ids, contents) chunks
+
+    Returns:
+        int: Number of paragraphs indexed
+    """
+    vectorizer = _paragraph_vectorizer()
+    hasher, weighting = vectorizer.steps[0][1], vectorizer.steps[1][1]
+    
+    # Pass 1: document frequencies (hashed features, so no vocabulary to build)
+    document_frequency = np.zeros(PARAGRAPH_FEATURES, dtype=np.int64)
+    total = 0
+    for ids, contents in iter_chunks():
+        counts = hasher.transform(contents)
+        document_frequency += np.bincount(counts.indices, minlength=PARAGRAPH_FEATURES)
+        total += len(ids)
+    
+    if not total:
+        logger.info("No paragraphs to index")
+        return 0
+    
+    # Smoothed IDF, as TfidfTransformer.fit would compute it
+    weighting.idf_ = np.log((1 + total) / (1 + document_frequency)) + 1
+    
+    # Pass 2: transform and write segment by segment
+    def blocks():
+        pending_ids = []
+        pending = []
+        for ids, contents in iter_chunks():
+            pending_ids.extend(ids)
+            pending.append(vectorizer.transform(contents))
+            if len(pending_ids) >= SEGMENT_ROWS:
+                yield sparse.vstack(pending, format='csr'), pending_ids
+                pending_ids, pending = [], []
+        if pending_ids:
+            yield sparse.vstack(pending, format='csr'), pending_ids
+    
+    write_vector_store(store_path, vectorizer, blocks(), PARAGRAPH_FEATURES, column_index=True)
+    logger.info(f"Built paragraph index with {total} paragraphs")
+    return total
+
+def build_paragraph_index(db, Paragraph, store_path):
+    """
+    Rebuild the paragraph index from every paragraph in the database.
+
+    Returns:
+        int: Number of paragraphs indexed
+    """
+    return build_paragraph_vectors(store_path, lambda: _iter_paragraph_chunks(db, Paragraph))
+
+def update_paragraph_index(db, Paragraph, store_path, refit_ratio=0.2):
+    """
+    Append paragraphs inserted since the index was last updated.
+
+    Paragraph IDs only grow (the key is AUTOINCREMENT, so IDs of deleted
+    paragraphs aren't handed out again), so new paragraphs are those with an
+    ID above the highest indexed one; they are vectorized with the stored IDF weights and
+    appended as a new segment. Rows of deleted paragraphs are marked removed
+    by the delete and skipped at query time. The index is rebuilt when missing or once it has grown by more than
+    refit_ratio since it was built.
+
+    Returns:
+        int: Number of paragraphs added to the index
+
+    Raises:
+        VectorStoreError: If the saved index can't be read
+    """
+    store = open_vector_store(store_path)
+    if store is None:
+        return build_paragraph_index(db, Paragraph, store_path)
+    
+    last_id = int(np.max(store.ids)) if len(store) else 0
+    new_count = db.session.query(Paragraph.id).filter(Paragraph.id > last_id).count()
+    if not new_count:
+        return 0
+    
+    if len(store) + new_count > store.fitted_count * (1 + refit_ratio):
+        logger.info("Paragraph index grew past the refit threshold, rebuilding it")
+        return build_paragraph_index(db, Paragraph, store_path)
+    
+    added = 0
+    for ids, contents in _iter_paragraph_chunks(db, Paragraph, after_id=last_id):
+        store = append_vectors(store, store.vectorizer.transform(contents), ids)
+        added += len(ids)
+    
+    logger.info(f"Added {added} paragraphs to the paragraph index")
+    return added
+
+def search_paragraph_index(store, text, min_similarity=0.7, limit=10):
+    """
+    Find the indexed paragraphs most similar to a piece of text.
+
+    The text is vectorized with the index's character n-gram model. Its
+    highest-weighted n-grams (the rarest, most distinctive ones) are looked up
+    in the column store to collect candidate paragraphs without scanning the
+    index, and only those candidates are scored exactly by cosine similarity.
+
+    Args:
+        store: Paragraph VectorStore (with a column index)
+        text (str): Text to search for
+        min_similarity (float): Minimum cosine similarity (0.0-1.0)
+        limit (int): Maximum number of results
+
+    Returns:
+        list: (paragraph_id, score) tuples, most similar first
+    """
+    query = store.vectorizer.transform([text]).tocsr()
+    if not query.nnz:
+        return []
+    
+    # Candidate generation from the most distinctive n-grams of the query
+    top = np.argsort(-query.data)[:QUERY_FEATURES]
+    features = query.indices[top]
+    query_weights = query.data[top]
+    candidate_count = max(limit * CANDIDATES_PER_RESULT, 100)
+    
+    scores = {}
+    for matrix, ids, columns in store.segments:
+        if columns is None:
+            continue
+        
+        # Walk the posting lists of the selected n-grams directly in the CSC arrays
+        starts = columns.indptr[features]
+        ends = columns.indptr[features + 1]
+        if not (ends - starts).any():
+            continue
+        rows = np.concatenate([columns.indices[s:e] for s, e in zip(starts, ends)])
+        weights = np.concatenate([columns.data[s:e] * w for s, e, w in zip(starts, ends, query_weights)])
+        partial = np.bincount(rows, weights=weights, minlength=matrix.shape[0])
+        
+        candidates = np.nonzero(partial)[0]
+        if len(candidates) > candidate_count:
+            candidates = candidates[np.argpartition(-partial[candidates], candidate_count)[:candidate_count]]
+        
+        # Exact cosine similarity for the candidates only (sparse, the query has few nonzeros)
+        exact = (matrix[candidates] @ query.T).toarray().ravel()
+        for paragraph_id, score in zip(np.asarray(ids)[candidates].tolist(), exact.tolist()):
+            if paragraph_id in store.removed:
+                continue
+            if score >= min_similarity and score > scores.get(paragraph_id, 0):
+                scores[paragraph_id] = score
+    
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+def find_similar_paragraphs(text, Paragraph, min_similarity=0.7, limit=10, store_path=None):
+    """
+    Find the stored paragraphs most similar to a piece of text.
+
+    Args:
+        text (str): Text to search for
+        Paragraph: Paragraph model class
+        min_similarity (float): Minimum cosine similarity (0.0-1.0)
+        limit (int): Maximum number of results
+        store_path (str): Paragraph index folder (see update_paragraph_index)
+
+    Returns:
+        list: (Paragraph, score) tuples, most similar first
+
+    Raises:
+        VectorStoreError: If the saved index can't be read
+    """
+    store = open_vector_store(store_path)
+    if store is None or not len(store):
+        return []
+    
+    # Ask for extra results in case some paragraphs were deleted since indexing
+    ranked = search_paragraph_index(store, text, min_similarity, limit=limit * 2)
+    if not ranked:
+        return []
+    
+    paragraphs = {p.id: p for p in Paragraph.query.filter(Paragraph.id.in_([pid for pid, _ in ranked]))}
+    return [(paragraphs[pid], score) for pid, score in ranked if pid in paragraphs][:limit]
+
 def get_similarity_network_data(Document, DocumentSimilarity):
     """
     Generate network visualization data for documents and their similarities.
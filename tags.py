@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from models import db, Tag, Document, Paragraph
 from utils.query_helpers import check_tag_name_exists, get_documents_with_tag
+from utils.http_cache import conditional_json
 
 # Create blueprint
 bp = Blueprint('tags', __name__)
@@ -117,6 +118,7 @@ def tag_document(id):
     return redirect(url_for('documents.view', id=document.id))
 
 @bp.route('/api/all')
+@conditional_json()
 def get_all_tags():
     """API endpoint to get all tags."""
     tags = Tag.query.order_by(Tag.name).all()
@@ -135,6 +137,7 @@ def get_all_tags():
     })
 
 @bp.route('/api/<int:id>/documents')
+@conditional_json()
 def get_tag_documents(id):
     """API endpoint to get documents with this tag."""
     tag = Tag.query.get_or_404(id)
@@ -0,0 +1,418 @@
+import os
+import glob
+import json
+import fcntl
+import time
+import uuid
+import pickle
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# Number of previous versions kept next to the current one, so processes that
+# still have an older version memory-mapped can finish what they are doing
+KEEP_VERSIONS = 2
+
+# Rows per segment when writing a large corpus; segments smaller than this
+# (appended ones) are merged once there are more than MAX_SEGMENTS of them
+SEGMENT_ROWS = 50000
+MAX_SEGMENTS = 16
+
+class VectorStoreError(Exception):
+    """Raised when a saved vector store exists but can't be read."""
+
+# Open stores per process, keyed by root folder: {root: (version, manifest_mtime, store)}
+_open_stores = {}
+_open_stores_lock = threading.Lock()
+
+def _write_atomic(path, write):
+    """Write a file via a temporary file and os.replace so readers never see it half written."""
+    folder = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+@contextmanager
+def _version_lock(version_dir, exclusive):
+    """
+    Hold the lock of a version directory (or of the store root, for allocating versions).
+
+    Appends and merges rewrite the manifest and delete merged segment files,
+    so they take it exclusively; loading a version takes it shared, so the
+    files named by the manifest it read are still there when it maps them.
+    """
+    with open(os.path.join(version_dir, '.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _save_segment(version_dir, matrix, ids, column_index=False):
+    """
+    Write one block of rows as raw .npy arrays that can be memory-mapped.
+
+    With column_index, a CSC copy of the block is written as well, giving
+    fast access to all rows containing a given feature (an inverted index).
+    """
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    matrix.sort_indices()
+    # scipy only wraps index arrays without copying when they already have the
+    # dtype it would pick itself: int32 unless the segment is too large for it
+    index_dtype = np.int32 if max(matrix.nnz, *matrix.shape) < 2 ** 31 else np.int64
+    name = f"seg_{int(time.time() * 1000):013d}_{uuid.uuid4().hex[:8]}"
+    arrays = [('data', matrix.data),
+              ('indices', matrix.indices.astype(index_dtype)),
+              ('indptr', matrix.indptr.astype(index_dtype)),
+              ('ids', np.asarray(ids, dtype=np.int64))]
+    if column_index:
+        columns = matrix.tocsc()
+        columns.sort_indices()
+        arrays += [('cdata', columns.data),
+                   ('cindices', columns.indices.astype(index_dtype)),
+                   ('cindptr', columns.indptr.astype(index_dtype))]
+    for suffix, array in arrays:
+        np.save(os.path.join(version_dir, f"{name}.{suffix}.npy"), array)
+    return {'name': name, 'rows': int(matrix.shape[0]), 'columns': column_index}
+
+class VectorStore:
+    """
+    Versioned, memory-mapped store of TF-IDF row vectors and their vectorizer.
+
+    Layout under the store root (e.g. instance/vectors/documents):
+
+        CURRENT                 name of the current version directory
+        v000003/manifest.json   shape, parameters and the list of segments
+        v000003/vectorizer.pkl  fitted vectorizer (vocabulary and IDF weights)
+        v000003/seg_*.npy       CSR data/indices/indptr and row ids per segment
+
+    A version is written once by a full fit and then only grows by appending
+    segments. Arrays are opened with mmap_mode='r', so every worker process
+    shares the same pages from the OS cache instead of holding its own copy.
+    """
+
+    def __init__(self, root, version, manifest, segments, vectorizer_path):
+        self.root = root
+        self.version = version
+        self.manifest = manifest
+        self.segments = segments  # list of (csr_matrix, ids, csc_matrix or None) backed by memory maps
+        self._vectorizer_path = vectorizer_path
+        self._vectorizer = None
+        self._matrix = None
+        self._ids = None
+        self._row_index = None
+        self._removed = None
+
+    @property
+    def params(self):
+        """Parameters recorded by the fit that created this version."""
+        return self.manifest.get('params', {})
+
+    @property
+    def fitted_count(self):
+        """Number of rows the vectorizer was fitted on."""
+        return self.manifest.get('fitted_count', 0)
+
+    @property
+    def removed(self):
+        """IDs whose rows were removed since the fit (see remove_vectors)."""
+        if self._removed is None:
+            self._removed = frozenset(self.manifest.get('removed', []))
+        return self._removed
+
+    @property
+    def vectorizer(self):
+        """The fitted vectorizer, loaded on first use."""
+        if self._vectorizer is None:
+            with open(self._vectorizer_path, 'rb') as f:
+                self._vectorizer = pickle.load(f)
+        return self._vectorizer
+
+    @property
+    def ids(self):
+        """Document (or paragraph) ID of every row, in row order."""
+        if self._ids is None:
+            if len(self.segments) == 1:
+                self._ids = self.segments[0][1]
+            elif self.segments:
+                self._ids = np.concatenate([ids for _, ids, _ in self.segments])
+            else:
+                self._ids = np.zeros(0, dtype=np.int64)
+        return self._ids
+
+    @property
+    def matrix(self):
+        """
+        All rows as one CSR matrix.
+
+        With a single segment this is a zero-copy view of the memory-mapped
+        arrays; appended segments are stacked (and copied) once per process.
+        """
+        if self._matrix is None:
+            if len(self.segments) == 1:
+                self._matrix = self.segments[0][0]
+            elif self.segments:
+                self._matrix = sparse.vstack([matrix for matrix, _, _ in self.segments], format='csr')
+            else:
+                self._matrix = sparse.csr_matrix((0, self.manifest['n_features']), dtype=np.float32)
+        return self._matrix
+
+    def row_for(self, item_id):
+        """Return the row index for an ID, or None if it is not in the store (or was removed)."""
+        if item_id in self.removed:
+            return None
+        if self._row_index is None:
+            # Later rows win, so a re-appended item maps to its newest vector
+            self._row_index = {item: row for row, item in enumerate(self.ids.tolist())}
+        return self._row_index.get(item_id)
+
+    def vector(self, item_id):
+        """Return the 1 x n_features CSR vector for an ID, or None."""
+        row = self.row_for(item_id)
+        if row is None:
+            return None
+        return self.matrix[row]
+
+    def __len__(self):
+        return sum(ids.shape[0] for _, ids, _ in self.segments)
+
+    def __repr__(self):
+        return f'<VectorStore {self.root} {self.version} rows={len(self)}>'
+
+def _current_version(root):
+    try:
+        with open(os.path.join(root, 'CURRENT')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _load_store(root, version):
+    version_dir = os.path.join(root, version)
+    with _version_lock(version_dir, exclusive=False):
+        return _map_version(root, version, version_dir)
+
+def _map_version(root, version, version_dir):
+    with open(os.path.join(version_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+
+    n_features = manifest['n_features']
+    segments = []
+    for segment in manifest['segments']:
+        prefix = os.path.join(version_dir, segment['name'])
+        data = np.load(f"{prefix}.data.npy", mmap_mode='r')
+        indices = np.load(f"{prefix}.indices.npy", mmap_mode='r')
+        indptr = np.load(f"{prefix}.indptr.npy", mmap_mode='r')
+        ids = np.load(f"{prefix}.ids.npy", mmap_mode='r')
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=(segment['rows'], n_features), copy=False)
+        columns = None
+        if segment.get('columns'):
+            columns = sparse.csc_matrix((np.load(f"{prefix}.cdata.npy", mmap_mode='r'),
+                                         np.load(f"{prefix}.cindices.npy", mmap_mode='r'),
+                                         np.load(f"{prefix}.cindptr.npy", mmap_mode='r')),
+                                        shape=(segment['rows'], n_features), copy=False)
+        segments.append((matrix, ids, columns))
+
+    return VectorStore(root, version, manifest, segments, os.path.join(version_dir, 'vectorizer.pkl'))
+
+def open_vector_store(root):
+    """
+    Open the current version of a vector store, reusing it within the process.
+
+    The store is reopened only when CURRENT points at a new version or the
+    manifest has changed (segments were appended by another process).
+
+    Args:
+        root (str): Store folder (e.g. instance/vectors/documents)
+
+    Returns:
+        VectorStore: The current version, or None if nothing has been saved yet
+
+    Raises:
+        VectorStoreError: If the current version can't be read
+    """
+    version = _current_version(root)
+    if version is None:
+        return None
+
+    manifest_path = os.path.join(root, version, 'manifest.json')
+    try:
+        mtime = os.stat(manifest_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _open_stores_lock:
+        cached = _open_stores.get(root)
+        if cached and cached[0] == version and cached[1] == mtime:
+            return cached[2]
+
+        try:
+            store = _load_store(root, version)
+        except Exception as e:
+            raise VectorStoreError(f"Could not open vector store {root} ({version}): {str(e)}") from e
+        _open_stores[root] = (version, mtime, store)
+        return store
+
+def write_vector_store(root, vectorizer, blocks, n_features, params=None, column_index=False):
+    """
+    Write a freshly fitted vectorizer and its vectors as a new store version.
+
+    Rows are written block by block, one segment each, so a corpus larger than
+    memory can be stored by passing a generator. The new version becomes
+    current atomically once every segment is on disk; older versions beyond
+    KEEP_VERSIONS are removed.
+
+    Args:
+        root (str): Store folder
+        vectorizer: Fitted vectorizer used to transform new rows
+        blocks: Iterable of (sparse matrix, ids) pairs, one row per ID
+        n_features (int): Number of columns of every block
+        params (dict): Optional JSON-serializable fit parameters to record
+        column_index (bool): Also keep a CSC copy of every segment for
+            feature -> rows lookups
+
+    Returns:
+        VectorStore: The newly written version
+    """
+    os.makedirs(root, exist_ok=True)
+    # Concurrent fits (a request and a worker job) each get a version of their own
+    with _version_lock(root, exclusive=True):
+        existing = sorted(name for name in os.listdir(root) if name.startswith('v') and name[1:].isdigit())
+        version = f"v{(int(existing[-1][1:]) + 1) if existing else 1:06d}"
+        version_dir = os.path.join(root, version)
+        os.makedirs(version_dir)
+
+    _write_atomic(os.path.join(version_dir, 'vectorizer.pkl'),
+                  lambda f: pickle.dump(vectorizer, f, protocol=pickle.HIGHEST_PROTOCOL))
+    segments = [_save_segment(version_dir, matrix, ids, column_index) for matrix, ids in blocks]
+    manifest = {
+        'n_features': int(n_features),
+        'fitted_count': sum(segment['rows'] for segment in segments),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': params or {},
+        'column_index': column_index,
+        'segments': segments
+    }
+    _write_atomic(os.path.join(version_dir, 'manifest.json'),
+                  lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+    _write_atomic(os.path.join(root, 'CURRENT'), lambda f: f.write(version.encode('utf-8')))
+
+    for old in existing[:-KEEP_VERSIONS] if len(existing) > KEEP_VERSIONS else []:
+        old_dir = os.path.join(root, old)
+        try:
+            # Wait for any process still loading it
+            with _version_lock(old_dir, exclusive=True):
+                shutil.rmtree(old_dir, ignore_errors=True)
+        except FileNotFoundError:
+            pass  # Pruned by a concurrent fit
+
+    logger.info(f"Saved vector store {root} version {version} with {manifest['fitted_count']} rows")
+    return open_vector_store(root)
+
+def save_vector_store(root, vectorizer, matrix, ids, params=None, column_index=False):
+    """Write a fitted vectorizer and a single in-memory matrix as a new store version."""
+    return write_vector_store(root, vectorizer, [(matrix, ids)], matrix.shape[1],
+                              params=params, column_index=column_index)
+
+def append_vectors(store, matrix, ids):
+    """
+    Append rows (transformed with store.vectorizer) to the store's version.
+
+    Only the new rows are written, as a new segment; the manifest is then
+    replaced atomically. Appends to a version are serialized by its lock
+    file, so concurrent writers never drop each other's segments. If a
+    concurrent refit has made another version current in the meantime, the
+    rows are still written to the old version and callers should treat them
+    as not stored. Once there are more than MAX_SEGMENTS small appended
+    segments they are merged into one.
+
+    Returns:
+        VectorStore: The reopened store including the new rows
+    """
+    if matrix.shape[0] == 0:
+        return store
+
+    version_dir = os.path.join(store.root, store.version)
+    column_index = store.manifest.get('column_index', False)
+    segment = _save_segment(version_dir, matrix, ids, column_index)
+
+    with _version_lock(version_dir, exclusive=True):
+        # Re-read the manifest so segments appended by other processes are kept
+        manifest_path = os.path.join(version_dir, 'manifest.json')
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        manifest['segments'].append(segment)
+
+        merged = []
+        small = [s for s in manifest['segments'] if s['rows'] < SEGMENT_ROWS]
+        if len(small) > MAX_SEGMENTS:
+            matrices = []
+            id_arrays = []
+            for s in small:
+                prefix = os.path.join(version_dir, s['name'])
+                matrices.append(sparse.csr_matrix((np.load(f"{prefix}.data.npy"),
+                                                   np.load(f"{prefix}.indices.npy"),
+                                                   np.load(f"{prefix}.indptr.npy")),
+                                                  shape=(s['rows'], manifest['n_features'])))
+                id_arrays.append(np.load(f"{prefix}.ids.npy"))
+            merged = small
+            combined = _save_segment(version_dir, sparse.vstack(matrices, format='csr'),
+                                     np.concatenate(id_arrays), column_index)
+            manifest['segments'] = [s for s in manifest['segments'] if s['rows'] >= SEGMENT_ROWS] + [combined]
+
+        _write_atomic(manifest_path, lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+
+        # Files of merged segments are no longer referenced; processes that
+        # already have them mapped keep their view until they reopen the store
+        for s in merged:
+            for path in glob.glob(os.path.join(version_dir, f"{s['name']}.*.npy")):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    return open_vector_store(store.root)
+
+def remove_vectors(root, ids):
+    """
+    Mark the rows of deleted items as removed from the current version.
+
+    The IDs are recorded in the manifest; the rows stay on disk until the
+    next full fit writes a new version without them. A version made current
+    by a refit that read the items before they were deleted still has their
+    rows until the refit after it.
+
+    Args:
+        root (str): Store folder
+        ids (iterable): IDs to remove
+
+    Returns:
+        int: Number of IDs newly marked as removed
+    """
+    version = _current_version(root)
+    ids = {int(item_id) for item_id in ids}
+    if version is None or not ids:
+        return 0
+
+    version_dir = os.path.join(root, version)
+    with _version_lock(version_dir, exclusive=True):
+        manifest_path = os.path.join(version_dir, 'manifest.json')
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        removed = set(manifest.get('removed', []))
+        added = len(ids - removed)
+        if added:
+            manifest['removed'] = sorted(removed | ids)
+            _write_atomic(manifest_path, lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+    return added
@@ -0,0 +1,339 @@
+"""
+Background worker pool for the document analyzer.
+
+Drains the background_job table populated by the upload views. Run it next to
+the web process on the same box:
+
+    python worker.py --workers 4
+
+or, to ingest batches with a process pool behind a single database writer:
+
+    python worker.py --workers 1 --parallel-ingest
+
+Each worker is a separate process with its own database connection. Jobs are
+claimed with a conditional UPDATE, so any number of workers (and restarts of
+this supervisor) can share one SQLite database without an external broker.
+Workers renew the lease of the jobs they are running; jobs left 'running' by a
+crashed worker are requeued once their lease expires.
+"""
+import os
+import time
+import signal
+import socket
+import logging
+import argparse
+import multiprocessing
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+def handle_ingest_job(job):
+    """Extract and segment the document referenced by an ingest job."""
+    from models import db, Document
+    from utils.ingestion import ingest_document
+    from utils.job_queue import enqueue_job
+
+    document = Document.query.get(job.document_id)
+    if document is None:
+        # Document was deleted while the job was queued
+        current_app.logger.info(f"Skipping ingest job {job.id}: document {job.document_id} no longer exists")
+        return
+
+    try:
+        ingest_document(document, current_app.config['UPLOAD_FOLDER'], db.session)
+    except Exception as e:
+        db.session.rollback()
+        final_attempt = (job.attempts or 0) >= current_app.config['JOB_MAX_ATTEMPTS']
+        document.status = 'error' if final_attempt else 'pending'
+        document.error_message = str(e)
+        db.session.commit()
+        raise
+
+    # Score the new document against the existing corpus
+    enqueue_job(db.session, 'similarity', unique=True)
+    queue_prerender(db.session, document.id)
+
+def queue_prerender(db_session, document_id):
+    """Queue pre-rendering of a freshly ingested document's first previews, behind ingestion."""
+    from utils.job_queue import enqueue_job
+
+    config = current_app.config
+    if config['PREVIEW_CACHE_MAX_BYTES'] and (config['PREVIEW_PRERENDER_PAGES'] or config['PREVIEW_THUMBNAIL_PAGES']):
+        enqueue_job(db_session, 'prerender', document_id=document_id,
+                    priority=config['PREVIEW_PRERENDER_PRIORITY'], unique=True)
+
+def handle_ingest_batch(jobs, executor):
+    """
+    Ingest the documents of several claimed ingest jobs in parallel.
+
+    Extraction and segmentation run in the executor's processes; this process
+    is the only one writing to the database.
+    """
+    from models import db, Document
+    from utils.ingestion import ingest_documents_parallel
+    from utils.job_queue import complete_job, fail_job, enqueue_job
+
+    max_attempts = current_app.config['JOB_MAX_ATTEMPTS']
+    documents = {}
+    for job in jobs:
+        document = Document.query.get(job.document_id)
+        if document is None:
+            current_app.logger.info(f"Skipping ingest job {job.id}: document {job.document_id} no longer exists")
+            complete_job(db.session, job)
+        else:
+            documents[job.id] = document
+
+    results = ingest_documents_parallel(
+        list(documents.values()), current_app.config['UPLOAD_FOLDER'], db.session, executor=executor
+    )
+
+    for job in jobs:
+        document = documents.get(job.id)
+        if document is None:
+            continue
+        error = results.get(document.id)
+        if error is None:
+            complete_job(db.session, job)
+            queue_prerender(db.session, document.id)
+        else:
+            final_attempt = (job.attempts or 0) >= max_attempts
+            document.status = 'error' if final_attempt else 'pending'
+            document.error_message = str(error)
+            fail_job(db.session, job, error, max_attempts)
+
+    if any(error is None for error in results.values()):
+        enqueue_job(db.session, 'similarity', unique=True)
+        db.session.commit()
+
+def fail_ingest_batch(jobs, error, max_attempts):
+    """
+    Record the failure of an ingest batch that raised part-way through.
+
+    Jobs the batch had already completed or failed are left alone; every
+    other one is failed (and requeued if it has attempts left) like a
+    single ingest job, with its document reset to 'pending' or marked 'error'.
+    """
+    from models import db, Document, BackgroundJob
+    from utils.job_queue import fail_job
+
+    for job in jobs:
+        try:
+            job = db.session.get(BackgroundJob, job.id)
+            if job is None or job.status != 'running':
+                continue
+            document = Document.query.get(job.document_id) if job.document_id else None
+            if document is not None and document.status != 'processed':
+                final_attempt = (job.attempts or 0) >= max_attempts
+                document.status = 'error' if final_attempt else 'pending'
+                document.error_message = str(error)
+            if not fail_job(db.session, job, error, max_attempts):
+                current_app.logger.error(f"Job {job.id} failed permanently: {str(error)}")
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception(f"Could not record the failure of ingest job {job.id}")
+
+def handle_similarity_job(job):
+    """Add similarity relationships and search vectors for content added since the last update."""
+    from models import db, Document, DocumentSimilarity, Paragraph
+    from utils.similarity_analyzer import update_document_similarities, update_paragraph_index
+
+    result = update_document_similarities(
+        db, Document, DocumentSimilarity,
+        current_app.config['DOCUMENT_VECTORS_PATH'],
+        refit_ratio=current_app.config['SIMILARITY_REFIT_RATIO'],
+        block_nonzeros=current_app.config['SIMILARITY_BLOCK_NONZEROS']
+    )
+    # False also means fewer than two documents, which is nothing to retry
+    if result is False and Document.query.filter_by(status='processed').count() >= 2:
+        raise RuntimeError("Similarity update failed and was rolled back")
+    update_paragraph_index(
+        db, Paragraph,
+        current_app.config['PARAGRAPH_VECTORS_PATH'],
+        refit_ratio=current_app.config['SIMILARITY_REFIT_RATIO']
+    )
+
+def handle_delete_files_job(job):
+    """Remove the stored files of documents deleted from the database."""
+    from utils.deletion import remove_document_files
+
+    filenames = job.get_payload().get('filenames', [])
+    removed = remove_document_files(current_app.config['UPLOAD_FOLDER'], filenames)
+    current_app.logger.info(f"Removed {removed} of {len(filenames)} files of deleted documents")
+
+def handle_prerender_job(job):
+    """Render the first page previews and thumbnails of a document into the preview cache."""
+    from models import Document
+    from utils.preview_cache import prerender_previews
+
+    document = Document.query.get(job.document_id)
+    if document is None or document.status != 'processed':
+        current_app.logger.info(f"Skipping prerender job {job.id}: document {job.document_id} is gone or not processed")
+        return
+
+    rendered = prerender_previews(document, current_app.config['UPLOAD_FOLDER'], current_app.config)
+    current_app.logger.info(f"Pre-rendered {rendered} previews of document {document.id}")
+
+def handle_export_job(job):
+    """Build a cached report in the background, then prune old reports."""
+    from models import db
+    from utils.exports import build_report, prune_reports
+
+    output_dir = current_app.config['UPLOAD_FOLDER']
+    filename = build_report(job, db, output_dir)
+    prune_reports(output_dir, current_app.config['REPORT_RETENTION_SECONDS'], keep=filename)
+    current_app.logger.info(f"Export job {job.id} built {filename}")
+
+# Map of job_type -> handler(job)
+JOB_HANDLERS = {
+    'ingest': handle_ingest_job,
+    'similarity': handle_similarity_job,
+    'delete_files': handle_delete_files_job,
+    'prerender': handle_prerender_job,
+    'export': handle_export_job,
+}
+
+def run_worker(job_types=None, parallel_ingest=False):
+    """
+    Worker process main loop: claim a job, run its handler, repeat.
+
+    Args:
+        job_types (list): Optional list of job types to handle (default: all registered)
+        parallel_ingest (bool): Claim ingest jobs in batches and extract them in a process pool
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from app import create_app
+    from models import db
+    from utils.job_queue import claim_next_job, claim_jobs, complete_job, fail_job, requeue_stale_jobs, lease_heartbeat
+
+    app = create_app()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    job_types = job_types or list(JOB_HANDLERS.keys())
+
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    with app.app_context():
+        poll_interval = app.config['JOB_POLL_INTERVAL']
+        lease_seconds = app.config['JOB_LEASE_SECONDS']
+        max_attempts = app.config['JOB_MAX_ATTEMPTS']
+        app.logger.info(f"Worker {worker_id} started for job types: {', '.join(job_types)}")
+
+        executor = None
+        if parallel_ingest:
+            executor = ProcessPoolExecutor(max_workers=app.config['INGEST_PROCESSES'])
+            app.logger.info(f"Worker {worker_id} ingesting with {app.config['INGEST_PROCESSES']} processes")
+
+        last_recovery = 0
+        while not stopping:
+            try:
+                # Periodically recover jobs abandoned by crashed workers
+                if time.time() - last_recovery > lease_seconds / 2:
+                    requeue_stale_jobs(db.session, lease_seconds, max_attempts)
+                    last_recovery = time.time()
+
+                job = claim_next_job(db.session, worker_id, job_types)
+            except OperationalError as e:
+                # Most likely "database is locked" while the web process writes
+                db.session.rollback()
+                app.logger.warning(f"Worker {worker_id} could not poll the job table: {str(e)}")
+                time.sleep(poll_interval)
+                continue
+
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+
+            if executor is not None and job.job_type == 'ingest':
+                batch = [job]
+                try:
+                    batch += claim_jobs(db.session, worker_id, ['ingest'], app.config['INGEST_BATCH_SIZE'] - 1)
+                    with lease_heartbeat(db.engine, [j.id for j in batch], worker_id, lease_seconds):
+                        handle_ingest_batch(batch, executor)
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.exception(f"Ingest batch starting at job {job.id} failed")
+                    fail_ingest_batch(batch, e, max_attempts)
+                finally:
+                    db.session.remove()
+                continue
+
+            handler = JOB_HANDLERS.get(job.job_type)
+            try:
+                if handler is None:
+                    raise ValueError(f"No handler registered for job type {job.job_type}")
+                with lease_heartbeat(db.engine, [job.id], worker_id, lease_seconds):
+                    handler(job)
+                complete_job(db.session, job)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.exception(f"Job {job.id} ({job.job_type}) failed on attempt {job.attempts}")
+                retry = fail_job(db.session, job, e, max_attempts)
+                if not retry:
+                    app.logger.error(f"Job {job.id} failed permanently: {str(e)}")
+            finally:
+                db.session.remove()
+
+        if executor is not None:
+            executor.shutdown()
+        app.logger.info(f"Worker {worker_id} stopped")
+
+def main():
+    """Start and supervise a pool of worker processes."""
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='Run document analyzer background workers')
+    parser.add_argument('--workers', type=int, default=Config.INGEST_WORKERS,
+                        help='Number of worker processes (default: INGEST_WORKERS)')
+    parser.add_argument('--job-type', action='append', dest='job_types',
+                        help='Only handle this job type (may be given more than once)')
+    parser.add_argument('--parallel-ingest', action='store_true',
+                        help='Extract ingest batches in a process pool of INGEST_PROCESSES with one DB writer')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+    # Use spawn so every worker opens its own database connections
+    context = multiprocessing.get_context('spawn')
+    processes = []
+    stopping = False
+
+    def start_process():
+        process = context.Process(target=run_worker, args=(args.job_types, args.parallel_ingest), daemon=False)
+        process.start()
+        logger.info(f"Started worker process {process.pid}")
+        return process
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    for _ in range(max(1, args.workers)):
+        processes.append(start_process())
+
+    # Restart workers that die unexpectedly
+    while not stopping:
+        for idx, process in enumerate(processes):
+            if not process.is_alive():
+                logger.warning(f"Worker process {process.pid} exited with code {process.exitcode}, restarting")
+                processes[idx] = start_process()
+        time.sleep(1)
+
+    logger.info("Stopping workers")
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join()
+
+if __name__ == '__main__':
+    main()